@@ -0,0 +1,77 @@
+"""
+Measure how the creation of the plot Dataframe scales with the number of occupations.
+
+Run with::
+
+    python benchmarks/plot_df.py [number of sessions]
+
+Compares WorktimeCalculator.pivot_worktime, which is used by get_plot_df,
+with the per occupation resample and join it replaced.
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+# make the work_tracker package importable without installing it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from work_tracker.functions.calc_worktime import WorktimeCalculator  # noqa: E402
+
+OCCUPATION_COUNTS = [1, 10, 100, 500]
+RULES = ["D", "M"]
+
+
+def generate_total_df(n_sessions: int, n_occupations: int) -> pd.DataFrame:
+    """Generate a total Dataframe with n_sessions sessions of n_occupations occupations."""
+    random_state = np.random.RandomState(0)
+    starts = pd.Timestamp("2010-01-01") + pd.to_timedelta(
+        np.sort(random_state.randint(0, 10 * 365 * 24 * 60, n_sessions)), unit="m"
+    )
+    worktimes = pd.to_timedelta(random_state.randint(1, 8 * 60, n_sessions), unit="m")
+    occupations = np.array([f"occupation_{index}" for index in range(n_occupations)])
+    return pd.DataFrame(
+        {
+            "start": starts,
+            "end": starts + worktimes,
+            "worktime": worktimes,
+            "occupation": occupations[random_state.randint(0, n_occupations, n_sessions)],
+        }
+    )
+
+
+def resample_join(total_df: pd.DataFrame, rule: str) -> pd.DataFrame:
+    """Previous implementation of get_plot_df, resampling each occupation on its own."""
+    total_df = total_df.sort_values("start").reset_index(drop=True)
+    plot_df = pd.DataFrame(total_df.resample(rule, on="start").worktime.sum())
+    plot_df.columns = ["total"]
+    for occupation in total_df["occupation"].unique():
+        occupation_series = total_df[total_df["occupation"] == occupation]
+        occupation_series = occupation_series.resample(rule, on="start").worktime.sum()
+        plot_df = plot_df.join(occupation_series.rename(occupation))
+    return plot_df.fillna(pd.Timedelta(seconds=0))
+
+
+def best_time(function, *args, repeat: int = 3) -> float:
+    """Return the best time of repeat runs of function(*args) in seconds."""
+    return min(timeit.repeat(lambda: function(*args), number=1, repeat=repeat))
+
+
+def main(n_sessions: int = 50000) -> None:
+    """Print the time both implementations need for n_sessions sessions."""
+    print(f"sessions: {n_sessions}")
+    print(f"{'rule':>4} {'occupations':>11} {'resample+join':>14} {'pivot':>8} {'speedup':>8}")
+    for rule in RULES:
+        for n_occupations in OCCUPATION_COUNTS:
+            total_df = generate_total_df(n_sessions, n_occupations)
+            join_time = best_time(resample_join, total_df, rule)
+            pivot_time = best_time(WorktimeCalculator.pivot_worktime, total_df, rule)
+            print(
+                f"{rule:>4} {n_occupations:>11} {join_time:>13.3f}s {pivot_time:>7.3f}s "
+                f"{join_time / pivot_time:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
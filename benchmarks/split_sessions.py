@@ -0,0 +1,73 @@
+"""
+Measure splitting sessions at midnight on large histories.
+
+Run with::
+
+    python benchmarks/split_sessions.py [number of sessions]
+
+Compares WorktimeCalculator.split_sessions_by_day, which splits every session
+at each midnight it contains, with the previous implementation, which only split
+sessions once at the midnight of their end date.
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+# make the work_tracker package importable without installing it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from work_tracker.functions.calc_worktime import WorktimeCalculator  # noqa: E402
+
+SESSION_COUNTS = [10000, 100000, 1000000]
+
+
+def generate_db(n_sessions: int, multi_day_share: float = 0.01) -> pd.DataFrame:
+    """Generate sessions, multi_day_share of which last up to 5 days."""
+    random_state = np.random.RandomState(0)
+    starts = pd.Timestamp("2000-01-01") + pd.to_timedelta(
+        np.sort(random_state.randint(0, n_sessions * 60, n_sessions)), unit="m"
+    )
+    durations = random_state.randint(0, 2 * 60, n_sessions)
+    is_multi_day = random_state.random_sample(n_sessions) < multi_day_share
+    durations[is_multi_day] = random_state.randint(24 * 60, 5 * 24 * 60, is_multi_day.sum())
+    return pd.DataFrame(
+        {
+            "start": starts,
+            "end": starts + pd.to_timedelta(durations, unit="m"),
+            "occupation": np.resize(["Inno", "RemEx", "OnPrEx"], n_sessions),
+        }
+    )
+
+
+def split_once(db: pd.DataFrame) -> pd.DataFrame:
+    """Previous implementation of split_date_overlap_session."""
+    db = db.copy()
+    overlap_sessions = db["start"].dt.normalize() != db["end"].dt.normalize()
+    df_to_append = db[overlap_sessions].copy()
+    df_to_append["start"] = df_to_append["end"].dt.normalize()
+    db.loc[overlap_sessions, "end"] = db[overlap_sessions]["end"].dt.normalize()
+    db = pd.concat([db, df_to_append])
+    db = db[(db["end"] - db["start"]) > pd.to_timedelta(1, unit="m")]
+    return db.sort_values("start").reset_index(drop=True)
+
+
+def best_time(function, *args, repeat: int = 3) -> float:
+    """Return the best time of repeat runs of function(*args) in seconds."""
+    return min(timeit.repeat(lambda: function(*args), number=1, repeat=repeat))
+
+
+def main(*session_counts: int) -> None:
+    """Print the time both implementations need to split the sessions."""
+    print(f"{'sessions':>9} {'split once':>11} {'split by day':>13} {'segments':>9}")
+    for n_sessions in session_counts or SESSION_COUNTS:
+        db = generate_db(n_sessions)
+        once_time = best_time(split_once, db)
+        by_day_time = best_time(WorktimeCalculator.split_sessions_by_day, db)
+        n_segments = len(WorktimeCalculator.split_sessions_by_day(db).index)
+        print(f"{n_sessions:>9} {once_time:>10.3f}s {by_day_time:>12.3f}s {n_segments:>9}")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,80 @@
+"""
+Measure the startup time of the tracker without GUI.
+
+Run with::
+
+    python benchmarks/startup_time.py [number of sessions]
+
+The time is measured in a fresh interpreter for importing the modules the
+tracker needs and for loading the local database (without synchronization,
+which runs in the background).
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# seconds until the local database is loaded and the window could be shown
+STARTUP_BUDGET = 1.5
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+from work_tracker.functions.sync_worker import SyncWorker
+from work_tracker.functions.update_work_db import DbInteraction
+imported = time.perf_counter()
+db_worker = DbInteraction({config_path!r})
+db_worker.update_db_locale()
+loaded = time.perf_counter()
+import sys
+eager_modules = [name for name in ("pysftp", "paramiko", "holidays") if name in sys.modules]
+print(imported - start, loaded - imported, ",".join(eager_modules))
+"""
+
+
+def generate_db(n_sessions: int) -> pd.DataFrame:
+    """Generate a database with n_sessions sessions ending now."""
+    starts = pd.Timestamp.now().floor("D") - pd.to_timedelta(
+        np.arange(n_sessions)[::-1] * 4, unit="h"
+    )
+    return pd.DataFrame(
+        {
+            "start": starts,
+            "end": starts + pd.Timedelta(hours=2),
+            "occupation": np.resize(["Inno", "RemEx", "OnPrEx"], n_sessions),
+        }
+    )
+
+
+def main(n_sessions: int = 20000) -> None:
+    """Print the startup time for a database with n_sessions sessions."""
+    with tempfile.TemporaryDirectory() as data_folder:
+        generate_db(n_sessions).to_csv(
+            os.path.join(data_folder, "local_db.tsv"), index=False, sep="\t"
+        )
+        config_path = os.path.join(data_folder, "user_config.ini")
+        with open(config_path, "w") as config_file:
+            config_file.write(f"[paths]\ndata_folder = {data_folder}\n")
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT.format(config_path=config_path)],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    import_time, load_time, eager_modules = (result.stdout.strip().split(" ") + [""])[:3]
+    total_time = float(import_time) + float(load_time)
+    print(f"sessions:       {n_sessions}")
+    print(f"import time:    {float(import_time):.3f}s")
+    print(f"load time:      {float(load_time):.3f}s")
+    print(f"total:          {total_time:.3f}s (budget {STARTUP_BUDGET}s)")
+    print(f"eager imports:  {eager_modules or 'none'}")
+    if total_time > STARTUP_BUDGET:
+        sys.exit("startup budget exceeded")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -16,7 +16,7 @@ requirements = [
     "PyQt5>=5.6.0",
     "pysftp>=0.2.9",
     "holidays>=0.13",
-    "dash>=0.37.0",
+    "dash>=0.41.0",
 ]
 
 setup_requirements = []
@@ -1,10 +1,13 @@
+import datetime
 import os
 from shutil import copyfile
 
 import pandas as pd
 import pytest
+from tests.custom_mocks import mock_empty_delta, mock_pysftp_CnOpts, mock_True
 
 from work_tracker.functions.helpfer_functions import get_abs_path
+from work_tracker.functions.update_work_db import DbInteraction
 
 
 # ###########################
@@ -16,6 +19,15 @@ def data_test_calc():
     test_data_path = get_abs_path("../tests/test_data/calc_worktime")
     test_df_path_src = os.path.join(test_data_path, "base_remote_df.tsv")
     test_df_path_dest = os.path.join(test_data_path, "remote_db.tsv")
+    holiday_cache_path = os.path.join(test_data_path, "holiday_cache.json")
+    journal_path = os.path.join(test_data_path, "local_db_journal.tsv")
+    aggregates_paths = [
+        os.path.join(test_data_path, "daily_aggregates.tsv"),
+        os.path.join(test_data_path, "daily_aggregates.ini"),
+    ]
+    for file_path in [holiday_cache_path, journal_path] + aggregates_paths:
+        if os.path.isfile(file_path):
+            os.remove(file_path)
     copyfile(test_df_path_src, test_df_path_dest)
     test_df = pd.read_csv(test_df_path_src, sep="\t", parse_dates=["start", "end"])  # type:ignore
     result = pd.read_csv(
@@ -30,10 +42,14 @@ def data_test_calc():
         "test_df": test_df,
         "test_df_path": test_df_path_dest,
         "manual_df": manual_df,
+        "holiday_cache_path": holiday_cache_path,
+        "aggregates_paths": aggregates_paths,
+        "journal_path": journal_path,
     }
     # file_cleanup
-    if os.path.isfile(test_df_path_dest):
-        os.remove(test_df_path_dest)
+    for file_path in [test_df_path_dest, holiday_cache_path, journal_path] + aggregates_paths:
+        if os.path.isfile(file_path):
+            os.remove(file_path)
 
 
 @pytest.fixture(scope="function")
@@ -43,6 +59,11 @@ def test_data_base():
     online_df_path_src = os.path.join(test_data_path, "baseclass_online_df.tsv")
     offline_df_path_dest = os.path.join(test_data_path, "local_db.tsv")
     online_df_path_dest = os.path.join(test_data_path, "remote_db.tsv")
+    journal_path = os.path.join(test_data_path, "local_db_journal.tsv")
+    sync_state_path = os.path.join(test_data_path, "sync_state.ini")
+    for file_path in [journal_path, sync_state_path]:
+        if os.path.isfile(file_path):
+            os.remove(file_path)
     copyfile(offline_df_path_src, offline_df_path_dest)
     copyfile(online_df_path_src, online_df_path_dest)
     offline_df = pd.read_csv(
@@ -62,9 +83,33 @@ def test_data_base():
         "offline_df_path": offline_df_path_dest,
         "online_df": online_df,
         "online_df_path": online_df_path_dest,
+        "journal_path": journal_path,
+        "sync_state_path": sync_state_path,
     }
     # file_cleanup
-    if os.path.isfile(offline_df_path_dest):
-        os.remove(offline_df_path_dest)
-    if os.path.isfile(online_df_path_dest):
-        os.remove(online_df_path_dest)
+    for file_path in [offline_df_path_dest, online_df_path_dest, journal_path, sync_state_path]:
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+
+
+# ###########################
+# #     WORKER FIXTURES     #
+# ###########################
+@pytest.fixture(scope="function")
+def DbInteraction_worker(test_data_base, monkeypatch):
+    monkeypatch.setattr("work_tracker.functions.base_classes.DbBaseClass.get_remote_db", mock_True)
+    monkeypatch.setattr(
+        "work_tracker.functions.base_classes.DbBaseClass.push_remote_db", mock_True
+    )
+    monkeypatch.setattr(
+        "work_tracker.functions.base_classes.DbBaseClass.pull_remote_deltas", mock_empty_delta
+    )
+    monkeypatch.setattr(
+        "work_tracker.functions.base_classes.DbBaseClass.rotate_remote_delta", mock_True
+    )
+    monkeypatch.setattr("pysftp.CnOpts", mock_pysftp_CnOpts)
+    DbInteraction_worker = DbInteraction("../tests/test_data/test_user_config_update_work_db.ini")
+    # mocking the today value
+    DbInteraction_worker.today = datetime.datetime(2017, 8, 8, 0, 0, 0, 0)
+    DbInteraction_worker.tomorrow = datetime.datetime(2017, 8, 9, 0, 0, 0, 0)
+    return DbInteraction_worker
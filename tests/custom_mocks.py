@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 import pandas as pd
 
 from work_tracker.functions.helpfer_functions import str_datetime
+from work_tracker.functions.storage import parse_delta_rows
 
 
 def mock_time_short_break(*args):
@@ -64,6 +65,10 @@ def mock_void(*args):
     pass
 
 
+def mock_empty_delta(*args, **kwargs):
+    return parse_delta_rows("")
+
+
 def mock_pysftp_CnOpts():
     class CnOptsMockClass:
         def __init__(self):
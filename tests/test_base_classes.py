@@ -3,6 +3,9 @@
 @author: Sebastian Weigand
 """
 
+import os
+
+import numpy as np
 import pandas as pd
 import pytest
 from pandas.util.testing import assert_frame_equal
@@ -15,6 +18,7 @@ from tests.custom_mocks import (
 
 from work_tracker.functions.base_classes import DbBaseClass
 from work_tracker.functions.helpfer_functions import str_datetime
+from work_tracker.functions.storage import format_delta_rows, parse_delta_rows
 
 # from work_tracker.functions.helpfer_functions import debug_printer
 
@@ -32,7 +36,8 @@ def test_get_pandas_now(DbBaseClass_worker, monkeypatch):
 
 def test_CnOpts_exception(DbBaseClass_worker, monkeypatch, capsys):
     monkeypatch.setattr("pysftp.CnOpts", lambda: {})
-    DbBaseClass_worker.load_config()
+    # the connection options are created lazily when connecting
+    DbBaseClass_worker.sftp_connection.get_cnopts()
     captured = capsys.readouterr()
     assert captured.out == "pysftp.CnOpts() doesn't exist\n"
 
@@ -123,3 +128,197 @@ def test_merge_dbs_both_same(mocked_DbBaseClass_worker, test_data_base):
     new_df = mocked_DbBaseClass_worker.merge_dbs()
     new_df = new_df.reset_index(drop=True)
     assert_frame_equal(new_df, test_data_base["offline_df"])
+
+
+def merge_dbs_reference(local_db, remote_db):
+    """Loop based conflict resolution, which was used before vectorizing merge_dbs."""
+    new_db = pd.merge(local_db, remote_db, on=["occupation", "start", "end"], how="outer")
+    start_fix = new_db["start"][new_db["start"].duplicated()]
+    drop_list = []
+    for start_val in start_fix.values:
+        dup_index = new_db.index[new_db["start"].isin([start_val])]
+        max_end_ts = new_db["end"].loc[dup_index].max()
+        new_db.at[dup_index[0], "end"] = max_end_ts
+        drop_list.append(dup_index[1:])
+    flat_drop_list = [item for sublist in drop_list for item in sublist]
+    new_db.drop(new_db.index[flat_drop_list], inplace=True)
+    return new_db.sort_values(["start"]).reset_index(drop=True)
+
+
+def test_merge_dbs_many_conflicts(mocked_DbBaseClass_worker, test_data_base):
+    rng = np.random.default_rng(42)
+    starts = pd.Timestamp("2017-01-01") + pd.to_timedelta(np.arange(2000) * 3, unit="h")
+    durations = pd.to_timedelta(rng.integers(5, 120, size=len(starts)), unit="m")
+    occupations = rng.choice(["Inno", "RemEx", "OnPrEx"], size=len(starts))
+    local_db = pd.DataFrame(
+        {"start": starts, "end": starts + durations, "occupation": occupations}
+    )
+    remote_db = local_db.copy()
+    # diverged sessions with different end values and sessions only known to one side
+    diverged = rng.random(len(starts)) < 0.3
+    remote_db.loc[diverged, "end"] += pd.to_timedelta(
+        rng.integers(-4, 10, size=diverged.sum()), unit="m"
+    )
+    local_db = local_db[rng.random(len(starts)) < 0.9]
+    remote_db = remote_db[rng.random(len(starts)) < 0.9]
+    remote_db.to_csv(
+        mocked_DbBaseClass_worker.db_path_online,
+        index=False,
+        columns=["start", "end", "occupation"],
+        sep="\t",
+    )
+    mocked_DbBaseClass_worker.db = local_db.reset_index(drop=True)
+    remote_db = mocked_DbBaseClass_worker.load_db(test_data_base["online_df_path"])
+    expected = merge_dbs_reference(mocked_DbBaseClass_worker.db, remote_db)
+    assert_frame_equal(mocked_DbBaseClass_worker.merge_dbs(), expected)
+
+
+@pytest.fixture()
+def sftp_DbBaseClass_worker(test_data_base, sftpserver):
+    db_worker = DbBaseClass("../tests/test_data/test_user_config_update_work_db.ini")
+    db_worker.load_config()
+    db_worker.login_dict = {
+        **db_worker.login_dict,
+        "host": sftpserver.host,
+        "username": "user",
+        "password": "pw",
+        "port": sftpserver.port,
+    }
+    db_worker.client_id = "client"
+    db_worker.db = db_worker.load_db(db_worker.db_path_offline)
+    return db_worker
+
+
+def test_push_remote_delta(sftp_DbBaseClass_worker, sftpserver):
+    content = {"test_folder": {"test_file.csv": "", "test_file.csv.deltas": {}}}
+    sftp_DbBaseClass_worker.mark_own_sessions(sftp_DbBaseClass_worker.db["start"])
+    with sftpserver.serve_content(content):
+        assert sftp_DbBaseClass_worker.push_remote_delta()
+        delta_file_name = sftp_DbBaseClass_worker.load_sync_state().get("delta", "file_name")
+        delta_files = content["test_folder"]["test_file.csv.deltas"]
+        # the sftpserver fixture can only append to files with str content
+        delta_files[delta_file_name] = delta_files[delta_file_name].decode()
+        pushed_db = parse_delta_rows(delta_files[delta_file_name])
+        assert_frame_equal(pushed_db, sftp_DbBaseClass_worker.db[["start", "end", "occupation"]])
+        # only the changed session gets appended
+        sftp_DbBaseClass_worker.db.at[2, "end"] = str_datetime("2017-08-08 18:29:33.0")
+        assert sftp_DbBaseClass_worker.push_remote_delta()
+        pushed_db = parse_delta_rows(delta_files[delta_file_name].decode())
+        assert len(pushed_db.index) == 4
+        assert pushed_db.at[3, "end"] == str_datetime("2017-08-08 18:29:33.0")
+        # sessions of other clients aren't echoed back and their later end
+        # doesn't hide own sessions from the next push
+        foreign_row = pd.DataFrame(
+            [
+                {
+                    "start": str_datetime("2017-08-08 20:00:00.0"),
+                    "end": str_datetime("2017-08-09 23:00:00.0"),
+                    "occupation": "Inno",
+                }
+            ]
+        )
+        db = pd.concat([sftp_DbBaseClass_worker.db, foreign_row], ignore_index=True)
+        db.at[2, "end"] = str_datetime("2017-08-08 18:34:33.0")
+        sftp_DbBaseClass_worker.db = db
+        delta_files[delta_file_name] = delta_files[delta_file_name].decode()
+        assert sftp_DbBaseClass_worker.push_remote_delta()
+        pushed_db = parse_delta_rows(delta_files[delta_file_name].decode())
+        assert len(pushed_db.index) == 5
+        assert pushed_db.at[4, "end"] == str_datetime("2017-08-08 18:34:33.0")
+        db.at[2, "end"] = str_datetime("2017-08-08 18:39:33.0")
+        delta_files[delta_file_name] = delta_files[delta_file_name].decode()
+        assert sftp_DbBaseClass_worker.push_remote_delta()
+        pushed_db = parse_delta_rows(delta_files[delta_file_name].decode())
+        assert len(pushed_db.index) == 6
+    # nothing changed, so there is no need to connect to the server
+    assert sftp_DbBaseClass_worker.push_remote_delta()
+
+
+def test_pull_remote_deltas(sftp_DbBaseClass_worker, sftpserver):
+    other_rows = sftp_DbBaseClass_worker.db[["start", "end", "occupation"]]
+    other_delta = format_delta_rows(other_rows)
+    delta_files = {"other_1.tsv": other_delta + "2017-08-09 17:14"}
+    content = {"test_folder": {"test_file.csv.deltas": delta_files}}
+    with sftpserver.serve_content(content):
+        assert_frame_equal(sftp_DbBaseClass_worker.pull_remote_deltas(), other_rows)
+        assert sftp_DbBaseClass_worker.pull_remote_deltas().empty
+        # the incomplete line gets read once it is complete
+        delta_files["other_1.tsv"] += ":33.000000\t2017-08-09 18:24:33.000000\tOnPrEx\n"
+        new_rows = sftp_DbBaseClass_worker.pull_remote_deltas()
+        assert len(new_rows.index) == 1
+        assert new_rows.at[0, "start"] == str_datetime("2017-08-09 17:14:33.0")
+        # reading everything doesn't change the sync state
+        assert len(sftp_DbBaseClass_worker.pull_remote_deltas(incremental=False).index) == 4
+        assert sftp_DbBaseClass_worker.pull_remote_deltas().empty
+
+
+def test_rotate_remote_delta(sftp_DbBaseClass_worker, sftpserver):
+    content = {"test_folder": {"test_file.csv": "", "test_file.csv.deltas": {}}}
+    sftp_DbBaseClass_worker.mark_own_sessions(sftp_DbBaseClass_worker.db["start"])
+    with sftpserver.serve_content(content):
+        assert sftp_DbBaseClass_worker.push_remote_delta()
+        old_delta_file_name = sftp_DbBaseClass_worker.load_sync_state().get("delta", "file_name")
+        sftp_DbBaseClass_worker.rotate_remote_delta()
+        sync_state = sftp_DbBaseClass_worker.load_sync_state()
+        assert sync_state.get("delta", "file_name") != old_delta_file_name
+        assert sftp_DbBaseClass_worker.get_retired_delta_file_names(sync_state) == [
+            old_delta_file_name
+        ]
+        # all sessions are part of the pushed database
+        assert sftp_DbBaseClass_worker.push_remote_delta()
+        assert list(content["test_folder"]["test_file.csv.deltas"]) == [old_delta_file_name]
+        # the old delta file is kept, until the database on the server contains its rows
+        remote_db = sftp_DbBaseClass_worker.db.iloc[:-1]
+        assert sftp_DbBaseClass_worker.remove_retired_deltas(remote_db)
+        assert list(content["test_folder"]["test_file.csv.deltas"]) == [old_delta_file_name]
+        assert sftp_DbBaseClass_worker.remove_retired_deltas(sftp_DbBaseClass_worker.db)
+        assert content["test_folder"]["test_file.csv.deltas"] == {}
+        sync_state = sftp_DbBaseClass_worker.load_sync_state()
+        assert sftp_DbBaseClass_worker.get_retired_delta_file_names(sync_state) == []
+
+
+def test_rotate_remote_delta_changed_during_push(mocked_DbBaseClass_worker):
+    pushed_db = mocked_DbBaseClass_worker.db.copy()
+    mocked_DbBaseClass_worker.mark_own_sessions(pushed_db["start"].iloc[-2:])
+    # the last session was extended during the upload
+    changed_db = pushed_db.copy()
+    changed_db.loc[changed_db.index[-1], "end"] += pd.Timedelta(minutes=1)
+    mocked_DbBaseClass_worker.db = changed_db
+    mocked_DbBaseClass_worker.rotate_remote_delta(pushed_db)
+    sync_state = mocked_DbBaseClass_worker.load_sync_state()
+    assert mocked_DbBaseClass_worker.get_own_starts(sync_state) == {
+        pushed_db["start"].iloc[-1].value
+    }
+    assert sync_state.get("delta", "pushed_end") == pushed_db["end"].iloc[-2:].max().isoformat()
+
+
+def test_push_remote_db_unchanged(sftp_DbBaseClass_worker, sftpserver, monkeypatch):
+    content = {"test_folder": {"test_file.csv": ""}}
+    with sftpserver.serve_content(content):
+        assert sftp_DbBaseClass_worker.push_remote_db()
+        with open(sftp_DbBaseClass_worker.db_path_offline, "rb") as local_db_file:
+            assert content["test_folder"]["test_file.csv"] == local_db_file.read()
+        # unchanged local db doesn't get uploaded again, while the pushed db is on the server
+        with monkeypatch.context() as patch:
+            patch.setattr(
+                "pysftp.Connection.put", lambda *args, **kwargs: pytest.fail("db uploaded again")
+            )
+            assert sftp_DbBaseClass_worker.push_remote_db()
+        # unchanged local db gets uploaded again, if another client replaced the pushed db
+        content["test_folder"]["test_file.csv"] = "pushed by other client"
+        assert sftp_DbBaseClass_worker.push_remote_db()
+        with open(sftp_DbBaseClass_worker.db_path_offline, "rb") as local_db_file:
+            assert content["test_folder"]["test_file.csv"] == local_db_file.read()
+
+
+def test_is_remote_file_unchanged(test_data_base):
+    class RemoteAttributes:
+        st_size = os.path.getsize(test_data_base["online_df_path"])
+        st_mtime = os.path.getmtime(test_data_base["online_df_path"])
+
+    assert DbBaseClass.is_remote_file_unchanged(RemoteAttributes, test_data_base["online_df_path"])
+    assert not DbBaseClass.is_remote_file_unchanged(RemoteAttributes, "not_existing.tsv")
+    RemoteAttributes.st_size += 1
+    assert not DbBaseClass.is_remote_file_unchanged(
+        RemoteAttributes, test_data_base["online_df_path"]
+    )
@@ -5,15 +5,18 @@ Created on Sat May 14 15:32:16 2016
 """
 
 import datetime
+import os
 
+import numpy as np
 import pandas as pd
 import pytest
+from pandas.tseries.offsets import CustomBusinessDay  # type: ignore
 from pandas.util.testing import assert_frame_equal
 
 from work_tracker.functions.calc_worktime import WorktimeCalculator
 from work_tracker.functions.helpfer_functions import get_abs_path  # debug_printer , seconds_to_hm
 
-from .custom_mocks import mock_pysftp_CnOpts, mock_True
+from .custom_mocks import mock_empty_delta, mock_pysftp_CnOpts, mock_True
 from .test_update_work_db import str_datetime
 
 pd.options.display.width = 300  # type:ignore
@@ -26,6 +29,12 @@ def Calculator(monkeypatch, data_test_calc):
     monkeypatch.setattr(
         "work_tracker.functions.base_classes.DbBaseClass.push_remote_db", mock_True
     )
+    monkeypatch.setattr(
+        "work_tracker.functions.base_classes.DbBaseClass.pull_remote_deltas", mock_empty_delta
+    )
+    monkeypatch.setattr(
+        "work_tracker.functions.base_classes.DbBaseClass.rotate_remote_delta", mock_True
+    )
     monkeypatch.setattr("pysftp.CnOpts", mock_pysftp_CnOpts)
     Calculator = WorktimeCalculator("../tests/test_data/test_user_config_calc_worktime.ini")
     # needed for all tests involving holidays
@@ -131,3 +140,294 @@ def test_get_plot_df(Calculator):
         },
     )
     assert_frame_equal(plot_df, result)
+
+
+def generate_contract_worktime_reference(Calculator):
+    """Loop based contract expansion, which was used before vectorizing it."""
+    contract_worktime_dfs = []
+    contract_info_df = pd.read_csv(
+        Calculator.contract_info_path, sep="\t", parse_dates=["start", "end"]  # type:ignore
+    )
+    for _, row in contract_info_df.iterrows():
+        if pd.isna(row["end"]):
+            end_date = Calculator.db["end"].max()
+        else:
+            end_date = row["end"]
+        business_days = CustomBusinessDay(weekmask=row["weekmask"])
+        worktime_df = pd.DataFrame(
+            {
+                "start": pd.Series(
+                    pd.date_range(row["start"], end_date, normalize=True, freq=business_days)
+                )
+            }
+        )
+        daily_worktime = Calculator.get_daily_worktime(
+            row["frequenzy"], row["worktime"], row["weekmask"]
+        )
+        worktime_df["worktime"] = pd.to_timedelta(daily_worktime, unit="h")
+        contract_worktime_dfs.append(worktime_df)
+    contract_worktime_df = (
+        pd.concat(contract_worktime_dfs).groupby("start")["worktime"].apply(lambda x: x.sum())
+    )
+    return contract_worktime_df.reset_index().sort_values("start")
+
+
+def test_generate_contract_worktime_df_many_contracts(Calculator, tmp_path):
+    contract_info_path = tmp_path / "contract_info.tsv"
+    pd.DataFrame(
+        [
+            ["job1", "2010-01-04", "2014-06-30", 40, "weekly", "Mon Tue Wed Thu Fri"],
+            ["job2", "2012-03-15", "2016-12-31", 8.75, "monthly", "Thu Fri"],
+            ["job3", "2014-07-01", "2015-02-01", 12, "weekly", "Sat"],
+            ["job4", "2013-05-05", "", 20.5, "monthly", "Mon Wed Fri"],
+        ],
+        columns=["name", "start", "end", "worktime", "frequenzy", "weekmask"],
+    ).to_csv(contract_info_path, sep="\t", index=False)
+    Calculator.contract_info_path = str(contract_info_path)
+    assert_frame_equal(
+        Calculator.generate_contract_worktime_df(),
+        generate_contract_worktime_reference(Calculator),
+    )
+
+
+def get_manual_df_reference(Calculator):
+    """Loop based manual_db expansion, which was used before vectorizing it."""
+    manual_dfs = []
+    manual_db = pd.read_csv(
+        Calculator.manual_db_path, sep="\t", parse_dates=["start", "end"]  # type:ignore
+    )
+    for _, row in manual_db.iterrows():
+        new_df = pd.DataFrame()
+        new_df["start"] = pd.date_range(row["start"], row["end"], normalize=True)
+        new_df["end"] = pd.date_range(row["start"], row["end"], normalize=True)
+        new_df["occupation"] = row["occupation"]
+        manual_dfs.append(new_df)
+    manual_df = pd.concat(manual_dfs)
+    work_day = manual_df["start"].apply(lambda x: x not in Calculator.holidays)
+    manual_df = pd.merge(manual_df[work_day], Calculator.contract_worktime_df, on="start")
+    return manual_df.sort_values(["start"]).reset_index(drop=True)
+
+
+def test_get_manual_df_with_workime_many_periods(Calculator, tmp_path):
+    manual_db_path = tmp_path / "manual_db.tsv"
+    pd.DataFrame(
+        [
+            ["2017-08-01", "2017-08-05", "vacation"],
+            ["2017-08-07 10:00:00", "2017-08-07 12:00:00", "sick"],
+            ["2017-08-09", "2017-08-11", "vacation"],
+            ["2017-12-20", "2018-01-10", "vacation"],
+        ],
+        columns=["start", "end", "occupation"],
+    ).to_csv(manual_db_path, sep="\t", index=False)
+    Calculator.manual_db_path = str(manual_db_path)
+    Calculator.contract_worktime_df = pd.DataFrame(
+        {
+            "start": pd.date_range("2017-08-01", "2018-01-31"),
+            "worktime": pd.to_timedelta(8, unit="h"),
+        }
+    )
+    assert_frame_equal(
+        Calculator.get_manual_df_with_workime(), get_manual_df_reference(Calculator)
+    )
+
+
+def test_get_holiday_mask(Calculator):
+    days = pd.date_range("2015-01-01", "2019-12-31").values
+    expected = [pd.Timestamp(day) in Calculator.holidays for day in days]
+    assert Calculator.get_holiday_mask(days).tolist() == expected
+    # changes of the holidays invalidate the cached holiday days
+    Calculator.holidays.update({datetime.datetime(2017, 8, 7): "test_holiday"})
+    assert Calculator.get_holiday_mask(pd.to_datetime(["2017-08-07"]).values).tolist() == [True]
+    Calculator.holidays = {}
+    assert not Calculator.get_holiday_mask(days).any()
+
+
+def test_holiday_cache(Calculator, data_test_calc, monkeypatch):
+    assert os.path.isfile(data_test_calc["holiday_cache_path"])
+
+    def mock_populate_holiday_year(*args):
+        raise AssertionError("holidays were generated despite the cache")
+
+    with monkeypatch.context() as mock_context:
+        mock_context.setattr(
+            "work_tracker.functions.calc_worktime.WorktimeCalculator.populate_holiday_year",
+            mock_populate_holiday_year,
+        )
+        cached_holidays = Calculator.init_holidays()
+    assert datetime.date(2017, 12, 24) in cached_holidays
+    Calculator.use_holiday_cache = False
+    assert dict(cached_holidays) == dict(Calculator.init_holidays())
+    # a changed config doesn't use the old cache entries
+    Calculator.use_holiday_cache = True
+    Calculator.special_holidays = {"01-08": "test_holiday"}
+    assert datetime.date(2017, 8, 1) in Calculator.init_holidays()
+
+
+def get_plot_df_reference(total_df, rule):
+    """Per occupation resample and join, which was used before the single groupby."""
+    total_df = total_df.sort_values("start").reset_index(drop=True)
+    plot_df = pd.DataFrame(total_df.resample(rule, on="start").worktime.sum())
+    plot_df.columns = ["total"]
+    for occupation in total_df["occupation"].unique():
+        occupation_series = total_df[total_df["occupation"] == occupation]
+        occupation_series = occupation_series.resample(rule, on="start").worktime.sum()
+        plot_df = plot_df.join(occupation_series.rename(occupation))
+    return plot_df.fillna(pd.Timedelta(seconds=0))
+
+
+@pytest.mark.parametrize("rule", ["D", "W", "M", "4H"])
+def test_get_plot_df_rules(Calculator, rule):
+    expected = get_plot_df_reference(Calculator.get_total_df(), rule)
+    assert_frame_equal(Calculator.get_plot_df(rule), expected)
+
+
+@pytest.mark.parametrize("rule", ["D", "4H"])
+def test_get_plot_df_range(Calculator, rule):
+    total_df = Calculator.get_total_df()
+    total_df = total_df[(total_df["start"] >= "2017-08-07") & (total_df["start"] < "2017-08-09")]
+    expected = get_plot_df_reference(total_df, rule)
+    plot_df = Calculator.get_plot_df(rule, start="2017-08-07", end="2017-08-09")
+    assert_frame_equal(plot_df, expected)
+
+
+def test_get_total_df_memoized(Calculator, tmp_path):
+    db_before = Calculator.db.copy()
+    total_df = Calculator.get_total_df()
+    assert_frame_equal(Calculator.db, db_before)
+    # changing the returned Dataframe doesn't change the cache
+    total_df.drop(total_df.index, inplace=True)
+    cached_total_df = Calculator.get_total_df()
+    assert Calculator.get_total_df() is not cached_total_df
+    assert_frame_equal(Calculator.get_total_df(), cached_total_df)
+    Calculator.get_plot_df("W")
+    assert ("get_plot_df", ("W",), ()) in Calculator.report_cache
+    # changed sessions invalidate the cache, by bumping the version of db
+    db_version = Calculator.get_dependency_hash("db")
+    assert Calculator.get_dependency_hash("db") == db_version
+    Calculator.db = Calculator.db.iloc[1:]
+    assert Calculator.get_dependency_hash("db") != db_version
+    assert len(Calculator.get_total_df().index) == len(cached_total_df.index) - 1
+    # a changed manual_db invalidates the cache
+    manual_db_path = tmp_path / "manual_db.tsv"
+    pd.read_csv(Calculator.manual_db_path, sep="\t").iloc[:1].to_csv(
+        manual_db_path, sep="\t", index=False
+    )
+    Calculator.manual_db_path = str(manual_db_path)
+    assert "vacation" not in Calculator.get_total_df()["occupation"].values
+
+
+def test_report_dependencies(Calculator, tmp_path):
+    holiday_df = Calculator.get_holiday_df()
+    contract_worktime_df = Calculator.contract_worktime_df
+    holidays_hash = Calculator.get_dependency_hash("holidays")
+    # hashing doesn't regenerate the contract data, even if contract_info changed
+    contract_info_path = tmp_path / "contract_info.tsv"
+    pd.read_csv(Calculator.contract_info_path, sep="\t").to_csv(
+        contract_info_path, sep="\t", index=False, header=True, lineterminator="\r\n"
+    )
+    Calculator.contract_info_path = str(contract_info_path)
+    Calculator.get_dependency_hash("contract_info")
+    assert Calculator.contract_worktime_df is contract_worktime_df
+    # the holiday settings of the config are part of the holidays hash
+    Calculator.special_holidays = {**Calculator.special_holidays, "08-08": "special day"}
+    assert Calculator.get_dependency_hash("holidays") == holidays_hash
+    special_holiday_df = Calculator.get_holiday_df()
+    assert Calculator.contract_worktime_df is not contract_worktime_df
+    assert Calculator.get_dependency_hash("holidays") != holidays_hash
+    # the regenerated holidays don't contain the holiday added by the fixture
+    assert list(holiday_df["start"]) == [pd.Timestamp("2017-08-04")]
+    assert list(special_holiday_df["start"]) == [pd.Timestamp("2017-08-08")]
+
+
+def test_report_cache_size(Calculator, monkeypatch):
+    monkeypatch.setattr(Calculator, "report_cache_size", 3)
+    for day in ["2017-08-07", "2017-08-08", "2017-08-09"]:
+        Calculator.get_plot_df("D", start=day)
+    assert len(Calculator.report_cache) == 3
+    assert ("get_plot_df", ("D",), (("start", "2017-08-07"),)) not in Calculator.report_cache
+    assert ("get_plot_df", ("D",), (("start", "2017-08-09"),)) in Calculator.report_cache
+
+
+def test_add_sessions(Calculator):
+    raw_db = Calculator.raw_db.copy()
+    sessions = pd.DataFrame(
+        {
+            "start": pd.to_datetime(["2017-08-12 17:14:33", "2017-08-13 22:00:00"]),
+            "end": pd.to_datetime(["2017-08-12 19:14:33", "2017-08-16 02:00:00"]),
+            "occupation": ["RemEx", "Inno"],
+        }
+    )
+    db_version = Calculator.get_dependency_hash("db")
+    Calculator.add_sessions(sessions)
+    assert Calculator.get_dependency_hash("db") != db_version
+    expected_raw_db = pd.concat([raw_db, sessions], ignore_index=True, sort=False)
+    expected_raw_db = expected_raw_db.drop_duplicates(["start"], keep="last")
+    expected_raw_db = expected_raw_db.sort_values(["start"], kind="mergesort")
+    assert_frame_equal(Calculator.raw_db, expected_raw_db.reset_index(drop=True))
+    assert_frame_equal(Calculator.db, Calculator.split_sessions_by_day(expected_raw_db))
+
+
+def split_date_overlap_reference(db):
+    """Single split at the midnight of the end date, which was used before splitting by day."""
+    db = db.copy()
+    overlap_sessions = db["start"].dt.normalize() != db["end"].dt.normalize()
+    df_to_append = db[overlap_sessions].copy()
+    df_to_append.loc[:, "start"] = df_to_append["end"].dt.normalize()
+    db.loc[overlap_sessions, "end"] = db[overlap_sessions]["end"].dt.normalize()
+    db = pd.concat([db, df_to_append])
+    db = db[(db["end"] - db["start"]) > pd.to_timedelta(1, unit="m")]
+    return db.sort_values("start").reset_index(drop=True)
+
+
+def test_split_sessions_by_day_single_midnight():
+    random_state = np.random.RandomState(0)
+    starts = pd.to_datetime("2017-01-01") + pd.to_timedelta(
+        np.sort(random_state.randint(0, 365 * 24 * 60, 2000)), unit="m"
+    )
+    db = pd.DataFrame(
+        {
+            "start": starts,
+            "end": starts + pd.to_timedelta(random_state.randint(0, 20 * 60, 2000), unit="m"),
+            "occupation": "Inno",
+        }
+    )
+    assert_frame_equal(
+        WorktimeCalculator.split_sessions_by_day(db), split_date_overlap_reference(db)
+    )
+
+
+def test_split_date_overlap_session_crossing_only(Calculator):
+    random_state = np.random.RandomState(1)
+    starts = pd.to_datetime("2017-01-01") + pd.to_timedelta(
+        np.sort(random_state.randint(0, 365 * 24 * 60, 2000)), unit="m"
+    )
+    db = pd.DataFrame(
+        {
+            "start": starts,
+            "end": starts + pd.to_timedelta(random_state.randint(0, 50 * 60, 2000), unit="m"),
+            "occupation": "Inno",
+        }
+    )
+    Calculator.db = db
+    Calculator.split_date_overlap_session()
+    # segments starting at the same midnight can be in a different order
+    assert_frame_equal(
+        Calculator.db.sort_values(["start", "end"]).reset_index(drop=True),
+        WorktimeCalculator.split_sessions_by_day(db)
+        .sort_values(["start", "end"])
+        .reset_index(drop=True),
+    )
+
+
+@pytest.mark.parametrize("n_days", [1, 2, 3, 10])
+def test_split_sessions_by_day_multiple_days(n_days):
+    start = str_datetime("2017-08-04 18:00:00.0")
+    end = start.replace(hour=9) + datetime.timedelta(days=n_days)
+    db = pd.DataFrame([{"start": start, "end": end, "occupation": "Inno"}])
+    split_db = WorktimeCalculator.split_sessions_by_day(db)
+    assert len(split_db.index) == n_days + 1
+    assert (split_db["end"] - split_db["start"].dt.normalize() <= pd.Timedelta(days=1)).all()
+    assert split_db["start"].iloc[0] == start
+    assert split_db["end"].iloc[-1] == end
+    assert (split_db["start"].iloc[1:] == split_db["end"].iloc[:-1].values).all()
+    assert (split_db["end"] - split_db["start"]).sum() == end - start
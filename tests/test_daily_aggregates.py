@@ -0,0 +1,122 @@
+"""
+@file: test_daily_aggregates.py
+"""
+
+import pandas as pd
+import pytest
+from pandas.util.testing import assert_frame_equal
+
+from work_tracker.functions.daily_aggregates import DailyAggregates, is_day_aligned
+
+
+@pytest.fixture(scope="function")
+def sessions_db():
+    starts = pd.date_range("2017-08-01 08:00", periods=30, freq="12H")
+    return pd.DataFrame(
+        {
+            "start": starts,
+            "end": starts + pd.Timedelta(hours=2),
+            "occupation": ["Inno", "RemEx", "OnPrEx"] * 10,
+        }
+    )
+
+
+@pytest.fixture(scope="function")
+def daily_aggregates(tmp_path, monkeypatch):
+    daily_aggregates = DailyAggregates(
+        str(tmp_path / "daily_aggregates.tsv"), str(tmp_path / "daily_aggregates.ini")
+    )
+    # record the number of rows which get aggregated
+    daily_aggregates.aggregated_rows = []
+    original_aggregate = DailyAggregates.aggregate
+
+    def mock_aggregate(cls, df, source):
+        daily_aggregates.aggregated_rows.append((source, len(df.index)))
+        return original_aggregate(df, source)
+
+    monkeypatch.setattr(DailyAggregates, "aggregate", classmethod(mock_aggregate))
+    return daily_aggregates
+
+
+def get_credits():
+    return pd.DataFrame(
+        {
+            "start": pd.to_datetime(["2017-08-04", "2017-08-04"]),
+            "occupation": ["holiday", "target"],
+            "worktime": pd.to_timedelta([8, 8], unit="h"),
+            "source": ["credits", "target"],
+        }
+    )
+
+
+def mock_get_credits_unchanged():
+    raise AssertionError("credits were calculated again, despite the same credits_hash")
+
+
+def sort_aggregates(aggregates):
+    return aggregates.sort_values(["source", "day", "occupation"]).reset_index(drop=True)
+
+
+def test_daily_aggregates_incremental(daily_aggregates, sessions_db):
+    aggregates = daily_aggregates.update(sessions_db.iloc[:20], get_credits, "credits_hash")
+    assert aggregates["worktime"].sum() == pd.Timedelta(hours=2 * 20 + 16)
+    daily_aggregates.aggregated_rows.clear()
+    # only the days of the added sessions get aggregated again
+    aggregates = daily_aggregates.update(sessions_db, mock_get_credits_unchanged, "credits_hash")
+    assert daily_aggregates.aggregated_rows == [("sessions", 10)]
+    full_aggregates = DailyAggregates.aggregate(
+        sessions_db.assign(worktime=sessions_db["end"] - sessions_db["start"]), "sessions"
+    )
+    assert_frame_equal(
+        sort_aggregates(aggregates[aggregates["source"] == "sessions"]),
+        sort_aggregates(full_aggregates),
+    )
+    # the saved aggregates are the same
+    assert_frame_equal(sort_aggregates(daily_aggregates.load()), sort_aggregates(aggregates))
+
+
+def test_daily_aggregates_extended(daily_aggregates, sessions_db, monkeypatch):
+    daily_aggregates.update(sessions_db, get_credits, "credits_hash")
+    daily_aggregates.aggregated_rows.clear()
+    saved = []
+    monkeypatch.setattr(
+        daily_aggregates, "save", lambda aggregates, state: saved.append(len(aggregates.index))
+    )
+    # unchanged sessions neither get aggregated nor saved again
+    daily_aggregates.update(sessions_db, mock_get_credits_unchanged, "credits_hash")
+    assert daily_aggregates.aggregated_rows == []
+    assert saved == []
+    # extending a session only aggregates its day again
+    extended_db = sessions_db.copy()
+    extended_db.at[29, "end"] += pd.Timedelta(hours=1)
+    aggregates = daily_aggregates.update(extended_db, mock_get_credits_unchanged, "credits_hash")
+    assert daily_aggregates.aggregated_rows == [("sessions", 2)]
+    assert len(saved) == 1
+    assert aggregates["worktime"].sum() == pd.Timedelta(hours=2 * 30 + 16 + 1)
+
+
+def test_daily_aggregates_rebuild(daily_aggregates, sessions_db):
+    daily_aggregates.update(sessions_db, get_credits, "credits_hash")
+    daily_aggregates.aggregated_rows.clear()
+    # changes of complete days cause a rebuild, when a new instance (i.e. the one of a
+    # reloaded calculator) validates the saved aggregates
+    changed_db = sessions_db.copy()
+    changed_db.at[0, "occupation"] = "RemEx"
+    reloaded_aggregates = DailyAggregates(
+        daily_aggregates.aggregates_path, daily_aggregates.state_path
+    )
+    aggregates = reloaded_aggregates.update(changed_db, get_credits, "new_credits_hash")
+    assert daily_aggregates.aggregated_rows == [
+        ("sessions", 30),
+        ("credits", 1),
+        ("target", 1),
+    ]
+    first_day = aggregates[aggregates["day"] == pd.Timestamp("2017-08-01")]
+    assert set(first_day["occupation"]) == {"RemEx"}
+
+
+@pytest.mark.parametrize(
+    "rule,expected", [("D", True), ("2D", True), ("W", True), ("M", True), ("4H", False)]
+)
+def test_is_day_aligned(rule, expected):
+    assert is_day_aligned(rule) == expected
@@ -4,12 +4,18 @@
 """
 
 import datetime
+import hashlib
 import os
+import threading
+
+import pytest
 
 from work_tracker.functions.helpfer_functions import (
     debug_printer,
     get_abs_path,
     get_midnight_datetime,
+    hash_file,
+    invalidate_file_hash,
     seconds_to_hm,
     str_datetime,
 )
@@ -55,3 +61,81 @@ testvar
 testvar content
 """
     )
+
+
+@pytest.mark.parametrize("algorithm", ["md5", "blake2b"])
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_hash_file(algorithm, use_mmap, tmp_path):
+    file_path = tmp_path / "hash_test.tsv"
+    content = os.urandom(10000)
+    file_path.write_bytes(content)
+    expected = hashlib.new(algorithm, content).hexdigest()
+    assert hash_file(str(file_path), algorithm, chunk_size=1024, use_mmap=use_mmap) == expected
+
+
+def test_hash_file_empty(tmp_path):
+    file_path = tmp_path / "empty.tsv"
+    file_path.write_bytes(b"")
+    assert hash_file(str(file_path), use_mmap=True) == hashlib.md5(b"").hexdigest()
+
+
+def test_hash_file_cache(tmp_path, monkeypatch):
+    file_path = tmp_path / "hash_test.tsv"
+    file_path.write_bytes(b"original content")
+    original_hash = hash_file(str(file_path))
+    hashed_files = []
+    monkeypatch.setattr(
+        "work_tracker.functions.helpfer_functions.get_hasher",
+        lambda algorithm: hashed_files.append(algorithm) or hashlib.md5(),
+    )
+    # unchanged files aren't hashed again
+    assert hash_file(str(file_path)) == original_hash
+    assert hashed_files == []
+    # same size and mtime, but the change time differs
+    file_stat = os.stat(file_path)
+    file_path.write_bytes(b"changed  content")
+    os.utime(file_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns))
+    assert hash_file(str(file_path)) == hashlib.md5(b"changed  content").hexdigest()
+    # files written by the app are hashed again even if their stat didn't change
+    invalidate_file_hash(str(file_path))
+    assert hash_file(str(file_path)) == hashlib.md5(b"changed  content").hexdigest()
+    assert len(hashed_files) == 2
+
+
+def test_hash_file_cache_threads(tmp_path):
+    file_paths = []
+    for index in range(20):
+        file_path = tmp_path / f"hash_test_{index}.tsv"
+        file_path.write_bytes(str(index).encode())
+        file_paths.append(str(file_path))
+    errors = []
+
+    def hash_files():
+        try:
+            for _ in range(50):
+                for file_path in file_paths:
+                    hash_file(file_path)
+        except Exception as error:
+            errors.append(error)
+
+    def invalidate_files():
+        try:
+            for _ in range(50):
+                for file_path in file_paths:
+                    invalidate_file_hash(file_path)
+        except Exception as error:
+            errors.append(error)
+
+    # the sync thread and the tick thread use the cache at the same time
+    threads = [threading.Thread(target=target) for target in [hash_files, invalidate_files] * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert hash_file(file_paths[3]) == hashlib.md5(b"3").hexdigest()
+
+
+def test_hash_file_missing():
+    with pytest.warns(UserWarning, match="does not exist"):
+        assert hash_file("not_existing.tsv") is None
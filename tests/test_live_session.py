@@ -0,0 +1,45 @@
+"""
+@file: test_live_session.py
+"""
+
+import pandas as pd
+from pandas.util.testing import assert_frame_equal
+
+from work_tracker.functions.live_session import SessionStore, to_ns
+
+
+def test_session_store_roundtrip(test_data_base):
+    db = test_data_base["offline_df"]
+    store = SessionStore.from_dataframe(db)
+    assert len(store) == len(db.index)
+    assert_frame_equal(store.to_dataframe(), db)
+
+
+def test_session_store_append_grows(test_data_base):
+    db = test_data_base["offline_df"]
+    store = SessionStore.from_dataframe(db)
+    start = to_ns(pd.to_datetime("2017-08-09 10:00:00"))
+    for offset in range(10):
+        position = store.append(start + offset, start + offset, "NewOccupation")
+    assert position == len(db.index) + 9
+    assert store.occupations.count("NewOccupation") == 1
+    record = store.record(position)
+    assert (record.start, record.end, record.occupation) == (
+        start + 9,
+        start + 9,
+        "NewOccupation",
+    )
+    assert store.positions_since(start) == list(range(len(db.index), position + 1))
+    subset = store.to_dataframe([0, position])
+    assert len(subset.index) == 2
+    assert subset.at[1, "occupation"] == "NewOccupation"
+
+
+def test_session_store_remove_short_sessions(test_data_base):
+    db = test_data_base["offline_df"]
+    store = SessionStore.from_dataframe(db)
+    start = to_ns(pd.to_datetime("2017-08-09 10:00:00"))
+    store.append(start, start + 30 * 10**9, "Short")
+    assert store.remove_short_sessions(60 * 10**9)
+    assert not store.remove_short_sessions(60 * 10**9)
+    assert_frame_equal(store.to_dataframe(), db)
@@ -0,0 +1,233 @@
+"""
+@file: test_plot_data.py
+"""
+
+import os
+import shutil
+
+import pandas as pd
+import pytest
+from pandas.util.testing import assert_frame_equal
+
+from work_tracker.functions.storage import TsvStorage
+from work_tracker.plotting.plot_data import ROLLUP_RULES, PlotDataCache, WorktimeRollups
+
+from .custom_mocks import mock_empty_delta, mock_pysftp_CnOpts, mock_True
+
+
+@pytest.fixture(scope="function")
+def plot_data(monkeypatch, data_test_calc):
+    monkeypatch.setattr("work_tracker.functions.base_classes.DbBaseClass.get_remote_db", mock_True)
+    monkeypatch.setattr(
+        "work_tracker.functions.base_classes.DbBaseClass.pull_remote_deltas", mock_empty_delta
+    )
+    monkeypatch.setattr("pysftp.CnOpts", mock_pysftp_CnOpts)
+    return PlotDataCache("../tests/test_data/test_user_config_calc_worktime.ini")
+
+
+@pytest.fixture(scope="function")
+def tmp_plot_data(plot_data, data_test_calc, tmp_path):
+    """PlotDataCache on a copy of the test data, whose files can be changed."""
+    data_folder = tmp_path / "calc_worktime"
+    shutil.copytree(os.path.dirname(data_test_calc["test_df_path"]), data_folder)
+    user_config_path = tmp_path / "user_config.ini"
+    user_config_path.write_text(f"[paths]\ndata_folder = {data_folder}\n")
+    return PlotDataCache(str(user_config_path))
+
+
+def test_refresh(tmp_plot_data, data_test_calc):
+    state = tmp_plot_data.refresh()
+    data_version = tmp_plot_data.get_version()
+    total_before = state.rollups.get_plot_df("D", None, None)["total"].sum()
+    # unchanged data keeps the state
+    assert tmp_plot_data.refresh() is state
+    assert tmp_plot_data.get_version() == data_version
+    # a changed db reloads the data
+    test_df = data_test_calc["test_df"]
+    test_df_path = state.calculator.db_path_online
+    test_df.iloc[:-1].to_csv(test_df_path, sep="\t", index=False)
+    stat = os.stat(test_df_path)
+    os.utime(test_df_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    reloaded_state = tmp_plot_data.refresh()
+    assert reloaded_state is not state
+    assert tmp_plot_data.get_version() != data_version
+    assert len(reloaded_state.calculator.db.index) < len(state.calculator.db.index)
+    removed_session = test_df.iloc[-1]
+    reloaded_total = reloaded_state.rollups.get_plot_df("D", None, None)["total"].sum()
+    assert total_before - reloaded_total == removed_session["end"] - removed_session["start"]
+
+
+def test_get_plot_df(plot_data):
+    plot_df = plot_data.get_plot_df(["Inno"], "2017-08-07", "2017-08-08", rule="D")
+    calculator = plot_data.get_calculator()
+    total_df = calculator.get_total_df()
+    total_df = total_df[
+        (total_df["start"] >= "2017-08-07") & (total_df["start"] < "2017-08-09")
+    ]
+    expected = calculator.pivot_worktime(total_df, "D")[["total", "Inno"]]
+    assert_frame_equal(plot_df, expected)
+    assert list(plot_data.get_plot_df(["Inno", "unknown"]).columns) == ["total", "Inno"]
+
+
+def test_get_plot_df_cached(tmp_plot_data, data_test_calc):
+    plot_df = tmp_plot_data.get_plot_df(["Inno", "RemEx"])
+    total_before = plot_df["total"].sum()
+    calculator = tmp_plot_data.get_calculator()
+    assert len(tmp_plot_data.cache) == 1
+    # changing the returned Dataframe doesn't change the cache
+    plot_df.drop(plot_df.index, inplace=True)
+    assert not tmp_plot_data.get_plot_df(["Inno", "RemEx"]).empty
+    assert tmp_plot_data.get_calculator() is calculator
+    assert len(tmp_plot_data.cache) == 1
+    # a new data version isn't served from the cache
+    test_df = data_test_calc["test_df"]
+    test_df.iloc[:-1].to_csv(calculator.db_path_online, sep="\t", index=False)
+    stat = os.stat(calculator.db_path_online)
+    os.utime(calculator.db_path_online, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    reloaded_plot_df = tmp_plot_data.get_plot_df(["Inno", "RemEx"])
+    assert len(tmp_plot_data.cache) == 2
+    removed_session = test_df.iloc[-1]
+    assert total_before - reloaded_plot_df["total"].sum() == (
+        removed_session["end"] - removed_session["start"]
+    )
+
+
+def test_cache_max_size(plot_data):
+    plot_data.max_size = 2
+    for day in ["2017-08-07", "2017-08-08", "2017-08-09"]:
+        plot_data.get_plot_df(["Inno"], day, day, rule="D")
+    assert len(plot_data.cache) == 2
+    assert pd.Timestamp("2017-08-07") not in [key[0] for key in plot_data.cache]
+
+
+def test_get_plot_df_not_rollup_rule(plot_data):
+    calculator = plot_data.get_calculator()
+    plot_df = plot_data.get_plot_df(["Inno"], "2017-08-07", "2017-08-08", rule="4H")
+    full_plot_df = calculator.get_plot_df("4H")
+    assert_frame_equal(plot_df, full_plot_df.loc["2017-08-07":"2017-08-08", ["total", "Inno"]])
+    report_cache_keys = list(calculator.report_cache)
+    # other ranges are sliced from the memoized whole data
+    plot_data.get_plot_df(["Inno"], "2017-08-08", "2017-08-09", rule="4H")
+    assert list(calculator.report_cache) == report_cache_keys
+
+
+def test_journal_appended(plot_data, data_test_calc):
+    state = plot_data.refresh()
+    plot_df = state.rollups.get_plot_df("D", None, None)
+    raw_db = state.calculator.raw_db.copy()
+    aggregates = state.calculator.daily_aggregates.aggregates.copy()
+    sessions = pd.DataFrame(
+        {
+            "start": pd.to_datetime(["2017-08-13 10:00:00", "2017-08-13 22:00:00"]),
+            "end": pd.to_datetime(["2017-08-13 12:00:00", "2017-08-14 02:00:00"]),
+            "occupation": ["RemEx", "Inno"],
+        }
+    )
+    try:
+        TsvStorage().append(sessions.iloc[:1], data_test_calc["journal_path"])
+        plot_data.refresh()
+        TsvStorage().append(sessions.iloc[1:], data_test_calc["journal_path"])
+        appended_plot_df = plot_data.refresh().rollups.get_plot_df("D", None, None)
+        # only the journal rows were added to a copy of the calculator
+        assert plot_data.state is not state
+        assert plot_data.state.journal_offset == os.path.getsize(data_test_calc["journal_path"])
+        assert_frame_equal(
+            plot_data.calculator.raw_db,
+            pd.concat([raw_db, sessions], ignore_index=True, sort=False),
+        )
+        # the old state wasn't changed
+        assert_frame_equal(state.calculator.raw_db, raw_db)
+        assert_frame_equal(state.calculator.get_plot_df("D"), plot_df)
+        assert plot_data.calculator.daily_aggregates is not state.calculator.daily_aggregates
+        assert_frame_equal(state.calculator.daily_aggregates.aggregates, aggregates)
+        assert appended_plot_df["total"].sum() - plot_df["total"].sum() == pd.Timedelta(hours=6)
+        assert appended_plot_df.loc["2017-08-14", "Inno"] == pd.Timedelta(hours=2)
+    finally:
+        os.remove(data_test_calc["journal_path"])
+    # a removed journal causes a reload
+    plot_data.refresh()
+    assert_frame_equal(plot_data.calculator.raw_db, raw_db)
+
+
+def test_journal_with_remote_db(plot_data, data_test_calc):
+    raw_db = plot_data.get_calculator().raw_db.copy()
+    plot_data.state = None
+    sessions = pd.DataFrame(
+        {
+            "start": pd.to_datetime(["2017-08-13 10:00:00"]),
+            "end": pd.to_datetime(["2017-08-13 12:00:00"]),
+            "occupation": ["RemEx"],
+        }
+    )
+    try:
+        TsvStorage().append(sessions, data_test_calc["journal_path"])
+        state = plot_data.refresh()
+        # the remote db doesn't contain the journal rows of this computer
+        assert state.calculator.loaded_remote_db
+        assert state.journal_offset == os.path.getsize(data_test_calc["journal_path"])
+        assert_frame_equal(
+            state.calculator.raw_db,
+            pd.concat([raw_db, sessions], ignore_index=True, sort=False),
+        )
+        assert state.rollups.get_plot_df("D", "2017-08-13", None)["RemEx"].sum() == (
+            pd.Timedelta(hours=2)
+        )
+    finally:
+        os.remove(data_test_calc["journal_path"])
+
+
+def test_rollups_slice(plot_data):
+    calculator = plot_data.get_calculator()
+    rollups = plot_data.state.rollups
+    assert sorted(rollups.plot_dfs) == sorted(ROLLUP_RULES.values())
+    assert_frame_equal(rollups.get_plot_df("M", None, None), calculator.get_plot_df("M"))
+    # bins which overlap with the range are returned as a whole
+    week_df = rollups.get_plot_df("W", pd.Timestamp("2017-08-06"), pd.Timestamp("2017-08-08"))
+    assert list(week_df.index) == [pd.Timestamp("2017-08-06"), pd.Timestamp("2017-08-13")]
+    assert_frame_equal(week_df, calculator.get_plot_df("W").loc["2017-08-06":"2017-08-13"])
+    week_df = rollups.get_plot_df("W", pd.Timestamp("2017-08-07"), pd.Timestamp("2017-08-08"))
+    assert list(week_df.index) == [pd.Timestamp("2017-08-13")]
+    assert rollups.get_plot_df("D", pd.Timestamp("2030-01-01"), None).empty
+
+
+def test_rollups_update(plot_data):
+    calculator = plot_data.get_calculator()
+    rollups = WorktimeRollups.build(calculator)
+    calculator.add_sessions(
+        pd.DataFrame(
+            {
+                "start": pd.to_datetime(["2017-08-12 20:00:00", "2017-10-02 22:00:00"]),
+                "end": pd.to_datetime(["2017-08-12 21:00:00", "2017-10-04 02:00:00"]),
+                "occupation": ["RemEx", "Teaching"],
+            }
+        )
+    )
+    updated_rollups = rollups.update(calculator, pd.Timestamp("2017-08-12"))
+    for rule in ROLLUP_RULES.values():
+        expected = calculator.get_plot_df(rule)
+        updated = updated_rollups.get_plot_df(rule, None, None)
+        assert_frame_equal(updated[expected.columns], expected)
+    # the old rollups weren't changed
+    assert "Teaching" not in rollups.get_plot_df("D", None, None).columns
+
+
+def test_get_plot_data(plot_data):
+    plot_data_dict = plot_data.get_plot_data()
+    calculator = plot_data.get_calculator()
+    # like the occupations of the dashboard, only the worked sessions are included
+    assert list(plot_data_dict["columns"]) == plot_data.get_occupations()
+    assert "vacation" in calculator.get_plot_df("D").columns
+    days = pd.date_range(calculator.db["start"].min().normalize(), calculator.db["end"].max())
+    assert plot_data_dict["days"] == days.strftime("%Y-%m-%d").tolist()
+    daily_worktime = calculator.db.assign(
+        worktime=calculator.db["end"] - calculator.db["start"]
+    ).pivot_table("worktime", "start", "occupation", aggfunc="sum")
+    daily_worktime = daily_worktime.resample("D").sum().reindex(days, fill_value=pd.Timedelta(0))
+    for occupation, hours in plot_data_dict["columns"].items():
+        expected = (daily_worktime[occupation].dt.total_seconds() / 3600).round(4)
+        assert hours == expected.tolist()
+
+
+def test_get_date_range(plot_data):
+    starts = plot_data.get_calculator().db["start"]
+    assert plot_data.get_date_range() == (starts.min(), starts.max())
@@ -0,0 +1,50 @@
+"""
+@file: test_session_index.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from work_tracker.functions.session_index import SessionIntervalIndex
+
+
+@pytest.fixture(scope="function")
+def random_db():
+    random_state = np.random.RandomState(42)
+    starts = pd.to_datetime("2017-08-01") + pd.to_timedelta(
+        random_state.randint(0, 30 * 24 * 60, 500), unit="m"
+    )
+    ends = starts + pd.to_timedelta(random_state.randint(0, 10 * 60, 500), unit="m")
+    return pd.DataFrame({"start": starts, "end": ends, "occupation": "Inno"})
+
+
+def test_sessions_between(random_db):
+    session_index = SessionIntervalIndex(random_db)
+    start, end = pd.to_datetime("2017-08-10"), pd.to_datetime("2017-08-12 12:00")
+    expected = np.flatnonzero((random_db["start"] >= start) & (random_db["start"] < end))
+    assert np.array_equal(np.sort(session_index.sessions_between(start, end)), expected)
+    assert len(session_index.sessions_between(None, None)) == len(random_db.index)
+
+
+def test_overlapping(random_db):
+    session_index = SessionIntervalIndex(random_db)
+    start, end = pd.to_datetime("2017-08-10"), pd.to_datetime("2017-08-12 12:00")
+    expected = np.flatnonzero((random_db["start"] < end) & (random_db["end"] > start))
+    assert np.array_equal(np.sort(session_index.overlapping(start, end)), expected)
+
+
+def test_conflicts(random_db):
+    session_index = SessionIntervalIndex(random_db)
+    expected = np.flatnonzero(random_db["start"].duplicated())
+    assert np.array_equal(np.sort(session_index.conflicts()), expected)
+    max_ends = random_db.groupby("start", sort=False)["end"].transform("max")
+    assert np.array_equal(session_index.max_end_by_start(), max_ends.values)
+
+
+def test_crossing_midnight(random_db):
+    session_index = SessionIntervalIndex(random_db)
+    expected = np.flatnonzero(
+        random_db["start"].dt.normalize() != random_db["end"].dt.normalize()
+    )
+    assert np.array_equal(np.sort(session_index.crossing_midnight()), expected)
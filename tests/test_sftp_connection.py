@@ -0,0 +1,81 @@
+"""
+@file: test_sftp_connection.py
+"""
+
+import pysftp
+import pytest
+
+from work_tracker.functions.sftp_connection import SftpConnectionManager
+
+
+@pytest.fixture()
+def login_dict(sftpserver):
+    cnopts = pysftp.CnOpts()
+    cnopts.hostkeys = None
+    return {
+        "host": sftpserver.host,
+        "username": "user",
+        "password": "pw",
+        "port": sftpserver.port,
+        "cnopts": cnopts,
+    }
+
+
+@pytest.fixture()
+def connection_counter(monkeypatch):
+    connections = []
+    orig_connection = pysftp.Connection
+
+    def counting_connection(*args, **kwargs):
+        connection = orig_connection(*args, **kwargs)
+        connections.append(connection)
+        return connection
+
+    monkeypatch.setattr("pysftp.Connection", counting_connection)
+    return connections
+
+
+def test_connection_is_reused(sftpserver, login_dict, connection_counter):
+    manager = SftpConnectionManager()
+    with sftpserver.serve_content({"test_folder": {"test_file.csv": "content"}}):
+        for _ in range(3):
+            with manager.connect(login_dict) as sftp:
+                assert sftp.exists("/test_folder/test_file.csv")
+        assert len(connection_counter) == 1
+        assert manager.is_connected()
+        manager.close()
+        assert not manager.is_connected()
+
+
+def test_reconnect_broken_connection(sftpserver, login_dict, connection_counter):
+    manager = SftpConnectionManager()
+    with sftpserver.serve_content({"test_folder": {"test_file.csv": "content"}}):
+        with manager.connect(login_dict):
+            pass
+        # simulate a connection loss
+        manager.sftp._transport.close()  # type: ignore
+        with manager.connect(login_dict) as sftp:
+            assert sftp.exists("/test_folder/test_file.csv")
+        assert len(connection_counter) == 2
+
+
+def test_reconnect_backoff(sftpserver, login_dict, monkeypatch):
+    current_time = [1000.0]
+    manager = SftpConnectionManager(backoff_base=5, backoff_max=12)
+    monkeypatch.setattr(manager, "get_time", lambda: current_time[0])
+    broken_login = {**login_dict, "port": 1}
+    for failed_attempts, backoff in [(1, 5), (2, 10), (3, 12)]:
+        with pytest.raises(Exception):
+            with manager.connect(broken_login):
+                pass
+        assert manager.failed_attempts == failed_attempts
+        assert manager.next_retry == current_time[0] + backoff
+        # no connection attempt during the backoff
+        with pytest.raises(ConnectionError, match="retrying in"):
+            manager.get_connection(broken_login)
+        current_time[0] += backoff
+    # a changed login resets the backoff
+    with sftpserver.serve_content({"test_folder": {}}):
+        with manager.connect(login_dict) as sftp:
+            assert sftp.exists("/test_folder")
+    assert manager.failed_attempts == 0
@@ -0,0 +1,29 @@
+"""
+@file: test_startup.py
+"""
+
+import json
+import subprocess
+import sys
+
+from work_tracker.functions.helpfer_functions import get_abs_path
+
+# modules which are only needed for synchronization or reports
+LAZY_MODULES = ["pysftp", "paramiko", "cryptography", "holidays", "dash", "flask"]
+
+
+def test_tracker_startup_imports():
+    import_script = (
+        "import json, sys;"
+        "import work_tracker.functions.sync_worker;"
+        "import work_tracker.functions.update_work_db;"
+        f"print(json.dumps([name for name in {LAZY_MODULES!r} if name in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", import_script],
+        cwd=get_abs_path(".."),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert json.loads(result.stdout) == []
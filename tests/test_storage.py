@@ -0,0 +1,148 @@
+"""
+@file: test_storage.py
+"""
+
+import os
+
+import pandas as pd
+import pytest
+from pandas.util.testing import assert_frame_equal
+from tests.custom_mocks import mock_pysftp_CnOpts
+
+from work_tracker.functions.base_classes import DbBaseClass
+from work_tracker.functions.storage import (
+    NpyStorage,
+    SqliteStorage,
+    TsvStorage,
+    detect_storage,
+    get_storage,
+    read_db,
+)
+from work_tracker.functions.update_work_db import DbInteraction
+
+
+@pytest.mark.parametrize("db_format", ["tsv", "npy", "sqlite"])
+def test_storage_roundtrip(db_format, test_data_base, tmp_path):
+    storage = get_storage(db_format)
+    db_path = str(tmp_path / f"local_db.{storage.file_extension}")
+    db = test_data_base["offline_df"][["start", "end", "occupation"]]
+    storage.write(db, db_path)
+    assert_frame_equal(storage.read(db_path), db)
+    assert_frame_equal(read_db(db_path), db)
+
+
+@pytest.mark.parametrize("db_format", ["tsv", "npy", "sqlite"])
+def test_storage_read_range(db_format, test_data_base, tmp_path):
+    storage = get_storage(db_format)
+    db_path = str(tmp_path / f"local_db.{storage.file_extension}")
+    db = test_data_base["offline_df"][["start", "end", "occupation"]]
+    storage.write(db, db_path)
+    range_db = storage.read(db_path, start=pd.to_datetime("2017-08-07"))
+    assert_frame_equal(range_db.reset_index(drop=True), db.iloc[1:].reset_index(drop=True))
+    range_db = storage.read(
+        db_path, start=pd.to_datetime("2017-08-07"), end=pd.to_datetime("2017-08-08")
+    )
+    assert_frame_equal(range_db.reset_index(drop=True), db.iloc[1:2].reset_index(drop=True))
+
+
+def test_sqlite_upsert(test_data_base, tmp_path):
+    storage = SqliteStorage()
+    db_path = str(tmp_path / "local_db.sqlite")
+    db = test_data_base["offline_df"][["start", "end", "occupation"]].copy()
+    storage.write(db, db_path)
+    changed_rows = pd.DataFrame(
+        [
+            {
+                "start": db.at[2, "start"],
+                "end": pd.to_datetime("2017-08-08 18:29:33"),
+                "occupation": "Inno",
+            },
+            {
+                "start": pd.to_datetime("2017-08-08 18:39:33"),
+                "end": pd.to_datetime("2017-08-08 18:39:33"),
+                "occupation": "RemEx",
+            },
+        ]
+    )
+    storage.upsert(changed_rows, db_path)
+    db.at[2, "end"] = changed_rows.at[0, "end"]
+    db = pd.concat([db, changed_rows.iloc[1:]], ignore_index=True)
+    assert_frame_equal(storage.read(db_path), db)
+
+
+def test_tsv_read_appended(test_data_base, tmp_path):
+    storage = TsvStorage()
+    db_path = str(tmp_path / "local_db_journal.tsv")
+    db = test_data_base["offline_df"][["start", "end", "occupation"]]
+    storage.append(db.iloc[:2], db_path)
+    rows, offset = storage.read_appended(db_path, 0)
+    assert_frame_equal(rows, db.iloc[:2])
+    assert offset == os.path.getsize(db_path)
+    rows, offset = storage.read_appended(db_path, offset)
+    assert rows.empty
+    storage.append(db.iloc[2:], db_path)
+    # incomplete lines are read the next time
+    with open(db_path, "a") as db_file:
+        db_file.write("2017-08-20 10:00:00")
+    rows, offset = storage.read_appended(db_path, offset)
+    assert_frame_equal(rows, db.iloc[2:].reset_index(drop=True))
+    assert offset == os.path.getsize(db_path) - len("2017-08-20 10:00:00")
+
+
+def test_upsert_unsupported(test_data_base, tmp_path):
+    with pytest.raises(NotImplementedError, match="TsvStorage doesn't support"):
+        TsvStorage().upsert(test_data_base["offline_df"], str(tmp_path / "local_db.tsv"))
+
+
+def test_get_storage_unsupported():
+    with pytest.raises(ValueError, match="Unsupported db_format 'xlsx'"):
+        get_storage("xlsx")
+
+
+def test_detect_storage(test_data_base, tmp_path):
+    db_path = str(tmp_path / "remote_db.tsv")
+    NpyStorage().write(test_data_base["offline_df"], db_path)
+    assert isinstance(detect_storage(db_path), NpyStorage)
+    SqliteStorage().write(test_data_base["offline_df"], db_path)
+    assert isinstance(detect_storage(db_path), SqliteStorage)
+    assert isinstance(detect_storage(test_data_base["offline_df_path"]), TsvStorage)
+
+
+def test_migrate_tsv_to_npy(test_data_base, monkeypatch, tmp_path):
+    monkeypatch.setattr("pysftp.CnOpts", mock_pysftp_CnOpts)
+    user_config_path = tmp_path / "user_config.ini"
+    data_folder = os.path.dirname(test_data_base["offline_df_path"])
+    user_config_path.write_text(f"[paths]\ndata_folder = {data_folder}\ndb_format = npy\n")
+    db_worker = DbBaseClass(str(user_config_path))
+    db_worker.load_config()
+    assert db_worker.db_path_offline.endswith("local_db.npy")
+    assert not os.path.isfile(db_worker.db_path_offline)
+    assert_frame_equal(db_worker.load_db(db_worker.db_path_offline), test_data_base["offline_df"])
+
+
+def test_migration_retires_legacy_db(test_data_base, monkeypatch, tmp_path):
+    monkeypatch.setattr("pysftp.CnOpts", mock_pysftp_CnOpts)
+    user_config_path = tmp_path / "user_config.ini"
+    user_config_path.write_text(f"[paths]\ndata_folder = {tmp_path}\ndb_format = npy\n")
+    TsvStorage().write(test_data_base["offline_df"], str(tmp_path / "local_db.tsv"))
+    db_worker = DbInteraction(str(user_config_path))
+    db_worker.compact_db_locale()
+    assert_frame_equal(read_db(db_worker.db_path_offline), db_worker.db)
+    # the outdated tsv file isn't found anymore, but kept as backup
+    assert not os.path.isfile(tmp_path / "local_db.tsv")
+    assert os.path.isfile(tmp_path / "local_db.tsv.migrated")
+    assert not os.path.isfile(tmp_path / "local_db.npy.tmp")
+
+
+def test_npy_write_atomic(test_data_base, monkeypatch, tmp_path):
+    db_path = str(tmp_path / "local_db.npy")
+    db = test_data_base["offline_df"][["start", "end", "occupation"]]
+    NpyStorage().write(db, db_path)
+
+    def interrupted_save(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr("numpy.save", interrupted_save)
+    with pytest.raises(KeyboardInterrupt):
+        NpyStorage().write(db.iloc[:1], db_path)
+    assert_frame_equal(NpyStorage().read(db_path), db)
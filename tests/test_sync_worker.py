@@ -0,0 +1,141 @@
+"""
+@file: test_sync_worker.py
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from work_tracker.functions.base_classes import DbBaseClass
+from work_tracker.functions.sync_worker import SyncWorker
+
+from .custom_mocks import mock_datetime_now, mock_time_long_break
+
+# DbInteraction_worker mocks push_remote_db and rotate_remote_delta of DbBaseClass
+base_push_remote_db = DbBaseClass.push_remote_db
+base_rotate_remote_delta = DbBaseClass.rotate_remote_delta
+
+
+class DbWorkerMock:
+    def __init__(self):
+        self.calls = []
+
+    def start_session(self):
+        self.calls.append("start_session")
+
+    def sync_remote_db(self):
+        self.calls.append("sync")
+        raise ConnectionError("server not reachable")
+
+
+def test_sync_worker_jobs(capsys):
+    db_worker = DbWorkerMock()
+    finished_jobs = []
+    sync_worker = SyncWorker(
+        db_worker, on_finished=lambda job, succeeded: finished_jobs.append((job, succeeded))
+    )
+    sync_worker.start()
+    for job in ["start_session", "sync", "start_session"]:
+        sync_worker.submit(job)
+    sync_worker.stop(timeout=10)
+    assert not sync_worker.thread.is_alive()
+    assert db_worker.calls == ["start_session", "sync", "start_session"]
+    assert finished_jobs == [
+        ("start_session", True),
+        ("sync", False),
+        ("start_session", True),
+    ]
+    assert "server not reachable" in capsys.readouterr().err
+
+
+def test_sync_worker_unsupported_job():
+    sync_worker = SyncWorker(DbWorkerMock())
+    with pytest.raises(ValueError, match="Unsupported job 'push'"):
+        sync_worker.submit("push")
+
+
+def test_start_session_network_without_lock(DbInteraction_worker, monkeypatch):
+    lock_states = []
+
+    def mock_get_remote_db(*args):
+        # the db has to stay usable from other threads during network operations
+        def try_lock():
+            acquired = DbInteraction_worker.db_lock.acquire(timeout=5)
+            lock_states.append(acquired)
+            if acquired:
+                DbInteraction_worker.db_lock.release()
+
+        lock_thread = threading.Thread(target=try_lock)
+        lock_thread.start()
+        lock_thread.join()
+        return True
+
+    monkeypatch.setattr(DbInteraction_worker, "get_remote_db", mock_get_remote_db)
+    sync_worker = SyncWorker(DbInteraction_worker)
+    sync_worker.start()
+    sync_worker.submit("start_session")
+    sync_worker.stop(timeout=10)
+    # start_session and the push of the whole db both download the remote db
+    assert lock_states == [True, True]
+
+
+def test_push_remote_db_upload_without_lock(DbInteraction_worker, monkeypatch):
+    monkeypatch.setattr(DbBaseClass, "push_remote_db", base_push_remote_db)
+    monkeypatch.setattr(DbBaseClass, "rotate_remote_delta", base_rotate_remote_delta)
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_pandas_now",
+        mock_time_long_break,
+    )
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_datetime_now",
+        mock_datetime_now,
+    )
+    put_started = threading.Event()
+    finish_put = threading.Event()
+    uploaded_paths = []
+
+    class SftpMock:
+        def put(self, localpath, remotepath, preserve_mtime):
+            put_started.set()
+            finish_put.wait(10)
+            uploaded_paths.append(localpath)
+
+        def stat(self, remotepath):
+            return SimpleNamespace(st_size=1, st_mtime=1)
+
+    @contextmanager
+    def mock_connect(login_dict):
+        yield SftpMock()
+
+    monkeypatch.setattr(DbInteraction_worker.sftp_connection, "connect", mock_connect)
+    pushed_session = DbInteraction_worker.db.iloc[-1]
+    DbInteraction_worker.mark_own_sessions(DbInteraction_worker.db["start"].iloc[-1:])
+    push_results = []
+    push_thread = threading.Thread(
+        target=lambda: push_results.append(DbInteraction_worker.push_remote_db())
+    )
+    push_thread.start()
+    assert put_started.wait(10)
+    # a tick of the tracker completes while the upload is blocked
+    tick_thread = threading.Thread(target=DbInteraction_worker.update_db_locale)
+    tick_thread.start()
+    tick_thread.join(timeout=5)
+    tick_alive = tick_thread.is_alive()
+    finish_put.set()
+    push_thread.join(timeout=10)
+    assert not tick_alive
+    assert push_results == [True]
+    # a snapshot of the local db got uploaded and removed afterwards
+    assert len(uploaded_paths) == 1
+    assert uploaded_paths[0] != DbInteraction_worker.db_path_offline
+    assert not os.path.isfile(uploaded_paths[0])
+    # only the session created during the upload is left for the next delta
+    sync_state = DbInteraction_worker.load_sync_state()
+    own_rows = DbInteraction_worker.get_own_rows(DbInteraction_worker.db, sync_state)
+    assert list(own_rows["start"]) == [mock_time_long_break()]
+    pushed_end = pd.Timestamp(sync_state.get("delta", "pushed_end"))
+    assert pushed_end == pushed_session["end"]
@@ -4,6 +4,8 @@
 """
 
 import datetime
+import os
+import shutil
 
 # import numpy as np
 import pandas as pd
@@ -13,31 +15,16 @@ from tests.custom_mocks import (
     mock_datetime_now,
     mock_datetime_now_date_change,
     mock_numpy_now_date_change,
-    mock_pysftp_CnOpts,
     mock_time_long_break,
     mock_time_short_break,
-    mock_True,
     mock_var_time,
 )
 
 from work_tracker.functions.helpfer_functions import get_midnight_datetime, str_datetime
+from work_tracker.functions.storage import SqliteStorage
 from work_tracker.functions.update_work_db import DbInteraction
 
 
-@pytest.fixture(scope="function")
-def DbInteraction_worker(test_data_base, monkeypatch):
-    monkeypatch.setattr("work_tracker.functions.base_classes.DbBaseClass.get_remote_db", mock_True)
-    monkeypatch.setattr(
-        "work_tracker.functions.base_classes.DbBaseClass.push_remote_db", mock_True
-    )
-    monkeypatch.setattr("pysftp.CnOpts", mock_pysftp_CnOpts)
-    DbInteraction_worker = DbInteraction("../tests/test_data/test_user_config_update_work_db.ini")
-    # mocking the today value
-    DbInteraction_worker.today = datetime.datetime(2017, 8, 8, 0, 0, 0, 0)
-    DbInteraction_worker.tomorrow = datetime.datetime(2017, 8, 9, 0, 0, 0, 0)
-    return DbInteraction_worker
-
-
 def test_get_session_time(DbInteraction_worker):
     assert DbInteraction_worker.get_session_time() == "1:10"
 
@@ -84,6 +71,24 @@ def test_update_db_locale_long_break(DbInteraction_worker, monkeypatch):
     assert len(DbInteraction_worker.db.index) == 4
 
 
+def test_update_db_locale_marks_own_sessions(DbInteraction_worker, monkeypatch):
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_pandas_now",
+        mock_time_long_break,
+    )
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_datetime_now",
+        mock_datetime_now,
+    )
+    DbInteraction_worker.update_db_locale()
+    own_rows = DbInteraction_worker.get_own_rows(
+        DbInteraction_worker.db, DbInteraction_worker.load_sync_state()
+    )
+    # only the new session was created by this client, the loaded ones weren't
+    assert len(own_rows.index) == 1
+    assert own_rows["start"].iloc[0] == DbInteraction_worker.db["start"].max()
+
+
 def test_update_db_with_day_change_and_running_update(DbInteraction_worker, monkeypatch):
     # this is due to a bug i observed, where after midnight new rows did get appended
     # with start midnight and end current time
@@ -206,7 +211,8 @@ def test_start_session_long_break(DbInteraction_worker, monkeypatch, test_data_b
         ]
     )
     result = test_data_base["result"].copy().append(new_row, ignore_index=True, sort=False)
-    result.sort_values("start").reset_index(drop=True, inplace=True)
+    # merging the remote db before the push sorts the sessions by start
+    result = result.sort_values("start").reset_index(drop=True)
     DbInteraction_worker.occupation = "TestOccupation"
     DbInteraction_worker.start_session()
     assert_frame_equal(DbInteraction_worker.db, result)
@@ -235,3 +241,192 @@ def test_change_occupation(DbInteraction_worker, monkeypatch):
     new_db = new_db.append(new_day_df, ignore_index=True, sort=False)
     DbInteraction_worker.change_occupation("RemEx")
     assert_frame_equal(DbInteraction_worker.db, new_db)
+
+
+def test_update_db_locale_journal(DbInteraction_worker, monkeypatch, test_data_base):
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_pandas_now",
+        mock_time_short_break,
+    )
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_datetime_now",
+        mock_datetime_now,
+    )
+    DbInteraction_worker.update_db_locale()
+    # the local db file is untouched, only the changed row was journaled
+    local_db = pd.read_csv(
+        test_data_base["offline_df_path"], sep="\t", parse_dates=["start", "end"]
+    )
+    assert_frame_equal(local_db, test_data_base["offline_df"])
+    journal_db = pd.read_csv(test_data_base["journal_path"], sep="\t")
+    assert len(journal_db.index) == 1
+    reloaded_worker = DbInteraction("../tests/test_data/test_user_config_update_work_db.ini")
+    assert_frame_equal(reloaded_worker.db, DbInteraction_worker.db, check_like=True)
+
+
+def test_write_db_locale_compaction(DbInteraction_worker, monkeypatch, test_data_base):
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_pandas_now",
+        mock_time_short_break,
+    )
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_datetime_now",
+        mock_datetime_now,
+    )
+    DbInteraction_worker.journal_compact_interval = 2
+    for _ in range(2):
+        DbInteraction_worker.update_db_locale()
+    assert DbInteraction_worker.journal_entries == 2
+    DbInteraction_worker.update_db_locale()
+    assert DbInteraction_worker.journal_entries == 0
+    assert not os.path.isfile(test_data_base["journal_path"])
+    local_db = pd.read_csv(
+        test_data_base["offline_df_path"], sep="\t", parse_dates=["start", "end"]
+    )
+    assert_frame_equal(local_db, DbInteraction_worker.db, check_like=True)
+
+
+def test_write_db_locale_upsert(DbInteraction_worker, monkeypatch, test_data_base, tmp_path):
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_pandas_now",
+        mock_time_short_break,
+    )
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_datetime_now",
+        mock_datetime_now,
+    )
+    DbInteraction_worker.storage = SqliteStorage()
+    DbInteraction_worker.db_path_offline = str(tmp_path / "local_db.sqlite")
+    DbInteraction_worker.compact_db_locale()
+    DbInteraction_worker.update_db_locale()
+    assert not os.path.isfile(test_data_base["journal_path"])
+    assert_frame_equal(
+        DbInteraction_worker.storage.read(DbInteraction_worker.db_path_offline),
+        DbInteraction_worker.db,
+        check_like=True,
+    )
+
+
+def test_day_windows_clock_set_back(DbInteraction_worker, monkeypatch):
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_datetime_now",
+        mock_datetime_now,
+    )
+    n_sessions = len(DbInteraction_worker.db.index)
+    for now in ["2017-08-08 18:29:33", "2017-08-08 18:27:33", "2017-08-08 18:30:33"]:
+        monkeypatch.setattr(
+            "work_tracker.functions.update_work_db.DbInteraction.get_pandas_now",
+            lambda *args: pd.to_datetime(now),
+        )
+        DbInteraction_worker.update_db_locale()
+        _, today_window = DbInteraction_worker.get_day_windows()
+        # the session keeps being extended after the clock was set back
+        assert today_window.last_end == pd.Timestamp(now).value
+        assert len(DbInteraction_worker.db.index) == n_sessions
+    db = DbInteraction_worker.db
+    today_db = db[db["start"] >= DbInteraction_worker.today]
+    assert today_window.work == (today_db["end"] - today_db["start"]).sum().value
+
+
+def test_day_windows_cached(DbInteraction_worker, monkeypatch):
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_pandas_now",
+        mock_time_short_break,
+    )
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_datetime_now",
+        mock_datetime_now,
+    )
+    DbInteraction_worker.update_db_locale()
+    yesterday_window, today_window = DbInteraction_worker.get_day_windows()
+    DbInteraction_worker.update_db_locale()
+    # the windows were updated incrementally and not rebuilt
+    assert DbInteraction_worker.get_day_windows() == (yesterday_window, today_window)
+    db = DbInteraction_worker.db
+    today_db = db[db["start"] >= DbInteraction_worker.today]
+    assert today_window.work == (today_db["end"] - today_db["start"]).sum().value
+    assert today_window.last_end == today_db["end"].max().value
+    # the date change invalidates the windows
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_pandas_now",
+        mock_numpy_now_date_change,
+    )
+    monkeypatch.setattr(
+        "work_tracker.functions.update_work_db.DbInteraction.get_datetime_now",
+        mock_datetime_now_date_change,
+    )
+    DbInteraction_worker.update_db_locale()
+    new_yesterday_window, new_today_window = DbInteraction_worker.get_day_windows()
+    assert new_today_window is not today_window
+    assert new_yesterday_window.positions == today_window.positions
+
+
+@pytest.fixture(scope="function")
+def sftp_client_factory(test_data_base, sftpserver, tmp_path):
+    def create_client(client_id):
+        data_folder = tmp_path / client_id
+        data_folder.mkdir()
+        shutil.copy(test_data_base["offline_df_path"], data_folder / "local_db.tsv")
+        user_config_path = tmp_path / f"{client_id}.ini"
+        user_config_path.write_text(
+            "[login]\nhost = 127.0.0.1\nusername = user\npassword = pw\n"
+            "db_path = /test_folder/test_file.csv\n"
+            f"[paths]\ndata_folder = {data_folder}\n[sync]\nclient_id = {client_id}\n"
+        )
+        client = DbInteraction(str(user_config_path))
+        client.login_dict = {**client.login_dict, "port": sftpserver.port}
+        return client
+
+    return create_client
+
+
+def test_push_remote_db_two_clients(sftp_client_factory, sftpserver, test_data_base):
+    with open(test_data_base["offline_df_path"]) as local_db_file:
+        old_remote_db = local_db_file.read()
+    content = {"test_folder": {"test_file.csv": old_remote_db, "test_file.csv.deltas": {}}}
+    delta_files = content["test_folder"]["test_file.csv.deltas"]
+    new_session = pd.DataFrame(
+        [
+            {
+                "start": str_datetime("2017-08-09 10:00:00.0"),
+                "end": str_datetime("2017-08-09 12:00:00.0"),
+                "occupation": "Inno",
+            }
+        ]
+    )
+
+    def remote_db_has_new_session():
+        remote_db = content["test_folder"]["test_file.csv"]
+        return "2017-08-09 10:00:00" in str(remote_db)
+
+    with sftpserver.serve_content(content):
+        client_a = sftp_client_factory("client_a")
+        client_b = sftp_client_factory("client_b")
+        client_a.db = pd.concat([client_a.db, new_session], ignore_index=True)
+        client_a.write_db_locale(new_session)
+        assert client_a.push_remote_delta()
+        delta_file_name = client_a.load_sync_state().get("delta", "file_name")
+        assert client_a.push_remote_db()
+        assert remote_db_has_new_session()
+        # the test server only serves one connection at a time
+        client_a.close_remote_connection()
+        # client_b replaces the db on the server with its older db, which it pushed
+        # without merging (the test server can't overwrite with smaller files)
+        content["test_folder"]["test_file.csv"] = old_remote_db
+        # the old delta file of client_a still contains the session
+        assert list(delta_files) == [delta_file_name]
+        assert new_session.at[0, "start"] in client_b.pull_remote_deltas()["start"].values
+        client_b.close_remote_connection()
+        # client_a pushes its unchanged db again and keeps the old delta file,
+        # until the db on the server contains the session
+        assert client_a.push_remote_db()
+        assert remote_db_has_new_session()
+        assert list(delta_files) == [delta_file_name]
+        assert client_a.push_remote_db()
+        assert delta_files == {}
+        client_a.close_remote_connection()
+        # client_b merges the db on the server before pushing its db
+        assert client_b.push_remote_db()
+        assert remote_db_has_new_session()
+        assert new_session.at[0, "start"] in client_b.db["start"].values
+        client_b.close_remote_connection()
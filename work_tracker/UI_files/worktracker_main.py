@@ -5,6 +5,7 @@ from typing import Tuple, Union
 
 from PyQt5 import QtCore, QtWidgets
 
+from ..functions.sync_worker import SyncWorker
 from ..functions.update_work_db import DbInteraction, get_abs_path
 from .auto_generated.UI_work_tracker import Ui_work_tracker
 
@@ -21,12 +22,18 @@ class updateThread(QtCore.QThread):
     update_signal = QtCore.pyqtSignal(tuple)
     push_signal = QtCore.pyqtSignal()
     change_occupation_signal = QtCore.pyqtSignal(str)
+    synced_signal = QtCore.pyqtSignal(str, bool)
 
     def __init__(self, parent=None, *args):
         """Separate thread to not block the Ui while updating the database."""
         super().__init__(parent)
         self.db_worker = DbInteraction()
-        self.db_worker.start_session()
+        # the synchronization with the server runs in the background,
+        # so the tracker starts right away with the local db
+        self.sync_worker = SyncWorker(self.db_worker, on_finished=self.synced_signal.emit)
+        self.synced_signal.connect(self.refresh)
+        self.sync_worker.start()
+        self.sync_worker.submit("start_session")
         self.push_signal.connect(self.push_db)
         self.change_occupation_signal.connect(self.change_occupation)
         self.do_updates = True
@@ -40,9 +47,19 @@ class updateThread(QtCore.QThread):
             QtCore.QTimer.singleShot(60000, self.run)
 
     def push_db(self):
-        """Push the db_file from db_path_offline to the SFTP server."""
-        self.db_worker.push_remote_db()
-        print("pushed")
+        """Synchronize the changed sessions with the SFTP server in the background."""
+        self.sync_worker.submit("sync")
+
+    def refresh(self, job: str, succeeded: bool):
+        """Show the merged db after the synchronization finished."""
+        if succeeded:
+            print(f"{job} finished")
+            self.update_signal.emit(self.db_worker.get_start_and_session_time())
+
+    def stop_sync(self):
+        """Wait for pending synchronizations and close the connection to the server."""
+        self.sync_worker.stop()
+        self.db_worker.close_remote_connection()
 
     def change_occupation(self, occupation):
         """Change value of db_worker.occupation."""
@@ -165,3 +182,4 @@ class WorkTracker(QtWidgets.QWidget, Ui_work_tracker):
         """Save occupation and push db before quitting."""
         self.save_last_occupation()
         self.update_thread.push_signal.emit()
+        self.update_thread.stop_sync()
@@ -1,12 +1,28 @@
 """Module containing the baseclass for data interactions."""
 import datetime
 import os
+import posixpath
+import socket
+import threading
+import time
 from configparser import ConfigParser
+from typing import List, Set, Union
 
+import numpy as np
 import pandas as pd
-import pysftp
 
 from .helpfer_functions import get_abs_path, hash_file
+from .session_index import SessionIntervalIndex
+from .sftp_connection import SftpConnectionManager
+from .storage import (
+    TimeBound,
+    TsvStorage,
+    find_legacy_db_path,
+    format_delta_rows,
+    get_storage,
+    parse_delta_rows,
+    read_db,
+)
 
 
 class DbBaseClass:
@@ -24,6 +40,10 @@ class DbBaseClass:
 
         """
         self.user_config_path = get_abs_path(user_config_path)
+        self.sftp_connection = SftpConnectionManager()
+        self._session_index: Union[SessionIntervalIndex, None] = None
+        # the sync state gets changed by the tick and the background synchronization
+        self.sync_state_lock = threading.RLock()
 
     def get_pandas_now(self) -> pd.Timestamp:  # type: ignore
         """
@@ -57,10 +77,18 @@ class DbBaseClass:
             config.get("paths", "data_folder", fallback="../data")
         )
 
-        self.db_path_offline: str = os.path.join(self.data_folder_path, "local_db.tsv")
-        self.db_path_online: str = os.path.join(self.data_folder_path, "remote_db.tsv")
+        self.storage = get_storage(config.get("paths", "db_format", fallback="tsv"))
+        db_extension = self.storage.file_extension
+        self.db_path_offline: str = os.path.join(self.data_folder_path, f"local_db.{db_extension}")
+        self.db_path_online: str = os.path.join(self.data_folder_path, f"remote_db.{db_extension}")
         self.manual_db_path: str = os.path.join(self.data_folder_path, "manual_db.tsv")
         self.contract_info_path: str = os.path.join(self.data_folder_path, "contract_info.tsv")
+        self.db_path_journal: str = os.path.join(self.data_folder_path, "local_db_journal.tsv")
+
+        self.use_journal = config.getboolean("paths", "journal", fallback=True)
+        self.journal_compact_interval = config.getint(
+            "paths", "journal_compact_interval", fallback=60
+        )
 
         self.local_files = pd.DataFrame(
             {
@@ -75,6 +103,17 @@ class DbBaseClass:
         password = config.get("login", "password")
         port = config.get("login", "port", fallback=22)
         self.db_path = config.get("login", "db_path")
+        self.remote_delta_folder = f"{self.db_path.rstrip('/')}.deltas"
+        self.sync_state_path = os.path.join(self.data_folder_path, "sync_state.ini")
+        self.delta_sync = config.getboolean("sync", "delta_sync", fallback=True)
+        self.client_id = config.get("sync", "client_id", fallback="") or socket.gethostname()
+        self.hash_algorithm = config.get("sync", "hash_algorithm", fallback="blake2b")
+        self.sftp_connection.keepalive_interval = config.getint(
+            "sync", "keepalive_interval", fallback=30
+        )
+        self.sftp_connection.backoff_max = config.getint(
+            "sync", "max_retry_interval", fallback=300
+        )
         self.login_dict = {
             "host": host,
             "username": username,
@@ -87,26 +126,28 @@ class DbBaseClass:
         if last_occupation in occupations:
             self.occupation = last_occupation
 
-        # preventing some errors with different versions of pysftp
-        try:
-            cnopts = pysftp.CnOpts()
-            cnopts.hostkeys = None  # disable host key checking.
-
-            self.login_dict["cnopts"] = cnopts
-        except Exception:
-            print("pysftp.CnOpts() doesn't exist")
-
         # returning config so subclasses and use it to obtain more information if needed
         return config
 
-    def load_db(self, db_path: str) -> pd.DataFrame:
+    def load_db(
+        self, db_path: str, start: TimeBound = None, end: TimeBound = None
+    ) -> pd.DataFrame:
         """
         Read in the db file if it exists or creates a new one.
 
+        The file format is detected automatically, so databases written with
+        a different ``db_format`` (i.e. before changing the config) can still be read.
+        If start or end are given, only sessions starting in [start, end) are loaded,
+        which uses the index on start for the sqlite backend.
+
         Parameters
         ----------
         db_path : str
             path to the db_file on the SFTP server
+        start : TimeBound, optional
+            Lower bound (inclusive) of the session start, by default None
+        end : TimeBound, optional
+            Upper bound (exclusive) of the session start, by default None
 
         Returns
         -------
@@ -114,7 +155,7 @@ class DbBaseClass:
             Loaded database.
 
         """
-        if not os.path.isfile(db_path):
+        if not os.path.isfile(find_legacy_db_path(db_path)):
             return pd.DataFrame(
                 [
                     {
@@ -125,7 +166,34 @@ class DbBaseClass:
                 ]
             )
         else:
-            return pd.read_csv(db_path, parse_dates=["start", "end"], sep="\t")  # type: ignore
+            return read_db(db_path, start, end)
+
+    def replay_journal(self, db: pd.DataFrame) -> pd.DataFrame:
+        """
+        Apply the changes recorded in the journal file to db.
+
+        The journal contains full rows, which were changed or added since the
+        last time the local database was written completely.
+        Rows with the same start value get replaced by the latest journal entry.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database loaded from the local db file.
+
+        Returns
+        -------
+        pd.DataFrame
+            Database with all journal entries applied.
+        """
+        if not os.path.isfile(self.db_path_journal):
+            return db
+        journal_db = TsvStorage().read(self.db_path_journal)
+        if journal_db.empty:
+            return db
+        new_db = pd.concat([db, journal_db], ignore_index=True, sort=False)
+        new_db = new_db.drop_duplicates(["start"], keep="last")
+        return new_db.sort_values(["start"], kind="mergesort").reset_index(drop=True)
 
     def clean_db(self) -> None:
         """Remove rows where the session work was less than 1min."""
@@ -133,6 +201,23 @@ class DbBaseClass:
         real_work_period = work_time > pd.to_timedelta(1, unit="m")  # 1 minute
         self.db = self.db[real_work_period]
 
+    @property
+    def session_index(self) -> SessionIntervalIndex:
+        """
+        Interval index over the sessions of self.db.
+
+        The index is rebuilt when self.db was replaced by another DataFrame,
+        changes of 'start' or 'end' made in place aren't detected.
+
+        Returns
+        -------
+        SessionIntervalIndex
+            Index for range and overlap queries on self.db.
+        """
+        if self._session_index is None or self._session_index.db is not self.db:
+            self._session_index = SessionIntervalIndex(self.db)
+        return self._session_index
+
     def calc_file_hashes(self) -> pd.DataFrame:
         """
         Calculate hashvalues for files.
@@ -143,7 +228,7 @@ class DbBaseClass:
             Dataframe with file hashes.
         """
         local_files = self.local_files.copy()
-        local_files["hashes"] = local_files["path"].apply(hash_file)
+        local_files["hashes"] = local_files["path"].apply(hash_file, algorithm=self.hash_algorithm)
         return local_files
 
     def get_remote_db(self) -> bool:
@@ -151,6 +236,8 @@ class DbBaseClass:
         Download the db_file to db_path_online from the SFTP server.
 
         This uses the values specified at ["login"]["db_path"] in the config file.
+        The download is skipped if size and modification time of the remote file
+        match the previously downloaded file.
 
         Returns
         -------
@@ -158,62 +245,548 @@ class DbBaseClass:
             Whether database retrieval succeeded or not.
         """
         try:
-            with pysftp.Connection(**self.login_dict) as sftp:
-                sftp.get(self.db_path, localpath=self.db_path_online, preserve_mtime=True)
+            with self.sftp_connection.connect(self.login_dict) as sftp:
+                if not self.is_remote_file_unchanged(sftp.stat(self.db_path), self.db_path_online):
+                    sftp.get(self.db_path, localpath=self.db_path_online, preserve_mtime=True)
             return True
         except Exception:
             print("Failed to get remote_db")
             return False
 
-    def push_remote_db(self) -> bool:
+    @classmethod
+    def is_remote_file_unchanged(cls, remote_attributes, local_path: str) -> bool:
+        """
+        Check if a remote file is the same as the local file it was downloaded to.
+
+        Since files are downloaded with preserve_mtime, an unchanged remote file
+        has the same size and modification time as the local file.
+
+        Parameters
+        ----------
+        remote_attributes : paramiko.SFTPAttributes
+            Result of stat for the remote file.
+        local_path : str
+            Path to the local copy of the remote file.
+
+        Returns
+        -------
+        bool
+            Whether the remote file is unchanged.
+        """
+        if not os.path.isfile(local_path):
+            return False
+        local_stat = os.stat(local_path)
+        return remote_attributes.st_size == local_stat.st_size and int(
+            remote_attributes.st_mtime
+        ) == int(local_stat.st_mtime)
+
+    def push_remote_db(self, local_db_path: Union[str, None] = None) -> bool:
         """
         Push the db_file from db_path_offline to the SFTP server.
 
         This uses the values specified at ["login"]["db_path"] in the config file.
+        The upload is skipped if the hash of db_file didn't change since the last push
+        and the database on the server is still the pushed one, i.e. it wasn't
+        overwritten by another client.
+
+        Parameters
+        ----------
+        local_db_path : Union[str, None], optional
+            Path of a copy of the local db to upload instead, by default None
 
         Returns
         -------
         bool
             Whether database upload succeeded or not.
         """
+        if local_db_path is None:
+            local_db_path = self.db_path_offline
+        sync_state = self.load_sync_state()
+        local_db_hash = hash_file(local_db_path, algorithm=self.hash_algorithm)
+        pushed_hash = sync_state.get("hashes", "local_db", fallback="")
+        pushed_to = sync_state.get("hashes", "local_db_pushed_to", fallback="")
+        pushed_remote_stat = sync_state.get("hashes", "local_db_remote_stat", fallback="")
         try:
-            with pysftp.Connection(**self.login_dict) as sftp:
-                sftp.put(self.db_path_offline, remotepath=self.db_path, preserve_mtime=True)
-            return True
+            with self.sftp_connection.connect(self.login_dict) as sftp:
+                if (
+                    local_db_hash == pushed_hash
+                    and pushed_to == self.db_path
+                    and pushed_remote_stat == self.format_remote_stat(sftp.stat(self.db_path))
+                ):
+                    return True
+                sftp.put(local_db_path, remotepath=self.db_path, preserve_mtime=True)
+                remote_stat = self.format_remote_stat(sftp.stat(self.db_path))
         except Exception:
             print("Failed to push remote_db")
             return False
+        with self.sync_state_lock:
+            # the state might have been changed during the upload
+            sync_state = self.load_sync_state()
+            sync_state.set("hashes", "local_db", str(local_db_hash))
+            sync_state.set("hashes", "local_db_pushed_to", self.db_path)
+            sync_state.set("hashes", "local_db_remote_stat", remote_stat)
+            self.save_sync_state(sync_state)
+        return True
+
+    @classmethod
+    def format_remote_stat(cls, remote_attributes) -> str:
+        """
+        Format size and modification time of a remote file, to detect when it gets replaced.
 
-    def merge_dbs(self) -> pd.DataFrame:
+        Parameters
+        ----------
+        remote_attributes : paramiko.SFTPAttributes
+            Result of stat for the remote file.
+
+        Returns
+        -------
+        str
+            Size and modification time of the remote file.
+        """
+        return f"{remote_attributes.st_size},{int(remote_attributes.st_mtime)}"
+
+    def load_sync_state(self) -> ConfigParser:
+        """
+        Load the state of the synchronization.
+
+        The section 'delta' contains the name of the own delta file on the server,
+        the max end value of the own sessions which was already pushed ('pushed_end')
+        and the starts of the sessions this client created or changed since the
+        last rotation of the delta file ('own_starts', nanoseconds since the epoch).
+        The section 'offsets' contains the number of bytes already read
+        of the delta files of other clients.
+        The section 'hashes' contains the hashes of the files when they were last pushed.
+
+        Returns
+        -------
+        ConfigParser
+            Synchronization state.
+        """
+        sync_state = ConfigParser()
+        # file names are case sensitive
+        sync_state.optionxform = str  # type: ignore
+        sync_state.read(self.sync_state_path)
+        for section in ["delta", "offsets", "hashes"]:
+            if not sync_state.has_section(section):
+                sync_state.add_section(section)
+        return sync_state
+
+    def save_sync_state(self, sync_state: ConfigParser) -> None:
+        """
+        Save the state of the synchronization.
+
+        Parameters
+        ----------
+        sync_state : ConfigParser
+            Synchronization state.
+        """
+        with open(self.sync_state_path, "w", encoding="utf-8") as sync_state_file:
+            sync_state.write(sync_state_file)
+
+    def new_delta_file_name(self) -> str:
+        """
+        Generate a new name for the own delta file on the server.
+
+        Returns
+        -------
+        str
+            Name of the delta file, consisting of client_id and the current time.
+        """
+        return f"{self.client_id}_{int(time.time() * 1000)}.tsv"
+
+    def get_own_starts(self, sync_state: ConfigParser) -> Set[int]:
+        """
+        Return the starts of the sessions this client created or changed.
+
+        Parameters
+        ----------
+        sync_state : ConfigParser
+            Synchronization state.
+
+        Returns
+        -------
+        Set[int]
+            Starts in nanoseconds since the epoch.
+        """
+        own_starts = sync_state.get("delta", "own_starts", fallback="")
+        return {int(start) for start in own_starts.split(",") if start}
+
+    def mark_own_sessions(self, starts: pd.Series) -> None:
+        """
+        Remember sessions this client created or changed, so they get pushed to its delta file.
+
+        Sessions pulled from other clients aren't marked,
+        so they don't get echoed back to the server.
+
+        Parameters
+        ----------
+        starts : pd.Series
+            Starts of the created or changed sessions.
+        """
+        starts_ns = set(starts.values.astype("datetime64[ns]").view(np.int64).tolist())
+        with self.sync_state_lock:
+            sync_state = self.load_sync_state()
+            own_starts = self.get_own_starts(sync_state)
+            if starts_ns <= own_starts:
+                return
+            own_starts |= starts_ns
+            sync_state.set("delta", "own_starts", ",".join(map(str, sorted(own_starts))))
+            self.save_sync_state(sync_state)
+
+    def get_retired_delta_file_names(self, sync_state: ConfigParser) -> List[str]:
+        """
+        Return the names of own delta files, which were replaced by rotate_remote_delta.
+
+        Parameters
+        ----------
+        sync_state : ConfigParser
+            Synchronization state.
+
+        Returns
+        -------
+        List[str]
+            Names of the delta files, which weren't removed from the server yet.
+        """
+        retired_file_names = sync_state.get("delta", "retired_file_names", fallback="")
+        return [file_name for file_name in retired_file_names.split(",") if file_name]
+
+    def get_own_rows(self, db: pd.DataFrame, sync_state: ConfigParser) -> pd.DataFrame:
+        """
+        Return the sessions of db this client created or changed.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database which can contain sessions of other clients.
+        sync_state : ConfigParser
+            Synchronization state.
+
+        Returns
+        -------
+        pd.DataFrame
+            Own sessions of db.
+        """
+        starts_ns = db["start"].values.astype("datetime64[ns]").view(np.int64)
+        own_starts = np.fromiter(self.get_own_starts(sync_state), dtype=np.int64)
+        return db[np.isin(starts_ns, own_starts)]
+
+    def push_remote_delta(self) -> bool:
+        """
+        Append the sessions changed since the last push to the own delta file on the server.
+
+        Since sessions only get added or extended, all own rows with an end value
+        greater than the last pushed end value are new or changed.
+        If nothing changed no connection to the server is opened at all.
+
+        Returns
+        -------
+        bool
+            Whether the delta upload succeeded or not.
+        """
+        return self.push_db_delta(self.db)
+
+    def push_db_delta(self, db: pd.DataFrame) -> bool:
+        """
+        Append the own sessions of db changed since the last push to the own delta file.
+
+        Only sessions marked with mark_own_sessions are pushed, so neither rows pulled
+        from other clients get echoed back, nor can their end values
+        hide own sessions from later pushes.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database containing the changed sessions.
+
+        Returns
+        -------
+        bool
+            Whether the delta upload succeeded or not.
+        """
+        with self.sync_state_lock:
+            sync_state = self.load_sync_state()
+        pushed_end = pd.Timestamp(sync_state.get("delta", "pushed_end", fallback="1970-01-01"))
+        own_rows = self.get_own_rows(db, sync_state)
+        changed_rows = own_rows[own_rows["end"] > pushed_end]
+        if changed_rows.empty:
+            return True
+        delta_file_name = (
+            sync_state.get("delta", "file_name", fallback="") or self.new_delta_file_name()
+        )
+        try:
+            with self.sftp_connection.connect(self.login_dict) as sftp:
+                if not sftp.isdir(self.remote_delta_folder):
+                    sftp.mkdir(self.remote_delta_folder)
+                delta_path = posixpath.join(self.remote_delta_folder, delta_file_name)
+                with sftp.open(delta_path, "a") as delta_file:
+                    delta_file.write(format_delta_rows(changed_rows))
+        except Exception:
+            print("Failed to push remote delta")
+            return False
+        with self.sync_state_lock:
+            # own sessions might have been marked during the upload
+            sync_state = self.load_sync_state()
+            sync_state.set("delta", "file_name", delta_file_name)
+            sync_state.set("delta", "pushed_end", changed_rows["end"].max().isoformat())
+            self.save_sync_state(sync_state)
+        return True
+
+    def pull_remote_deltas(self, incremental: bool = True) -> pd.DataFrame:
+        """
+        Download the rows from the delta files on the server.
+
+        Parameters
+        ----------
+        incremental : bool, optional
+            If True, only the bytes which were appended since the last pull are read
+            and the own delta files are skipped.
+            If False, all delta files are read completely without changing
+            the synchronization state, by default True
+
+        Returns
+        -------
+        pd.DataFrame
+            Rows contained in the delta files.
+        """
+        sync_state = self.load_sync_state()
+        own_delta_file_names = {sync_state.get("delta", "file_name", fallback="")}
+        own_delta_file_names.update(self.get_retired_delta_file_names(sync_state))
+        delta_texts = []
+        try:
+            with self.sftp_connection.connect(self.login_dict) as sftp:
+                if not sftp.isdir(self.remote_delta_folder):
+                    return parse_delta_rows("")
+                # listdir_attr returns the sizes as well, so unchanged files need no request
+                delta_file_sizes = {
+                    attributes.filename: attributes.st_size
+                    for attributes in sftp.listdir_attr(self.remote_delta_folder)
+                }
+                for delta_file_name, delta_file_size in delta_file_sizes.items():
+                    if incremental and delta_file_name in own_delta_file_names:
+                        continue
+                    offset = (
+                        sync_state.getint("offsets", delta_file_name, fallback=0)
+                        if incremental
+                        else 0
+                    )
+                    if delta_file_size <= offset:
+                        continue
+                    delta_path = posixpath.join(self.remote_delta_folder, delta_file_name)
+                    with sftp.open(delta_path, "rb") as delta_file:
+                        delta_file.seek(offset)
+                        delta_bytes = delta_file.read()
+                    # an incomplete last line is read on the next pull
+                    delta_bytes = delta_bytes[: delta_bytes.rfind(b"\n") + 1]
+                    delta_texts.append(delta_bytes.decode("utf-8"))
+                    sync_state.set("offsets", delta_file_name, str(offset + len(delta_bytes)))
+        except Exception:
+            print("Failed to pull remote deltas")
+            return parse_delta_rows("")
+        if incremental:
+            with self.sync_state_lock:
+                # the state might have been changed during the download
+                offsets = dict(sync_state["offsets"])
+                sync_state = self.load_sync_state()
+                sync_state.remove_section("offsets")
+                sync_state.add_section("offsets")
+                # forget offsets of delta files which were rotated by their client
+                for delta_file_name, offset in offsets.items():
+                    if delta_file_name in delta_file_sizes:
+                        sync_state.set("offsets", delta_file_name, offset)
+                self.save_sync_state(sync_state)
+        return parse_delta_rows("".join(delta_texts))
+
+    def rotate_remote_delta(self, pushed_db: Union[pd.DataFrame, None] = None) -> None:
+        """
+        Start a new delta file on the server, after the whole database was pushed.
+
+        The old delta file is kept on the server, until the database on the server
+        is known to contain its rows (see remove_retired_deltas), since another client
+        could overwrite the pushed database with an older one.
+        Using a new file name instead of truncating the old file,
+        prevents other clients from skipping rows due to outdated offsets.
+        Only the marks of sessions, which pushed_db contains with their current end,
+        get cleared, so sessions created or changed during the upload are pushed later on.
+
+        Parameters
+        ----------
+        pushed_db : Union[pd.DataFrame, None], optional
+            Database which was pushed, by default None which uses self.db
+        """
+        if pushed_db is None:
+            pushed_db = self.db
+        with self.sync_state_lock:
+            sync_state = self.load_sync_state()
+            old_delta_file_name = sync_state.get("delta", "file_name", fallback="")
+            pushed_rows = self.get_own_rows(pushed_db, sync_state)
+            own_rows = self.get_own_rows(self.db, sync_state)
+            # the new delta file gets named when rows are pushed to it
+            sync_state.set("delta", "file_name", "")
+            if old_delta_file_name:
+                retired_file_names = self.get_retired_delta_file_names(sync_state)
+                sync_state.set(
+                    "delta",
+                    "retired_file_names",
+                    ",".join(retired_file_names + [old_delta_file_name]),
+                )
+            if not pushed_rows.empty:
+                sync_state.set("delta", "pushed_end", pushed_rows["end"].max().isoformat())
+            # sessions created or changed after pushed_db was taken stay marked
+            unpushed_rows = own_rows[~self.get_contained_mask(pushed_db, own_rows)]
+            unpushed_starts = unpushed_rows["start"].values.astype("datetime64[ns]")
+            sync_state.set(
+                "delta",
+                "own_starts",
+                ",".join(map(str, sorted(set(unpushed_starts.view(np.int64).tolist())))),
+            )
+            self.save_sync_state(sync_state)
+
+    def remove_retired_deltas(self, remote_db: pd.DataFrame) -> bool:
+        """
+        Remove the old own delta files, whose rows are contained in the database on the server.
+
+        If there are no old delta files, no connection is opened.
+
+        Parameters
+        ----------
+        remote_db : pd.DataFrame
+            Database which was downloaded from the server.
+
+        Returns
+        -------
+        bool
+            Whether the old delta files could be checked.
+        """
+        with self.sync_state_lock:
+            retired_file_names = self.get_retired_delta_file_names(self.load_sync_state())
+        if not retired_file_names:
+            return True
+        removed_file_names = []
+        try:
+            with self.sftp_connection.connect(self.login_dict) as sftp:
+                for delta_file_name in retired_file_names:
+                    delta_path = posixpath.join(self.remote_delta_folder, delta_file_name)
+                    if sftp.exists(delta_path):
+                        with sftp.open(delta_path, "rb") as delta_file:
+                            delta_rows = parse_delta_rows(delta_file.read().decode("utf-8"))
+                        if not self.contains_sessions(remote_db, delta_rows):
+                            continue
+                        sftp.remove(delta_path)
+                    removed_file_names.append(delta_file_name)
+            return True
+        except Exception:
+            print("Failed to remove old remote deltas")
+            return False
+        finally:
+            with self.sync_state_lock:
+                # the state might have been changed in the meantime
+                sync_state = self.load_sync_state()
+                retired_file_names = [
+                    file_name
+                    for file_name in self.get_retired_delta_file_names(sync_state)
+                    if file_name not in removed_file_names
+                ]
+                sync_state.set("delta", "retired_file_names", ",".join(retired_file_names))
+                self.save_sync_state(sync_state)
+
+    @classmethod
+    def contains_sessions(cls, db: pd.DataFrame, sessions: pd.DataFrame) -> bool:
+        """
+        Check if db contains each session with the same start and at least the same end.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database with the columns 'start' and 'end'.
+        sessions : pd.DataFrame
+            Sessions with the columns 'start' and 'end'.
+
+        Returns
+        -------
+        bool
+            Whether all sessions are contained in db.
+        """
+        return bool(cls.get_contained_mask(db, sessions).all())
+
+    @classmethod
+    def get_contained_mask(cls, db: pd.DataFrame, sessions: pd.DataFrame) -> np.ndarray:
+        """
+        Check for each session if db contains it with the same start and at least the same end.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database with the columns 'start' and 'end'.
+        sessions : pd.DataFrame
+            Sessions with the columns 'start' and 'end'.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask of the sessions contained in db.
+        """
+        if sessions.empty:
+            return np.zeros(0, dtype=bool)
+        max_ends = db.groupby("start")["end"].max().reindex(sessions["start"])
+        return max_ends.values >= sessions["end"].values
+
+    def close_remote_connection(self) -> None:
+        """Close the connection to the SFTP server, it gets reopened when needed."""
+        self.sftp_connection.close()
+
+    def merge_dbs(self, remote_db: pd.DataFrame = None) -> pd.DataFrame:
         """
         Merge local db with remote db.
 
         The overlap (same start) is replaced with the max value of end.
 
+        Parameters
+        ----------
+        remote_db : pd.DataFrame, optional
+            Database to merge with, by default the database at db_path_online
+
         Returns
         -------
         pd.Dataframe
             Local db merged with remote db, with striped overlap.
         """
-        remote_db = self.load_db(self.db_path_online)
-        if not self.db.equals(remote_db):
+        if remote_db is None:
+            remote_db = self.load_db(self.db_path_online)
+        return self.merge_db_frames(self.db, remote_db)
+
+    @classmethod
+    def merge_db_frames(cls, db: pd.DataFrame, remote_db: pd.DataFrame) -> pd.DataFrame:
+        """
+        Merge two databases.
+
+        The overlap (same start) is replaced with the max value of end.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database which takes precedence for the occupation of overlapping sessions.
+        remote_db : pd.DataFrame
+            Database to merge with.
+
+        Returns
+        -------
+        pd.Dataframe
+            db merged with remote_db, with striped overlap.
+        """
+        if not db.equals(remote_db):
             new_db = pd.merge(
-                self.db,
+                db,
                 remote_db,
                 on=["occupation", "start", "end"],  # type: ignore
                 how="outer",
             )
-            # get conflicting start values (same start value different end value)
-            start_fix = new_db["start"][new_db["start"].duplicated()]
-            drop_list = []
-            for start_val in start_fix.values:
-                dup_index = new_db.index[new_db["start"].isin([start_val])]
-                max_end_ts = new_db["end"].loc[dup_index].max()
-                new_db.at[dup_index[0], "end"] = max_end_ts
-                drop_list.append(dup_index[1:])
-            flat_drop_list = [item for sublist in drop_list for item in sublist]
-            new_db.drop(new_db.index[flat_drop_list], inplace=True)
+            # resolve conflicting start values (same start value different end value),
+            # by keeping the first row of each start value with the max end value
+            session_index = SessionIntervalIndex(new_db)
+            conflicts = session_index.conflicts()
+            if len(conflicts):
+                new_db["end"] = session_index.max_end_by_start()
+                new_db = new_db.drop(new_db.index[conflicts])
         else:
-            new_db = self.db
-        new_db.drop_duplicates()
+            new_db = db
         return new_db.sort_values(["start"]).reset_index(drop=True)
@@ -1,22 +1,103 @@
 """Module containing the Worktime calculator class."""
 
 import datetime
+import functools
+import hashlib
+import itertools
+import json
 import os
-from typing import Dict, Union
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple, Union
 
 import holidays
+import numpy as np
 import pandas as pd
 from holidays.holiday_base import HolidayBase
-from pandas.tseries.offsets import CustomBusinessDay  # type: ignore
 
 from .base_classes import DbBaseClass
+from .daily_aggregates import DailyAggregates, is_day_aligned
+from .helpfer_functions import hash_file
+from .storage import TimeBound, TsvStorage, find_legacy_db_path, read_db
 from .update_work_db import get_abs_path
 
 # from .helpfer_functions import debug_printer
 
 
+def expand_days(first_days: np.ndarray, last_days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Expand date ranges to the days they contain.
+
+    Parameters
+    ----------
+    first_days : np.ndarray
+        First day of each range as datetime64[D].
+    last_days : np.ndarray
+        Last day (inclusive) of each range as datetime64[D].
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        Index of the range each day belongs to and the days as datetime64[D].
+    """
+    n_days = np.maximum((last_days - first_days).astype(np.int64) + 1, 0)
+    range_ids = np.repeat(np.arange(len(n_days)), n_days)
+    day_offsets = np.arange(n_days.sum()) - np.repeat(np.cumsum(n_days) - n_days, n_days)
+    return range_ids, first_days[range_ids] + day_offsets
+
+
+# versions of the sessions of all calculators, so copies of a calculator never share one
+_db_versions = itertools.count()
+
+
+def memoize_report(*dependencies: str) -> Callable:
+    """
+    Memoize the result of a report method of WorktimeCalculator.
+
+    The result is cached per arguments and only recomputed, when the hash of one of
+    the dependencies changed (see WorktimeCalculator.get_dependency_hash).
+    Only the report_cache_size most recently used results are kept.
+    Copies of the cached DataFrames are returned, so changing them doesn't change the cache.
+
+    Parameters
+    ----------
+    dependencies : str
+        Names of the data the result depends on.
+
+    Returns
+    -------
+    Callable
+        Decorator for the report method.
+    """
+
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache_key = (method.__name__, args, tuple(sorted(kwargs.items())))
+            with self.report_lock:
+                self.refresh_report_dependencies()
+                dependency_hashes = [self.get_dependency_hash(name) for name in dependencies]
+                cached = self.report_cache.get(cache_key)
+                if cached is not None and cached[0] == dependency_hashes:
+                    self.report_cache.move_to_end(cache_key)
+                    return cached[1].copy()
+            # the lock isn't held while calculating, so other reports can be served
+            result = method(self, *args, **kwargs)
+            with self.report_lock:
+                self.report_cache[cache_key] = (dependency_hashes, result)
+                self.report_cache.move_to_end(cache_key)
+                while len(self.report_cache) > self.report_cache_size:
+                    self.report_cache.popitem(last=False)
+            return result.copy()
+
+        return wrapper
+
+    return decorator
+
+
 class WorktimeCalculator(DbBaseClass):
     default_config_path = get_abs_path("default_config.ini")
+    report_cache_size = 64
 
     def __init__(self, user_config_path=".user_config.ini"):
         """
@@ -31,18 +112,49 @@ class WorktimeCalculator(DbBaseClass):
         """
         super().__init__(user_config_path)
         self.special_holidays = {}
+        self.holiday_days = np.array([], dtype="datetime64[D]")
+        self.holiday_days_source: Union[HolidayBase, Dict, None] = None
+        self.holiday_days_count = 0
         self.load_config()
-        self.db = self.load_db()
+        # sessions as they were loaded, before they got split at midnight
+        self.raw_db = self.load_db()
+        self.db = self.raw_db
         self.split_date_overlap_session()
         self.contract_worktime_df = self.generate_contract_worktime_df()
+        self.contract_info_hash = hash_file(self.contract_info_path, algorithm=self.hash_algorithm)
         self.holidays = self.init_holidays()
+        self.report_cache: "OrderedDict[Tuple, Tuple]" = OrderedDict()
+        self.report_lock = threading.RLock()
+
+    @property
+    def db(self) -> pd.DataFrame:
+        """
+        Sessions split by day, which the reports are calculated from.
+
+        Assigning db bumps db_version, which invalidates the memoized reports
+        without hashing the sessions, changes made in place aren't detected.
+
+        Returns
+        -------
+        pd.DataFrame
+            Database with the columns 'start', 'end' and 'occupation'.
+        """
+        return self._db
+
+    @db.setter
+    def db(self, db: pd.DataFrame) -> None:
+        self._db = db
+        self.db_version = next(_db_versions)
 
     def load_db(self) -> pd.DataFrame:
         """
         Load Database remote or locally.
 
-        Tries to load the database directly from the server if possible, else
+        Tries to load the database directly from the server if possible,
+        including the sessions from the delta files of all clients, else
         it loads the local database or throws an exception that isn't possible either.
+        Only the local database gets the journal replayed, loaded_remote_db tells
+        which one was loaded.
 
         Returns
         -------
@@ -50,14 +162,16 @@ class WorktimeCalculator(DbBaseClass):
             Database with the actually worked time
 
         """
-        if self.get_remote_db() and os.path.isfile(self.db_path_online):
-            return pd.read_csv(
-                self.db_path_online, parse_dates=["start", "end"], sep="\t"
-            )  # type:ignore
-        elif os.path.isfile(self.db_path_offline):
-            return pd.read_csv(
-                self.db_path_offline, parse_dates=["start", "end"], sep="\t"
-            )  # type:ignore
+        self.loaded_remote_db = self.get_remote_db() and os.path.isfile(self.db_path_online)
+        if self.loaded_remote_db:
+            db = read_db(self.db_path_online)
+            if self.delta_sync:
+                delta_db = self.pull_remote_deltas(incremental=False)
+                if not delta_db.empty:
+                    db = self.merge_db_frames(db, delta_db)
+            return db
+        elif os.path.isfile(find_legacy_db_path(self.db_path_offline)):
+            return self.replay_journal(read_db(self.db_path_offline))
         else:
             raise Exception("There was no proper database file provided")
 
@@ -69,6 +183,13 @@ class WorktimeCalculator(DbBaseClass):
         self.province = config.get("location", "province", fallback="")
         if "special_holidays" in config.sections():
             self.special_holidays = config._sections["special_holidays"]  # type:ignore
+        self.use_holiday_cache = config.getboolean("location", "holiday_cache", fallback=True)
+        self.holiday_cache_path = os.path.join(self.data_folder_path, "holiday_cache.json")
+        self.use_daily_aggregates = config.getboolean("paths", "daily_aggregates", fallback=True)
+        self.daily_aggregates = DailyAggregates(
+            os.path.join(self.data_folder_path, "daily_aggregates.tsv"),
+            os.path.join(self.data_folder_path, "daily_aggregates.ini"),
+        )
 
     def generate_contract_worktime_df(self) -> pd.DataFrame:
         """
@@ -85,34 +206,44 @@ class WorktimeCalculator(DbBaseClass):
             since the 1st contract started until now
 
         """
-        contract_worktime_df = pd.DataFrame()
-        contract_info_df = pd.read_csv(
-            self.contract_info_path, parse_dates=["start", "end"], sep="\t"  # type:ignore
-        )
+        contract_info_df = TsvStorage().read(self.contract_info_path)
         # debug_printer(contract_info_df)
-        for _, row in contract_info_df.iterrows():
-            if pd.isna(row["end"]):
-                end_date = self.db["end"].max()
-            else:
-                end_date = row["end"]
-            business_days = CustomBusinessDay(weekmask=row["weekmask"])
-            start_values = pd.Series(
-                pd.date_range(row["start"], end_date, normalize=True, freq=business_days)
-            )
-
-            # calculate the daily worktime depending on the interval and weekmask
-            daily_worktime = self.get_daily_worktime(
-                row["frequenzy"], row["worktime"], row["weekmask"]
-            )
-            worktime_df = pd.DataFrame({"start": start_values})
-            worktime_df["worktime"] = pd.to_timedelta(daily_worktime, unit="h")
-            contract_worktime_df = contract_worktime_df.append(worktime_df)
-
+        end_dates = contract_info_df["end"].fillna(self.db["end"].max())
+        first_days = contract_info_df["start"].values.astype("datetime64[D]")
+        last_days = end_dates.values.astype("datetime64[D]")
+        # expand each contract to all days from its start to its end date
+        contract_ids, days = expand_days(first_days, last_days)
+        # drop the days which aren't in the weekmask of their contract
+        is_workday = np.zeros(len(days), dtype=bool)
+        weekmasks = contract_info_df["weekmask"].values
+        for weekmask in pd.unique(weekmasks):
+            contract_days = weekmasks[contract_ids] == weekmask
+            is_workday[contract_days] = np.is_busday(days[contract_days], weekmask=weekmask)
+        # calculate the daily worktime depending on the interval and weekmask
+        daily_worktimes = np.array(
+            [
+                pd.to_timedelta(
+                    self.get_daily_worktime(frequenzy, worktime, weekmask), unit="h"
+                ).value
+                for frequenzy, worktime, weekmask in zip(
+                    contract_info_df["frequenzy"], contract_info_df["worktime"], weekmasks
+                )
+            ],
+            dtype=np.int64,
+        )
         # summing up worktime from different jobs at the same day
-        contract_worktime_df = contract_worktime_df.groupby("start")["worktime"].apply(
-            lambda x: x.sum()
+        work_days, day_ids = np.unique(days[is_workday], return_inverse=True)
+        worktimes = np.bincount(
+            day_ids,
+            weights=daily_worktimes[contract_ids[is_workday]],
+            minlength=len(work_days),
+        )
+        return pd.DataFrame(
+            {
+                "start": work_days.astype("datetime64[ns]"),
+                "worktime": worktimes.round().astype(np.int64).astype("timedelta64[ns]"),
+            }
         )
-        return contract_worktime_df.reset_index().sort_values("start")  # type:ignore
 
     def get_daily_worktime(
         self, frequenzy: str, worktime: Union[int, float], weekmask: str
@@ -144,6 +275,80 @@ class WorktimeCalculator(DbBaseClass):
             daily_worktime = (worktime * 12) / (365 - 52 * (7 - work_days_per_week))
         return daily_worktime
 
+    def refresh_report_dependencies(self) -> None:
+        """
+        Regenerate the data the reports depend on, if its source changed.
+
+        If contract_info or the holiday settings changed since contract_worktime_df
+        was generated, contract_worktime_df and the holidays are regenerated.
+        Else the contract years, which weren't populated yet, are added to the holidays.
+        """
+        contract_info_hash = hash_file(self.contract_info_path, algorithm=self.hash_algorithm)
+        if (
+            contract_info_hash != self.contract_info_hash
+            or self.get_holiday_config() != self.holiday_config
+        ):
+            self.contract_worktime_df = self.generate_contract_worktime_df()
+            self.contract_info_hash = contract_info_hash
+            self.holidays = self.init_holidays()
+        else:
+            contract_years = self.contract_worktime_df["start"].dt.year
+            if not contract_years.empty:
+                self.get_holiday_days(contract_years.min(), contract_years.max())
+
+    def get_holiday_config(self) -> str:
+        """
+        Return the settings of the config, which the holidays are generated from.
+
+        Returns
+        -------
+        str
+            Country, province and special holidays serialized as json.
+        """
+        return json.dumps([self.country, self.province, sorted(self.special_holidays.items())])
+
+    def get_dependency_hash(self, name: str) -> str:
+        """
+        Calculate the hash of data the reports depend on.
+
+        For 'db' the version of the sessions is used, since hashing all sessions
+        would cost as much as some of the reports.
+        The hashes are calculated from the current state and don't regenerate anything,
+        see refresh_report_dependencies.
+
+        Parameters
+        ----------
+        name : str
+            Name of the data, supported values are:
+            'db', 'manual_db', 'contract_info' and 'holidays'
+
+        Returns
+        -------
+        str
+            Hash of the data.
+
+        Raises
+        ------
+        ValueError
+            If name isn't supported.
+        """
+        if name == "db":
+            return str(self.db_version)
+        elif name == "manual_db":
+            return hash_file(self.manual_db_path, algorithm=self.hash_algorithm)
+        elif name == "contract_info":
+            hash_values = pd.util.hash_pandas_object(self.contract_worktime_df, index=False)
+            return hashlib.md5(hash_values.values.tobytes()).hexdigest()
+        elif name == "holidays":
+            holidays_hash = hashlib.md5(self.holiday_days.tobytes())
+            holidays_hash.update(self.holiday_config.encode())
+            return holidays_hash.hexdigest()
+        raise ValueError(
+            f"Unsupported dependency '{name}', supported values are: "
+            "'db', 'manual_db', 'contract_info' and 'holidays'"
+        )
+
+    @memoize_report("contract_info", "holidays")
     def get_holiday_df(self) -> pd.DataFrame:
         """
         Generate a Dataframe containing all needed holidays.
@@ -159,7 +364,7 @@ class WorktimeCalculator(DbBaseClass):
             the contract parameters for those days.
 
         """
-        is_holiday = self.contract_worktime_df["start"].apply(lambda x: x in self.holidays)
+        is_holiday = self.get_holiday_mask(self.contract_worktime_df["start"].values)
         holiday_df = self.contract_worktime_df[is_holiday].copy()
         holiday_df["end"] = holiday_df["start"]
         holiday_df["occupation"] = "holiday"
@@ -171,7 +376,8 @@ class WorktimeCalculator(DbBaseClass):
         Initialize the holidays with the custom holidays from the config.
 
         Returns the class instance from holiday, which matches the country and province
-        given in the config and updates it with the special holidays, also given in the config
+        given in the config and updates it with the special holidays, also given in the config.
+        The holidays of all contract years are also cached as sorted array for get_holiday_mask.
 
         Returns
         -------
@@ -186,22 +392,202 @@ class WorktimeCalculator(DbBaseClass):
             # init holiday class depending province
             if self.province in country_class.subdivisions:  # type: ignore
                 custom_holidays: HolidayBase = country_class(subdiv=self.province)  # type: ignore
+                province = self.province
             else:
                 custom_holidays: HolidayBase = country_class()  # type: ignore
-            # update holidays with special_holidays, given in the config
-            special_holiday_update_dict = {}
+                province = ""
+            holiday_cache = self.load_holiday_cache()
+            cache_changed = False
             for year in pd.unique(self.contract_worktime_df["start"].dt.year):
-                for key, val in self.special_holidays.items():
-                    day = int(key.split("-")[0])
-                    month = int(key.split("-")[1])
-                    date = datetime.datetime(year, month, day)
-                    special_holiday_update_dict[date] = val
-            # add new holidays to custom_holidays
-            custom_holidays.update(special_holiday_update_dict)
-            return custom_holidays
+                year = int(year)
+                cache_key = self.get_holiday_cache_key(province, year)
+                if cache_key in holiday_cache:
+                    # marking the year as populated, prevents the holidays package
+                    # from generating it
+                    custom_holidays.years.add(year)
+                    custom_holidays.update(
+                        {
+                            datetime.date.fromisoformat(day): name
+                            for day, name in holiday_cache[cache_key].items()
+                        }
+                    )
+                else:
+                    self.populate_holiday_year(custom_holidays, year)
+                    holiday_cache[cache_key] = {
+                        day.isoformat(): name
+                        for day, name in custom_holidays.items()
+                        if day.year == year
+                    }
+                    cache_changed = True
+            if cache_changed:
+                self.save_holiday_cache(holiday_cache)
         else:
+            custom_holidays = {}
+        self.holiday_config = self.get_holiday_config()
+        self.cache_holiday_days(custom_holidays)
+        return custom_holidays
+
+    def populate_holiday_year(self, custom_holidays: HolidayBase, year: int) -> None:
+        """
+        Generate the holidays of a year and add the special holidays from the config.
+
+        Parameters
+        ----------
+        custom_holidays : HolidayBase
+            Holidays to populate.
+        year : int
+            Year to populate.
+        """
+        # checking membership populates the year
+        datetime.date(year, 1, 1) in custom_holidays  # pylint: disable=W0104
+        # update holidays with special_holidays, given in the config
+        special_holiday_update_dict = {}
+        for key, val in self.special_holidays.items():
+            day = int(key.split("-")[0])
+            month = int(key.split("-")[1])
+            special_holiday_update_dict[datetime.date(year, month, day)] = val
+        custom_holidays.update(special_holiday_update_dict)
+
+    def get_holiday_cache_key(self, province: str, year: int) -> str:
+        """
+        Return the key of a year in the holiday cache.
+
+        The key contains everything the generated holidays depend on, so changing
+        the location, the special holidays or the version of the holidays package
+        doesn't use outdated cache entries.
+
+        Parameters
+        ----------
+        province : str
+            Province the holidays were generated for.
+        year : int
+            Year of the holidays.
+
+        Returns
+        -------
+        str
+            Key of the holiday cache.
+        """
+        special_holidays = json.dumps(sorted(self.special_holidays.items()))
+        special_holidays_hash = hashlib.md5(special_holidays.encode()).hexdigest()
+        return "|".join(
+            [self.country, province, str(year), special_holidays_hash, holidays.__version__]
+        )
+
+    def load_holiday_cache(self) -> Dict[str, Dict[str, str]]:
+        """
+        Load the cached holidays from the data folder.
+
+        Returns
+        -------
+        Dict[str, Dict[str, str]]
+            Holiday names by iso formatted day, for each cache key.
+            Empty if the cache is disabled, doesn't exist or can't be read.
+        """
+        if not self.use_holiday_cache or not os.path.isfile(self.holiday_cache_path):
             return {}
+        try:
+            with open(self.holiday_cache_path, encoding="utf8") as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            print("The holiday cache couldn't be read, it will be regenerated.")
+            return {}
+
+    def save_holiday_cache(self, holiday_cache: Dict[str, Dict[str, str]]) -> None:
+        """
+        Save the cached holidays to the data folder.
+
+        Entries generated by other versions of the holidays package are dropped.
+
+        Parameters
+        ----------
+        holiday_cache : Dict[str, Dict[str, str]]
+            Holiday names by iso formatted day, for each cache key.
+        """
+        if not self.use_holiday_cache:
+            return
+        holiday_cache = {
+            cache_key: cached_holidays
+            for cache_key, cached_holidays in holiday_cache.items()
+            if cache_key.endswith(f"|{holidays.__version__}")
+        }
+        tmp_path = f"{self.holiday_cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf8") as cache_file:
+                json.dump(holiday_cache, cache_file, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.holiday_cache_path)
+        except OSError:
+            print("The holiday cache couldn't be saved.")
+
+    def cache_holiday_days(self, custom_holidays: Union[HolidayBase, Dict]) -> None:
+        """
+        Precompute the sorted array of holidays used for vectorized membership checks.
+
+        Parameters
+        ----------
+        custom_holidays : Union[HolidayBase, Dict]
+            Holidays to cache.
+        """
+        holiday_days = np.array(list(custom_holidays.keys()), dtype="datetime64[D]")
+        self.holiday_days = np.unique(holiday_days)
+        self.holiday_days_source = custom_holidays
+        self.holiday_days_count = len(custom_holidays)
+
+    def get_holiday_days(self, first_year: int, last_year: int) -> np.ndarray:
+        """
+        Return the holidays as sorted array.
+
+        Years of self.holidays which weren't populated yet are populated and the cached array
+        is rebuilt, if self.holidays was replaced or changed since it was cached.
+
+        Parameters
+        ----------
+        first_year : int
+            First year the holidays are needed for.
+        last_year : int
+            Last year the holidays are needed for.
 
+        Returns
+        -------
+        np.ndarray
+            Sorted holidays as datetime64[D].
+        """
+        if isinstance(self.holidays, HolidayBase):
+            for year in range(first_year, last_year + 1):
+                if year not in self.holidays.years:
+                    # checking membership populates the year
+                    datetime.date(year, 1, 1) in self.holidays  # pylint: disable=W0104
+        if self.holiday_days_source is not self.holidays or self.holiday_days_count != len(
+            self.holidays
+        ):
+            self.cache_holiday_days(self.holidays)
+        return self.holiday_days
+
+    def get_holiday_mask(self, days: np.ndarray) -> np.ndarray:
+        """
+        Check which days are holidays.
+
+        Parameters
+        ----------
+        days : np.ndarray
+            Days to check, as datetime64 values.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask which is True for holidays.
+        """
+        days = np.asarray(days).astype("datetime64[D]")
+        if not len(days):
+            return np.zeros(0, dtype=bool)
+        years = days[[days.argmin(), days.argmax()]].astype("datetime64[Y]").astype(int) + 1970
+        holiday_days = self.get_holiday_days(*years)
+        if not len(holiday_days):
+            return np.zeros(len(days), dtype=bool)
+        positions = np.minimum(np.searchsorted(holiday_days, days), len(holiday_days) - 1)
+        return holiday_days[positions] == days
+
+    @memoize_report("manual_db", "contract_info", "holidays")
     def get_manual_df_with_workime(self) -> pd.DataFrame:
         """
         Read the manual_db file.
@@ -217,59 +603,128 @@ class WorktimeCalculator(DbBaseClass):
             Dataframe containing the to a daily base expanded entry's of manual_df.
 
         """
-        manual_df = pd.DataFrame()
-        manual_db = pd.read_csv(
-            self.manual_db_path, parse_dates=["start", "end"], sep="\t"
-        )  # type:ignore
+        manual_db = TsvStorage().read(self.manual_db_path)
         # expand start and end date to a range of dates
-        for _, row in manual_db.iterrows():
-            new_df = pd.DataFrame()
-            new_df["start"] = pd.date_range(row["start"], row["end"], normalize=True)
-            new_df["end"] = pd.date_range(row["start"], row["end"], normalize=True)
-            new_df["occupation"] = row["occupation"]
-            manual_df = manual_df.append(new_df)
+        row_ids, days = expand_days(
+            manual_db["start"].values.astype("datetime64[D]"),
+            manual_db["end"].values.astype("datetime64[D]"),
+        )
+        manual_df = pd.DataFrame(
+            {
+                "start": days.astype("datetime64[ns]"),
+                "end": days.astype("datetime64[ns]"),
+                "occupation": manual_db["occupation"].values[row_ids],
+            }
+        )
 
         # drop days which are holidays
-        work_day = manual_df["start"].apply(lambda x: x not in self.holidays)
+        work_day = ~self.get_holiday_mask(days)
         manual_df = pd.merge(manual_df[work_day], self.contract_worktime_df, on="start")
         return manual_df.sort_values(["start"]).reset_index(drop=True)
 
     def split_date_overlap_session(self) -> None:
         """
-        Split sessions which contain midnight to to sessions.
+        Split sessions which contain midnight to sessions for each day.
 
-        The first lasting until midnight and the second starting at midnight.
+        The first lasting until midnight, the ones in between lasting whole days
+        and the last starting at midnight.
+        Sessions which aren't longer than 1min afterwards are dropped.
 
         .. code-block:: text
 
             df before:
             start   end
-            1.1.1970 21:00:00   2.1.1970 02:00:00
+            1.1.1970 21:00:00   3.1.1970 02:00:00
 
             df after:
             start   end
             1.1.1970 21:00:00   2.1.1970 00:00:00
-            2.1.1970 00:00:00   2.1.1970 02:00:00
+            2.1.1970 00:00:00   3.1.1970 00:00:00
+            3.1.1970 00:00:00   3.1.1970 02:00:00
+
+        Only the sessions found by session_index.crossing_midnight get split.
+        """
+        is_crossing = np.zeros(len(self.db.index), dtype=bool)
+        is_crossing[self.session_index.crossing_midnight()] = True
+        db = self.db[~is_crossing]
+        db = db[db["end"] - db["start"] > pd.Timedelta(1, unit="m")]
+        split_db = self.split_sessions_by_day(self.db[is_crossing])
+        db = pd.concat([db, split_db], ignore_index=True)
+        self.db = db.sort_values("start", kind="mergesort").reset_index(drop=True)
+
+    @classmethod
+    def split_sessions_by_day(cls, db: pd.DataFrame) -> pd.DataFrame:
+        """
+        Split the sessions of db at each midnight they contain.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database with the columns 'start' and 'end'.
+
+        Returns
+        -------
+        pd.DataFrame
+            Sessions split by day, sorted by start.
 
+        See Also
+        --------
+        split_date_overlap_session
+        """
+        starts = db["start"].values.astype("datetime64[ns]")
+        ends = db["end"].values.astype("datetime64[ns]")
+        first_days = starts.astype("datetime64[D]")
+        last_days = np.maximum(ends.astype("datetime64[D]"), first_days)
+        # one segment for each day from the start date to the end date
+        session_ids, days = expand_days(first_days, last_days)
+        # order the segments by their number, so the first segments keep the order of db
+        segment_numbers = (days - first_days[session_ids]).astype(np.int64)
+        order = np.lexsort((session_ids, segment_numbers))
+        session_ids, days = session_ids[order], days[order]
+        segment_starts = np.maximum(starts[session_ids], days.astype("datetime64[ns]"))
+        segment_ends = np.minimum(ends[session_ids], (days + 1).astype("datetime64[ns]"))
+        real_work_period = segment_ends - segment_starts > np.timedelta64(1, "m")
+        split_db = db.iloc[session_ids[real_work_period]].copy()
+        split_db["start"] = segment_starts[real_work_period]
+        split_db["end"] = segment_ends[real_work_period]
+        return split_db.sort_values("start").reset_index(drop=True)
+
+    def add_sessions(self, sessions: pd.DataFrame) -> None:
         """
-        # midnight of the start and end date, are at different dates
-        overlap_sessions = (
-            self.db["start"].dt.normalize() != self.db["end"].dt.normalize()  # type:ignore
+        Add new or changed sessions, without splitting all sessions again.
+
+        Like with replay_journal, sessions with the same start get replaced.
+        Only the sessions which reach into the days since the first day of sessions
+        get split again, the rest of self.db stays the same.
+
+        Parameters
+        ----------
+        sessions : pd.DataFrame
+            New or changed sessions, with the columns 'start', 'end' and 'occupation'.
+        """
+        if sessions.empty:
+            return
+        first_day = sessions["start"].min().normalize()
+        is_before = self.raw_db["start"] < first_day
+        changed_db = pd.concat([self.raw_db[~is_before], sessions], ignore_index=True, sort=False)
+        changed_db = changed_db.drop_duplicates(["start"], keep="last")
+        changed_db = changed_db.sort_values(["start"], kind="mergesort")
+        self.raw_db = pd.concat([self.raw_db[is_before], changed_db], ignore_index=True)
+        # sessions before first_day can still have segments after it
+        split_db = self.split_sessions_by_day(self.raw_db[self.raw_db["end"] > first_day])
+        self.db = pd.concat(
+            [self.db[self.db["start"] < first_day], split_db[split_db["start"] >= first_day]],
+            ignore_index=True,
         )
-        # copy overlapping part from the df
-        df_to_append = self.db[overlap_sessions].copy()
-        # set start date of the df to append to midnight
-        df_to_append.loc[:, "start"] = df_to_append["end"].dt.normalize()
-        # set the end date of the overlapping df to midnight
-        self.db.loc[overlap_sessions, "end"] = self.db[overlap_sessions]["end"].dt.normalize()
-        self.db = self.db.append(df_to_append)
-        self.db = self.db[(self.db["end"] - self.db["start"]) > pd.to_timedelta(1, unit="m")]
-        self.db = self.db.sort_values("start").reset_index(drop=True)
 
+    @memoize_report("db", "manual_db", "contract_info", "holidays")
     def get_total_df(self) -> pd.DataFrame:
         """
         Calculate total Dataframe.
 
+        The result is memoized until the sessions, manual_db, contract_info
+        or the holidays change, see memoize_report.
+
         Returns
         -------
         pd.DataFrame
@@ -280,9 +735,9 @@ class WorktimeCalculator(DbBaseClass):
         add_time_columns
 
         """
-        self.db["worktime"] = self.db["end"] - self.db["start"]
+        db = self.db.assign(worktime=self.db["end"] - self.db["start"])
         result_df = pd.concat(
-            [self.db, self.get_holiday_df(), self.get_manual_df_with_workime()],  # type:ignore
+            [db, self.get_holiday_df(), self.get_manual_df_with_workime()],  # type:ignore
             sort=False,
         )
         result_df = self.add_time_columns(result_df)
@@ -320,32 +775,147 @@ class WorktimeCalculator(DbBaseClass):
         result_df["day"] = date_time_column.day  # type:ignore
         return result_df
 
-    def get_plot_df(self, rule="D", date_time_column="start") -> pd.DataFrame:
+    @memoize_report("db", "manual_db", "contract_info", "holidays")
+    def get_daily_aggregates(self) -> pd.DataFrame:
+        """
+        Return the worktime per day and occupation.
+
+        The aggregates are persisted in the data folder and only the sessions since
+        the last update get aggregated again, see DailyAggregates.
+
+        Returns
+        -------
+        pd.DataFrame
+            Aggregates with the columns 'day', 'occupation', 'worktime', 'first_start'
+            and 'source'.
+        """
+        credits_hash = "|".join(
+            self.get_dependency_hash(name) for name in ["manual_db", "contract_info", "holidays"]
+        )
+
+        def get_credits() -> pd.DataFrame:
+            return pd.concat(
+                [
+                    self.get_holiday_df().assign(source="credits"),
+                    self.get_manual_df_with_workime().assign(source="credits"),
+                    self.contract_worktime_df.assign(occupation="target", source="target"),
+                ],
+                sort=False,
+            )
+
+        return self.daily_aggregates.update(self.db, get_credits, credits_hash)
+
+    @memoize_report("db", "manual_db", "contract_info", "holidays")
+    def get_plot_df(
+        self, rule="D", date_time_column="start", start: TimeBound = None, end: TimeBound = None
+    ) -> pd.DataFrame:
         """
         Return a Dataframe prepared for plotting.
 
         Dataframe with a DateTimeIndex, columns named by occupation and
-        containing the worked time of that occupation for the given samplingrate
+        containing the worked time of that occupation for the given samplingrate.
+        Rules which only bin whole days are served from the daily aggregates.
 
         Parameters
         ----------
         rule : str
             Resampling rule see pandas.DataFrame.resample
+        date_time_column : str
+            Name of the column containing the datetime to resample on.
+        start : TimeBound, optional
+            Only worktime of days from start on is included, by default None
+        end : TimeBound, optional
+            Only worktime of days before end is included, by default None
 
         Returns
         -------
         pandas.DataFrame
             Dataframe with a DateDimeIndex, columns named by occupation and
             containing the worktime of that occupation for the samplingrate
+
+        See Also
+        --------
+        get_daily_aggregates
         """
-        total_df = self.get_total_df().sort_values(date_time_column).reset_index(drop=True)
-        plot_df = pd.DataFrame(total_df.resample(rule, on=date_time_column).worktime.sum())
-        plot_df.columns = ["total"]
-        for occupation in total_df["occupation"].unique():
-            occupation_series = total_df[total_df["occupation"] == occupation]
-            occupation_series = occupation_series.resample(
-                rule, on=date_time_column
-            ).worktime.sum()
-            occupation_series = occupation_series.rename(occupation)
-            plot_df = plot_df.join(occupation_series)
+        if self.use_daily_aggregates and date_time_column == "start" and is_day_aligned(rule):
+            aggregates = self.get_daily_aggregates()
+            aggregates = aggregates[
+                (aggregates["source"] != "target")
+                & self.get_range_mask(aggregates["day"], start, end)
+            ]
+            # the first start of each day and occupation keeps the column order of total_df
+            total_df = aggregates[["first_start", "worktime", "occupation"]].rename(
+                columns={"first_start": "start"}
+            )
+            return self.pivot_worktime(total_df, rule)
+        total_df = self.get_total_df()
+        total_df = total_df[
+            self.get_range_mask(total_df[date_time_column].dt.normalize(), start, end)
+        ]
+        return self.pivot_worktime(total_df, rule, date_time_column)
+
+    @classmethod
+    def get_range_mask(cls, days: pd.Series, start: TimeBound, end: TimeBound) -> pd.Series:
+        """
+        Check which days are in the range [start, end).
+
+        Parameters
+        ----------
+        days : pd.Series
+            Days which should be checked.
+        start : TimeBound
+            Start of the range, None means unbounded.
+        end : TimeBound
+            End of the range (exclusive), None means unbounded.
+
+        Returns
+        -------
+        pd.Series
+            Boolean mask of the days in the range.
+        """
+        mask = pd.Series(True, index=days.index)
+        if start is not None:
+            mask &= days >= pd.Timestamp(start)
+        if end is not None:
+            mask &= days < pd.Timestamp(end)
+        return mask
+
+    @classmethod
+    def pivot_worktime(
+        cls, total_df: pd.DataFrame, rule="D", date_time_column="start"
+    ) -> pd.DataFrame:
+        """
+        Sum up the worktime per resampling period and occupation in a single groupby.
+
+        Parameters
+        ----------
+        total_df : pd.DataFrame
+            Dataframe with 'worktime' and 'occupation' columns, like the one of get_total_df.
+        rule : str
+            Resampling rule see pandas.DataFrame.resample
+        date_time_column : str
+            Name of the column containing the datetime to resample on.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Dataframe with a DateDimeIndex, a 'total' column and columns named by occupation,
+            containing the worktime of that occupation for the samplingrate
+
+        See Also
+        --------
+        get_plot_df
+        """
+        total_df = total_df.sort_values(date_time_column).reset_index(drop=True)
+        total = total_df.resample(rule, on=date_time_column).worktime.sum()
+        plot_df = (
+            total_df.groupby([pd.Grouper(key=date_time_column, freq=rule), "occupation"])[
+                "worktime"
+            ]
+            .sum()
+            .unstack("occupation")
+            .reindex(index=total.index, columns=total_df["occupation"].unique())
+        )
+        plot_df.columns.name = None
+        plot_df.insert(0, "total", total)
         return plot_df.fillna(pd.Timedelta(seconds=0))  # type:ignore
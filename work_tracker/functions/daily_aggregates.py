@@ -0,0 +1,299 @@
+"""Module containing the persisted daily aggregates of the worktime reports."""
+import hashlib
+import os
+import threading
+from configparser import ConfigParser
+from typing import Callable, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from .storage import DB_COLUMNS
+
+AGGREGATE_COLUMNS = ["day", "occupation", "worktime", "first_start", "source"]
+DAY_NS = 24 * 60 * 60 * 10**9
+
+
+def is_day_aligned(rule: str) -> bool:
+    """
+    Check if the bins of a resampling rule always contain whole days.
+
+    Parameters
+    ----------
+    rule : str
+        Resampling rule see pandas.DataFrame.resample
+
+    Returns
+    -------
+    bool
+        Whether the rule can be served from daily aggregates.
+    """
+    offset = to_offset(rule)
+    if isinstance(offset, pd.offsets.Tick):
+        return offset.nanos % DAY_NS == 0
+    return not isinstance(offset, (pd.offsets.BusinessHour, pd.offsets.CustomBusinessHour))
+
+
+class DailyAggregates:
+    def __init__(self, aggregates_path: str, state_path: str):
+        """
+        Worktime per day and occupation, which is persisted and updated incrementally.
+
+        The aggregates contain rows from three sources:
+
+        - 'sessions': worked time of the sessions
+        - 'credits': worktime credited for holidays and manual_db entries (i.e. vacation)
+        - 'target': worktime the contracts require on that day
+
+        The first update of an instance validates the saved aggregates: days before the
+        last day with sessions are treated as complete and as long as the sessions of
+        those days didn't change, only the sessions since then get aggregated again.
+        Changes of older sessions (i.e. merged from another computer) cause a rebuild.
+        After that the sessions are expected to only be added or extended, like
+        WorktimeCalculator.add_sessions does, so only the days of sessions which end
+        after the latest end of the last update get aggregated again.
+
+        Parameters
+        ----------
+        aggregates_path : str
+            Path of the tsv file the aggregates are saved to.
+        state_path : str
+            Path of the ini file the state of the aggregates is saved to.
+        """
+        self.aggregates_path = aggregates_path
+        self.state_path = state_path
+        # the aggregates get updated by the watcher and the request threads of the dashboard
+        self.lock = threading.Lock()
+        self.aggregates: Union[pd.DataFrame, None] = None
+        self.state = ConfigParser()
+
+    def copy(self) -> "DailyAggregates":
+        """
+        Return a copy, whose updates don't change the aggregates of self.
+
+        Returns
+        -------
+        DailyAggregates
+            Copy with the same files and the aggregates of the last update.
+        """
+        daily_aggregates = DailyAggregates(self.aggregates_path, self.state_path)
+        with self.lock:
+            daily_aggregates.aggregates = self.aggregates
+            daily_aggregates.state.read_dict(self.state)
+        return daily_aggregates
+
+    @classmethod
+    def aggregate(cls, df: pd.DataFrame, source: str) -> pd.DataFrame:
+        """
+        Sum up the worktime per day and occupation.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Dataframe with the columns 'start', 'occupation' and 'worktime'.
+        source : str
+            Value of the 'source' column of the aggregates.
+
+        Returns
+        -------
+        pd.DataFrame
+            Aggregates with the columns of AGGREGATE_COLUMNS.
+        """
+        aggregates = (
+            df.assign(day=df["start"].dt.normalize())
+            .groupby(["day", "occupation"], sort=False)
+            .agg(worktime=("worktime", "sum"), first_start=("start", "min"))
+            .reset_index()
+        )
+        aggregates["source"] = source
+        return aggregates[AGGREGATE_COLUMNS]
+
+    def load(self) -> pd.DataFrame:
+        """
+        Load the saved aggregates.
+
+        Returns
+        -------
+        pd.DataFrame
+            Aggregates with the columns of AGGREGATE_COLUMNS, empty if none were saved.
+        """
+        if not os.path.isfile(self.aggregates_path):
+            return pd.DataFrame(
+                {
+                    "day": pd.Series(dtype="datetime64[ns]"),
+                    "occupation": pd.Series(dtype=object),
+                    "worktime": pd.Series(dtype="timedelta64[ns]"),
+                    "first_start": pd.Series(dtype="datetime64[ns]"),
+                    "source": pd.Series(dtype=object),
+                }
+            )
+        aggregates = pd.read_csv(
+            self.aggregates_path,
+            sep="\t",
+            parse_dates=["day", "first_start"],  # type: ignore
+            dtype={"occupation": str, "source": str},
+        )
+        aggregates["worktime"] = pd.to_timedelta(aggregates["worktime"], unit="ns")
+        return aggregates
+
+    def load_state(self) -> ConfigParser:
+        """
+        Load the state of the saved aggregates.
+
+        The section 'aggregates' contains the first day which isn't complete yet
+        ('complete_until' in nanoseconds since the epoch), the hash of the sessions
+        before that day ('sessions_hash'), the latest end of the aggregated sessions
+        ('max_end' in nanoseconds since the epoch) and the hash of the data the credits
+        were calculated from ('credits_hash').
+
+        Returns
+        -------
+        ConfigParser
+            State of the aggregates.
+        """
+        state = ConfigParser()
+        state.read(self.state_path)
+        if not state.has_section("aggregates"):
+            state.add_section("aggregates")
+        return state
+
+    def save(self, aggregates: pd.DataFrame, state: ConfigParser) -> None:
+        """
+        Save the aggregates and their state.
+
+        The files are written to temporary files first and then replace the old ones,
+        so readers never see partially written files.
+
+        Parameters
+        ----------
+        aggregates : pd.DataFrame
+            Aggregates with the columns of AGGREGATE_COLUMNS.
+        state : ConfigParser
+            State of the aggregates.
+        """
+        aggregates.assign(worktime=aggregates["worktime"].values.view(np.int64)).to_csv(
+            f"{self.aggregates_path}.tmp", sep="\t", index=False, columns=AGGREGATE_COLUMNS
+        )
+        os.replace(f"{self.aggregates_path}.tmp", self.aggregates_path)
+        with open(f"{self.state_path}.tmp", "w") as state_file:
+            state.write(state_file)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    def validate_saved(self, db: pd.DataFrame) -> Tuple[pd.DataFrame, ConfigParser]:
+        """
+        Update the saved session aggregates with db, for the first update of the instance.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Sessions split at midnight, with the columns 'start', 'end', 'occupation'
+            and 'worktime'.
+
+        Returns
+        -------
+        Tuple[pd.DataFrame, ConfigParser]
+            Aggregates of all sources, of which the sessions are up to date, and the
+            saved state of the aggregates.
+        """
+        aggregates = self.load()
+        state = self.load_state()
+        starts = db["start"].values.astype("datetime64[ns]").view(np.int64)
+        row_hashes = pd.util.hash_pandas_object(db[DB_COLUMNS], index=False).values
+        complete_until: Union[int, None] = state.getint(
+            "aggregates", "complete_until", fallback=None
+        )
+
+        def sessions_hash(until: int) -> str:
+            return hashlib.md5(row_hashes[starts < until].tobytes()).hexdigest()
+
+        is_session = aggregates["source"] == "sessions"
+        if complete_until is not None and sessions_hash(complete_until) == state.get(
+            "aggregates", "sessions_hash", fallback=""
+        ):
+            # only the days since the last update need to be aggregated again
+            complete_sessions = aggregates[
+                is_session & (aggregates["day"] < pd.Timestamp(complete_until))
+            ]
+            session_aggregates = pd.concat(
+                [complete_sessions, self.aggregate(db[starts >= complete_until], "sessions")]
+            )
+        else:
+            session_aggregates = self.aggregate(db, "sessions")
+        if len(starts):
+            # the last day with sessions can still change
+            complete_until = int(starts.max() // DAY_NS * DAY_NS)
+            state.set("aggregates", "complete_until", str(complete_until))
+            state.set("aggregates", "sessions_hash", sessions_hash(complete_until))
+        aggregates = pd.concat([session_aggregates, aggregates[~is_session]])
+        return aggregates.reset_index(drop=True), state
+
+    def update(
+        self, db: pd.DataFrame, get_credits: Callable[[], pd.DataFrame], credits_hash: str
+    ) -> pd.DataFrame:
+        """
+        Update the aggregates with the current sessions and credits.
+
+        The aggregates are only saved if they changed.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Sessions split at midnight, with the columns 'start', 'end' and 'occupation'.
+        get_credits : Callable[[], pd.DataFrame]
+            Function returning the credits and targets with the columns
+            'start', 'occupation', 'worktime' and 'source', only called if
+            credits_hash changed.
+        credits_hash : str
+            Hash of the data the credits are calculated from.
+
+        Returns
+        -------
+        pd.DataFrame
+            Updated aggregates with the columns of AGGREGATE_COLUMNS.
+        """
+        with self.lock:
+            db = db.assign(worktime=db["end"] - db["start"])
+            starts = db["start"].values.astype("datetime64[ns]").view(np.int64)
+            ends = db["end"].values.astype("datetime64[ns]").view(np.int64)
+            if self.aggregates is None:
+                saved_state = self.load_state()
+                aggregates, state = self.validate_saved(db)
+                changed = False
+            else:
+                saved_state = self.state
+                aggregates, state = self.aggregates, ConfigParser()
+                state.read_dict(self.state)
+                is_extended = ends > state.getint("aggregates", "max_end", fallback=-1)
+                # days with sessions which were added or extended since the last update
+                changed_days = np.unique(starts[is_extended] // DAY_NS * DAY_NS)
+                changed = len(changed_days) > 0
+                if changed:
+                    days = aggregates["day"].values.astype("datetime64[ns]").view(np.int64)
+                    is_changed_session = (aggregates["source"] == "sessions").values & np.isin(
+                        days, changed_days
+                    )
+                    changed_sessions = db[np.isin(starts // DAY_NS * DAY_NS, changed_days)]
+                    aggregates = pd.concat(
+                        [
+                            aggregates[~is_changed_session],
+                            self.aggregate(changed_sessions, "sessions"),
+                        ]
+                    ).reset_index(drop=True)
+            if len(ends):
+                state.set("aggregates", "max_end", str(int(ends.max())))
+            if credits_hash != state.get("aggregates", "credits_hash", fallback=""):
+                is_session = aggregates["source"] == "sessions"
+                aggregates = pd.concat(
+                    [aggregates[is_session]]
+                    + [
+                        self.aggregate(credits_df, source)
+                        for source, credits_df in get_credits().groupby("source", sort=False)
+                    ]
+                ).reset_index(drop=True)
+                state.set("aggregates", "credits_hash", credits_hash)
+                changed = True
+            if changed or state != saved_state:
+                self.save(aggregates, state)
+            self.aggregates, self.state = aggregates, state
+            return aggregates
@@ -2,11 +2,23 @@
 import datetime
 import hashlib
 import inspect
+import mmap
 import os
 import re
-from typing import Union
+import threading
+from typing import Dict, Tuple, Union
 from warnings import warn
 
+try:
+    import xxhash
+except ImportError:  # pragma: no cover
+    xxhash = None  # type: ignore
+
+# cache of file hashes, with (path, algorithm) as key and (stat key, hash) as value
+_file_hash_cache: Dict[Tuple[str, str], Tuple[Tuple[int, int, int, int], str]] = {}
+# the cache is used by the tracker and the background synchronization at the same time
+_file_hash_cache_lock = threading.Lock()
+
 
 def get_abs_path(rel_path):
     """
@@ -79,26 +91,103 @@ def seconds_to_hm(seconds: int) -> str:
     return "%d:%02d" % (h, m)
 
 
-def hash_file(file_path: str) -> Union[str, None]:
+def get_hasher(algorithm: str):
     """
-    Calculate the md5 hash value of the file at file_path.
+    Create a hash object for algorithm.
+
+    Parameters
+    ----------
+    algorithm : str
+        Name of a hashlib algorithm (i.e. 'md5' or 'blake2b') or 'xxhash',
+        which needs the optional package xxhash and falls back to 'blake2b'.
+
+    Returns
+    -------
+    Hash object with update and hexdigest methods.
+    """
+    if algorithm == "xxhash":
+        if xxhash is not None:
+            return xxhash.xxh3_64()
+        warn(UserWarning("xxhash isn't installed, using blake2b instead."))
+        algorithm = "blake2b"
+    return hashlib.new(algorithm)
+
+
+def hash_file(
+    file_path: str,
+    algorithm: str = "md5",
+    chunk_size: int = 1024 * 1024,
+    use_mmap: bool = False,
+) -> Union[str, None]:
+    """
+    Calculate the hash value of the file at file_path.
+
+    The file is hashed in chunks, so it never has to be loaded into memory completely.
+    Hashes are cached with the inode, modification time, change time and size of the file,
+    so unchanged files don't get hashed again. Since filesystems with coarse timestamps
+    can't tell apart rewrites within the same tick, files written by the app itself
+    should be passed to invalidate_file_hash.
 
     Parameters
     ----------
     file_path : str
         Path to the file that should be hashed.
+    algorithm : str, optional
+        Hash algorithm, see get_hasher, by default "md5"
+    chunk_size : int, optional
+        Number of bytes which are read at once, by default 1024*1024
+    use_mmap : bool, optional
+        Whether to memory-map the file instead of reading it in chunks, by default False
 
     Returns
     -------
     str
-        MD5 hex  hash value of the file at file_path.
+        Hex hash value of the file at file_path.
     """
     if os.path.isfile(file_path):
+        file_stat = os.stat(file_path)
+        cache_key = (os.path.abspath(file_path), algorithm)
+        stat_key = (
+            file_stat.st_ino,
+            file_stat.st_mtime_ns,
+            file_stat.st_ctime_ns,
+            file_stat.st_size,
+        )
+        with _file_hash_cache_lock:
+            cached_hash = _file_hash_cache.get(cache_key)
+        if cached_hash is not None and cached_hash[0] == stat_key:
+            return cached_hash[1]
+        hash_val = get_hasher(algorithm)
         with open(file_path, "rb") as file:
-            hash_val = hashlib.md5(file.read())
-        return hash_val.hexdigest()
+            # empty files can't be memory-mapped
+            if use_mmap and file_stat.st_size:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                    hash_val.update(mapped_file)
+            else:
+                for chunk in iter(lambda: file.read(chunk_size), b""):
+                    hash_val.update(chunk)
+        hex_hash = hash_val.hexdigest()
+        with _file_hash_cache_lock:
+            _file_hash_cache[cache_key] = (stat_key, hex_hash)
+        return hex_hash
     else:
         warn(UserWarning(f"The file {file_path} does not exist."))
+        return None
+
+
+def invalidate_file_hash(file_path: str) -> None:
+    """
+    Remove the cached hashes of the file at file_path, after it was written.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file that was written.
+    """
+    abs_path = os.path.abspath(file_path)
+    with _file_hash_cache_lock:
+        for cache_key in [key for key in _file_hash_cache if key[0] == abs_path]:
+            del _file_hash_cache[cache_key]
 
 
 def debug_printer(arg):
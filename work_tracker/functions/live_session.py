@@ -0,0 +1,310 @@
+"""Module containing the in-memory session model of the live tracker."""
+import datetime
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+
+from .storage import DB_COLUMNS
+
+TimeValue = Union[datetime.datetime, pd.Timestamp, np.datetime64]
+
+
+def to_ns(time_value: TimeValue) -> int:
+    """
+    Convert a point in time to int64 nanoseconds since the epoch.
+
+    Parameters
+    ----------
+    time_value : TimeValue
+        Point in time to convert.
+
+    Returns
+    -------
+    int
+        Nanoseconds since the epoch.
+    """
+    return int(np.datetime64(time_value, "ns").astype(np.int64))
+
+
+class SessionRecord:
+    __slots__ = ("start", "end", "occupation")
+
+    def __init__(self, start: int, end: int, occupation: str):
+        """
+        Single work session of the live tracker.
+
+        Parameters
+        ----------
+        start : int
+            Start of the session in nanoseconds since the epoch.
+        end : int
+            End of the session in nanoseconds since the epoch.
+        occupation : str
+            Occupation the session was worked on.
+        """
+        self.start = start
+        self.end = end
+        self.occupation = occupation
+
+    def __repr__(self) -> str:
+        return (
+            f"SessionRecord(start={pd.Timestamp(self.start)}, "
+            f"end={pd.Timestamp(self.end)}, occupation={self.occupation!r})"
+        )
+
+
+class SessionStore:
+    def __init__(self, capacity: int = 1024, columns: Iterable[str] = DB_COLUMNS):
+        """
+        Array backed session table, used by the tracker instead of a DataFrame.
+
+        Start and end are stored as int64 nanoseconds since the epoch and
+        occupations as codes into an occupation table, so appending a session or
+        extending the end of the current one doesn't copy the whole history.
+        A DataFrame is only created by to_dataframe, when it is needed for analytics
+        or to write the database.
+
+        Parameters
+        ----------
+        capacity : int, optional
+            Number of sessions the arrays can hold before they need to grow,
+            by default 1024
+        columns : Iterable[str], optional
+            Column order of the DataFrame created by to_dataframe, by default DB_COLUMNS
+        """
+        capacity = max(capacity, 1)
+        self.starts = np.empty(capacity, dtype=np.int64)
+        self.ends = np.empty(capacity, dtype=np.int64)
+        self.codes = np.empty(capacity, dtype=np.int32)
+        self.occupations: List[str] = []
+        self.occupation_codes: Dict[str, int] = {}
+        self.columns = list(columns)
+        self.size = 0
+
+    @classmethod
+    def from_dataframe(cls, db: pd.DataFrame) -> "SessionStore":
+        """
+        Create a store from a database DataFrame.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database with the columns 'start', 'end' and 'occupation'.
+
+        Returns
+        -------
+        SessionStore
+            Store containing the rows of db in the same order.
+        """
+        columns = list(db.columns) if set(db.columns) == set(DB_COLUMNS) else DB_COLUMNS
+        store = cls(capacity=2 * len(db.index), columns=columns)
+        size = len(db.index)
+        for column, values in (("start", store.starts), ("end", store.ends)):
+            times = pd.to_datetime(db[column]).values.astype("datetime64[ns]")
+            values[:size] = times.view(np.int64)
+        codes, occupations = pd.factorize(db["occupation"].astype(str))
+        store.codes[:size] = codes
+        store.occupations = list(occupations)
+        store.occupation_codes = {name: code for code, name in enumerate(store.occupations)}
+        store.size = size
+        return store
+
+    def __len__(self) -> int:
+        return self.size
+
+    def get_occupation_code(self, occupation: str) -> int:
+        """
+        Return the code of an occupation, adding it to the table if it is new.
+
+        Parameters
+        ----------
+        occupation : str
+            Name of the occupation.
+
+        Returns
+        -------
+        int
+            Index of the occupation in self.occupations.
+        """
+        code = self.occupation_codes.get(occupation)
+        if code is None:
+            code = len(self.occupations)
+            self.occupations.append(occupation)
+            self.occupation_codes[occupation] = code
+        return code
+
+    def append(self, start: int, end: int, occupation: str) -> int:
+        """
+        Append a session, growing the arrays if they are full.
+
+        Parameters
+        ----------
+        start : int
+            Start of the session in nanoseconds since the epoch.
+        end : int
+            End of the session in nanoseconds since the epoch.
+        occupation : str
+            Occupation the session was worked on.
+
+        Returns
+        -------
+        int
+            Position of the new session.
+        """
+        if self.size == len(self.starts):
+            capacity = 2 * len(self.starts)
+            self.starts = np.resize(self.starts, capacity)
+            self.ends = np.resize(self.ends, capacity)
+            self.codes = np.resize(self.codes, capacity)
+        position = self.size
+        self.starts[position] = start
+        self.ends[position] = end
+        self.codes[position] = self.get_occupation_code(occupation)
+        self.size += 1
+        return position
+
+    def record(self, position: int) -> SessionRecord:
+        """
+        Return the session at position.
+
+        Parameters
+        ----------
+        position : int
+            Position of the session.
+
+        Returns
+        -------
+        SessionRecord
+            Copy of the session, changing it doesn't change the store.
+        """
+        return SessionRecord(
+            int(self.starts[position]),
+            int(self.ends[position]),
+            self.occupations[self.codes[position]],
+        )
+
+    def positions_since(self, start: int) -> List[int]:
+        """
+        Return the positions of all sessions which started at or after start.
+
+        Parameters
+        ----------
+        start : int
+            Point in time in nanoseconds since the epoch.
+
+        Returns
+        -------
+        List[int]
+            Positions in ascending order.
+        """
+        return np.flatnonzero(self.starts[: self.size] >= start).tolist()
+
+    def remove_short_sessions(self, min_duration: int) -> bool:
+        """
+        Remove all sessions which aren't longer than min_duration.
+
+        Parameters
+        ----------
+        min_duration : int
+            Duration in nanoseconds.
+
+        Returns
+        -------
+        bool
+            Whether any session was removed.
+        """
+        keep = np.flatnonzero(self.ends[: self.size] - self.starts[: self.size] > min_duration)
+        if len(keep) == self.size:
+            return False
+        size = len(keep)
+        self.starts[:size] = self.starts[keep]
+        self.ends[:size] = self.ends[keep]
+        self.codes[:size] = self.codes[keep]
+        self.size = size
+        return True
+
+    def to_dataframe(self, positions: Union[Iterable[int], None] = None) -> pd.DataFrame:
+        """
+        Create a database DataFrame from the sessions.
+
+        Parameters
+        ----------
+        positions : Union[Iterable[int], None], optional
+            Positions of the sessions to include, None includes all sessions,
+            by default None
+
+        Returns
+        -------
+        pd.DataFrame
+            Database with the columns 'start', 'end' and 'occupation'.
+        """
+        if positions is None:
+            selection: Union[slice, List[int]] = slice(0, self.size)
+        else:
+            selection = list(positions)
+        occupations = np.array(self.occupations, dtype=object)
+        data = {
+            "start": self.starts[selection].view("datetime64[ns]"),
+            "end": self.ends[selection].view("datetime64[ns]"),
+            "occupation": occupations[self.codes[selection]],
+        }
+        return pd.DataFrame({column: data[column] for column in self.columns})
+
+
+class DayWindow:
+    __slots__ = ("positions", "first_start", "work", "last_end")
+
+    def __init__(self):
+        """
+        Running totals of the sessions which started on one day.
+
+        Used by the tracker to answer the per minute queries for today and yesterday,
+        without looking at the rest of the history.
+        """
+        self.positions: List[int] = []
+        self.first_start: Union[int, None] = None
+        self.work = 0
+        self.last_end: Union[int, None] = None
+
+    def add(self, position: int, start: int, end: int) -> None:
+        """
+        Add a session to the window.
+
+        Parameters
+        ----------
+        position : int
+            Position of the session in the SessionStore.
+        start : int
+            Start of the session in nanoseconds since the epoch.
+        end : int
+            End of the session in nanoseconds since the epoch.
+        """
+        self.positions.append(position)
+        if self.first_start is None or start < self.first_start:
+            self.first_start = start
+        if self.last_end is None or end > self.last_end:
+            self.last_end = end
+        self.work += end - start
+
+    def extend(self, old_end: int, new_end: int, ends: np.ndarray) -> None:
+        """
+        Update the totals after the end of a session in the window was moved.
+
+        The end might also be moved to an earlier time, if the system clock was
+        set back, in which case last_end gets recomputed from the window.
+
+        Parameters
+        ----------
+        old_end : int
+            Previous end of the session in nanoseconds since the epoch.
+        new_end : int
+            New end of the session in nanoseconds since the epoch.
+        ends : np.ndarray
+            Ends of the sessions in the SessionStore, which already contain new_end.
+        """
+        self.work += new_end - old_end
+        if self.last_end is None or new_end >= self.last_end:
+            self.last_end = new_end
+        elif old_end == self.last_end:
+            self.last_end = int(ends[self.positions].max())
@@ -0,0 +1,145 @@
+"""Module containing the interval index over work sessions."""
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from .storage import TimeBound
+
+DAY_NS = 24 * 60 * 60 * 10**9
+
+
+def bound_to_ns(bound: Union[TimeBound, int]) -> int:
+    """
+    Convert a time bound to nanoseconds since the epoch.
+
+    Parameters
+    ----------
+    bound : Union[TimeBound, int]
+        Point in time, ints are taken as nanoseconds since the epoch.
+
+    Returns
+    -------
+    int
+        Nanoseconds since the epoch.
+    """
+    if isinstance(bound, (int, np.integer)):
+        return int(bound)
+    return pd.Timestamp(bound).value
+
+
+class SessionIntervalIndex:
+    def __init__(self, db: pd.DataFrame):
+        """
+        Sorted interval index over the sessions of a database.
+
+        The sessions are sorted by start once, after that range and overlap queries
+        are answered with binary searches instead of boolean masks over the whole db.
+        All queries return positions of the rows in db, which can be used with db.iloc.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database with the columns 'start' and 'end'.
+        """
+        self.db = db
+        starts = pd.to_datetime(db["start"]).values.astype("datetime64[ns]").view(np.int64)
+        ends = pd.to_datetime(db["end"]).values.astype("datetime64[ns]").view(np.int64)
+        # stable sort, so sessions with the same start keep their order
+        self.order = np.argsort(starts, kind="stable")
+        self.starts = starts[self.order]
+        self.ends = ends[self.order]
+        # running maximum of the ends, which is sorted and allows binary search for overlaps
+        self.max_ends = np.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def sessions_between(
+        self, start: Union[TimeBound, int], end: Union[TimeBound, int]
+    ) -> np.ndarray:
+        """
+        Return the sessions which started in the interval [start, end).
+
+        Parameters
+        ----------
+        start : Union[TimeBound, int]
+            Start of the interval, None means unbounded.
+        end : Union[TimeBound, int]
+            End of the interval (exclusive), None means unbounded.
+
+        Returns
+        -------
+        np.ndarray
+            Positions of the sessions in db, sorted by start.
+        """
+        low = 0 if start is None else np.searchsorted(self.starts, bound_to_ns(start), "left")
+        high = len(self) if end is None else np.searchsorted(self.starts, bound_to_ns(end), "left")
+        return self.order[low:high]
+
+    def overlapping(self, start: Union[TimeBound, int], end: Union[TimeBound, int]) -> np.ndarray:
+        """
+        Return the sessions which overlap with the interval (start, end).
+
+        Parameters
+        ----------
+        start : Union[TimeBound, int]
+            Start of the interval, None means unbounded.
+        end : Union[TimeBound, int]
+            End of the interval, None means unbounded.
+
+        Returns
+        -------
+        np.ndarray
+            Positions of the sessions in db, sorted by start.
+        """
+        high = len(self) if end is None else np.searchsorted(self.starts, bound_to_ns(end), "left")
+        if start is None:
+            return self.order[:high]
+        start_ns = bound_to_ns(start)
+        # sessions before low end before start, since even the running maximum does
+        low = np.searchsorted(self.max_ends, start_ns, "right")
+        candidates = np.arange(low, max(low, high))
+        return self.order[candidates[self.ends[candidates] > start_ns]]
+
+    def conflicts(self) -> np.ndarray:
+        """
+        Return the sessions which have the same start as an earlier row of db.
+
+        Returns
+        -------
+        np.ndarray
+            Positions of the sessions in db, sorted by start.
+        """
+        duplicated = np.flatnonzero(self.starts[1:] == self.starts[:-1]) + 1
+        return self.order[duplicated]
+
+    def max_end_by_start(self) -> np.ndarray:
+        """
+        Return the max end of all sessions with the same start, for each row of db.
+
+        Returns
+        -------
+        np.ndarray
+            Ends as datetime64[ns] in the row order of db.
+        """
+        if not len(self):
+            return self.ends.view("datetime64[ns]")
+        group_starts = np.flatnonzero(np.r_[True, self.starts[1:] != self.starts[:-1]])
+        group_max_ends = np.maximum.reduceat(self.ends, group_starts)
+        group_sizes = np.diff(np.r_[group_starts, len(self)])
+        max_ends = np.empty_like(self.ends)
+        max_ends[self.order] = np.repeat(group_max_ends, group_sizes)
+        return max_ends.view("datetime64[ns]")
+
+    def crossing_midnight(self) -> np.ndarray:
+        """
+        Return the sessions which end on a later date than they started.
+
+        Returns
+        -------
+        np.ndarray
+            Positions of the sessions in db, sorted by start.
+        """
+        crossing = self.starts // DAY_NS != self.ends // DAY_NS
+        return self.order[crossing]
@@ -0,0 +1,179 @@
+"""Module containing the persistent SFTP connection."""
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    import pysftp
+
+
+class SftpConnectionManager:
+    def __init__(
+        self,
+        keepalive_interval: int = 30,
+        backoff_base: Union[int, float] = 5,
+        backoff_max: Union[int, float] = 300,
+    ):
+        """
+        Persistent SFTP connection, which is shared by all remote operations.
+
+        The connection is opened lazily on first use and kept alive with keepalive packets.
+        If it breaks it gets reopened on the next use. Failed connection attempts
+        are retried with an exponential backoff, so an unreachable server doesn't
+        block every remote operation with a connection timeout.
+
+        Parameters
+        ----------
+        keepalive_interval : int, optional
+            Seconds between keepalive packets, 0 disables keepalive, by default 30
+        backoff_base : Union[int, float], optional
+            Seconds to wait before retrying after the first failed connection attempt,
+            the time doubles with each further failed attempt, by default 5
+        backoff_max : Union[int, float], optional
+            Maximum seconds to wait before retrying to connect, by default 300
+        """
+        self.keepalive_interval = keepalive_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sftp: Union["pysftp.Connection", None] = None
+        self.cnopts: Any = None
+        self.login_dict: Dict = {}
+        self.failed_attempts = 0
+        self.next_retry = 0.0
+
+    def get_time(self) -> float:
+        """
+        Helpermethod for mocking of time.monotonic() in unittests.
+
+        Returns
+        -------
+        float
+            time.monotonic()
+        """
+        return time.monotonic()
+
+    def is_connected(self) -> bool:
+        """
+        Check if the connection is open and its transport is still alive.
+
+        Returns
+        -------
+        bool
+            Whether the connection can be used.
+        """
+        if self.sftp is None:
+            return False
+        transport = getattr(self.sftp, "_transport", None)
+        return transport is not None and transport.is_active()
+
+    def get_cnopts(self) -> Any:
+        """
+        Create the connection options with disabled host key checking.
+
+        Returns
+        -------
+        pysftp.CnOpts
+            Connection options or None if they aren't supported by the pysftp version.
+        """
+        import pysftp
+
+        if self.cnopts is None:
+            # preventing some errors with different versions of pysftp
+            try:
+                self.cnopts = pysftp.CnOpts()
+                self.cnopts.hostkeys = None  # disable host key checking.
+            except Exception:
+                print("pysftp.CnOpts() doesn't exist")
+        return self.cnopts
+
+    def get_connection(self, login_dict: Dict) -> "pysftp.Connection":
+        """
+        Return the open connection or open a new one.
+
+        pysftp (and with it paramiko) is only imported here, so it doesn't slow down
+        the startup of the tracker.
+
+        Parameters
+        ----------
+        login_dict : Dict
+            Keyword arguments for pysftp.Connection, if they differ from the ones
+            of the open connection, a new connection is opened.
+            If they don't contain 'cnopts', the ones from get_cnopts are used.
+
+        Returns
+        -------
+        pysftp.Connection
+            Open SFTP connection.
+
+        Raises
+        ------
+        ConnectionError
+            If the last connection attempt failed and the backoff time didn't pass yet.
+        """
+        if login_dict != self.login_dict:
+            self.close()
+            self.login_dict = login_dict
+            self.failed_attempts = 0
+            self.next_retry = 0.0
+        if self.is_connected():
+            return self.sftp  # type: ignore
+        self.close()
+        if self.get_time() < self.next_retry:
+            raise ConnectionError(
+                f"Connecting to the SFTP server failed {self.failed_attempts} times, "
+                f"retrying in {self.next_retry - self.get_time():.0f}s."
+            )
+        import pysftp
+
+        connection_kwargs = dict(login_dict)
+        if "cnopts" not in connection_kwargs and self.get_cnopts() is not None:
+            connection_kwargs["cnopts"] = self.get_cnopts()
+        try:
+            self.sftp = pysftp.Connection(**connection_kwargs)
+        except Exception:
+            self.failed_attempts += 1
+            backoff = self.backoff_base * 2 ** (self.failed_attempts - 1)
+            self.next_retry = self.get_time() + min(backoff, self.backoff_max)
+            raise
+        self.failed_attempts = 0
+        self.next_retry = 0.0
+        transport = getattr(self.sftp, "_transport", None)
+        if transport is not None and self.keepalive_interval:
+            transport.set_keepalive(self.keepalive_interval)
+        return self.sftp
+
+    @contextmanager
+    def connect(self, login_dict: Dict) -> Iterator["pysftp.Connection"]:
+        """
+        Context manager providing the shared connection.
+
+        Other than using pysftp.Connection as context manager, the connection
+        stays open after leaving the context. If an error occurs and the connection
+        is broken, it gets closed so the next use reconnects.
+
+        Parameters
+        ----------
+        login_dict : Dict
+            Keyword arguments for pysftp.Connection.
+
+        Yields
+        ------
+        pysftp.Connection
+            Open SFTP connection.
+        """
+        sftp = self.get_connection(login_dict)
+        try:
+            yield sftp
+        except Exception:
+            if not self.is_connected():
+                self.close()
+            raise
+
+    def close(self) -> None:
+        """Close the connection if it is open."""
+        if self.sftp is not None:
+            try:
+                self.sftp.close()
+            except Exception:
+                pass
+            self.sftp = None
@@ -0,0 +1,609 @@
+"""Module containing the storage backends for the session databases."""
+import datetime
+import io
+import os
+import sqlite3
+from typing import Dict, Tuple, Type, Union
+
+import numpy as np
+import pandas as pd
+
+DB_COLUMNS = ["start", "end", "occupation"]
+DELTA_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+TimeBound = Union[pd.Timestamp, datetime.datetime, None]
+
+
+class StorageBase:
+    file_extension = ""
+    supports_upsert = False
+
+    def read(self, db_path: str, start: TimeBound = None, end: TimeBound = None) -> pd.DataFrame:
+        """
+        Read a database, optionally only the sessions with start in [start, end).
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the database file.
+        start : TimeBound, optional
+            Lower bound (inclusive) of the session start, by default None
+        end : TimeBound, optional
+            Upper bound (exclusive) of the session start, by default None
+
+        Returns
+        -------
+        pd.DataFrame
+            Loaded database.
+        """
+        db = self.read_all(db_path)
+        if start is not None:
+            db = db[db["start"] >= start]
+        if end is not None:
+            db = db[db["start"] < end]
+        return db
+
+    def read_all(self, db_path: str) -> pd.DataFrame:
+        """
+        Read the whole database.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the database file.
+
+        Returns
+        -------
+        pd.DataFrame
+            Loaded database.
+        """
+        raise NotImplementedError
+
+    def write(self, db: pd.DataFrame, db_path: str) -> None:
+        """
+        Write the whole database.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database which should be saved.
+        db_path : str
+            Path to the database file.
+        """
+        raise NotImplementedError
+
+    def upsert(self, rows: pd.DataFrame, db_path: str) -> None:
+        """
+        Update the rows with the same start as in rows or add them if they don't exist.
+
+        Only supported by backends with ``supports_upsert = True``.
+
+        Parameters
+        ----------
+        rows : pd.DataFrame
+            Changed or new rows of the database.
+        db_path : str
+            Path to the database file.
+        """
+        raise NotImplementedError(
+            f"{self.__class__.__name__} doesn't support updating single rows."
+        )
+
+    @classmethod
+    def is_storage_file(cls, db_path: str) -> bool:
+        """
+        Check if the file at db_path was written by this backend.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the database file.
+
+        Returns
+        -------
+        bool
+            Whether the file can be read by this backend.
+        """
+        magic = getattr(cls, "magic", b"")
+        if not magic:
+            return False
+        with open(db_path, "rb") as db_file:
+            return db_file.read(len(magic)) == magic
+
+
+class TsvStorage(StorageBase):
+    file_extension = "tsv"
+
+    def read_all(self, db_path: str) -> pd.DataFrame:
+        """
+        Read a database from a tab separated text file.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the database file.
+
+        Returns
+        -------
+        pd.DataFrame
+            Loaded database.
+        """
+        return pd.read_csv(db_path, parse_dates=["start", "end"], sep="\t")  # type: ignore
+
+    def append(self, rows: pd.DataFrame, db_path: str) -> None:
+        """
+        Append rows to a tab separated text file, the header is only written for new files.
+
+        Parameters
+        ----------
+        rows : pd.DataFrame
+            Rows which should be appended.
+        db_path : str
+            Path to the database file.
+        """
+        rows.to_csv(
+            db_path,
+            mode="a",
+            header=not os.path.isfile(db_path),
+            index=False,
+            columns=DB_COLUMNS,
+            sep="\t",
+        )
+
+    def read_appended(self, db_path: str, offset: int) -> Tuple[pd.DataFrame, int]:
+        """
+        Read the rows which were appended to a tab separated text file after offset.
+
+        Only complete lines are read, so rows which are still being written
+        are read the next time.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the database file.
+        offset : int
+            Size of the file in bytes, when it was read the last time.
+            With 0 the whole file including the header is read.
+
+        Returns
+        -------
+        Tuple[pd.DataFrame, int]
+            Appended rows and the offset to read the next appended rows from.
+        """
+        with open(db_path, "rb") as db_file:
+            db_file.seek(offset)
+            data = db_file.read()
+        complete_end = data.rfind(b"\n") + 1
+        data = data[:complete_end]
+        next_offset = offset + len(data)
+        if offset == 0:
+            # skip the header
+            header_end = data.find(b"\n") + 1
+            data = data[header_end:]
+        if not data:
+            empty_rows = pd.DataFrame(columns=DB_COLUMNS).astype(
+                {"start": "datetime64[ns]", "end": "datetime64[ns]"}
+            )
+            return empty_rows, next_offset
+        rows = pd.read_csv(
+            io.BytesIO(data),
+            sep="\t",
+            header=None,
+            names=DB_COLUMNS,
+            parse_dates=["start", "end"],  # type: ignore
+        )
+        return rows, next_offset
+
+    def write(self, db: pd.DataFrame, db_path: str) -> None:
+        """
+        Write the database to a tab separated text file.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database which should be saved.
+        db_path : str
+            Path to the database file.
+        """
+        db.to_csv(db_path, index=False, columns=DB_COLUMNS, sep="\t")
+
+
+class NpyStorage(StorageBase):
+    file_extension = "npy"
+    magic = b"\x93NUMPY"
+
+    def read_all(self, db_path: str) -> pd.DataFrame:
+        """
+        Read a database from a binary NumPy file.
+
+        The file is memory-mapped, so no parsing is needed at all.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the database file.
+
+        Returns
+        -------
+        pd.DataFrame
+            Loaded database.
+        """
+        db_array = np.load(db_path, mmap_mode="r", allow_pickle=False)
+        return pd.DataFrame(
+            {
+                "start": db_array["start"],
+                "end": db_array["end"],
+                "occupation": db_array["occupation"].astype(object),
+            }
+        )
+
+    def write(self, db: pd.DataFrame, db_path: str) -> None:
+        """
+        Write the database to a binary NumPy file.
+
+        Start and end are saved as datetime64[ns] and
+        the occupation as fixed width unicode string.
+        The new database is written to a temporary file first,
+        so an interrupted write doesn't corrupt the existing database.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database which should be saved.
+        db_path : str
+            Path to the database file.
+        """
+        occupations = db["occupation"].astype(str).to_numpy()
+        occupation_width = max([len(occupation) for occupation in occupations] + [1])
+        db_array = np.empty(
+            len(db.index),
+            dtype=[
+                ("start", "<M8[ns]"),
+                ("end", "<M8[ns]"),
+                ("occupation", f"<U{occupation_width}"),
+            ],
+        )
+        db_array["start"] = db["start"].to_numpy(dtype="datetime64[ns]")
+        db_array["end"] = db["end"].to_numpy(dtype="datetime64[ns]")
+        db_array["occupation"] = occupations
+        # written to a temporary file first, so an interrupted write doesn't corrupt the db
+        tmp_path = f"{db_path}.tmp"
+        # np.save appends '.npy' to paths without that extension, file objects are kept as is
+        with open(tmp_path, "wb") as db_file:
+            np.save(db_file, db_array, allow_pickle=False)
+        os.replace(tmp_path, db_path)
+
+
+class SqliteStorage(StorageBase):
+    file_extension = "sqlite"
+    magic = b"SQLite format 3\x00"
+    supports_upsert = True
+
+    def connect(self, db_path: str) -> sqlite3.Connection:
+        """
+        Open a connection to the database and create the table and index if needed.
+
+        Start and end are saved as integer nanoseconds since epoch and
+        start is indexed, so range queries and single row updates don't need full scans.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the database file.
+
+        Returns
+        -------
+        sqlite3.Connection
+            Connection to the database.
+        """
+        connection = sqlite3.connect(db_path)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(start INTEGER NOT NULL, end INTEGER NOT NULL, occupation TEXT)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS sessions_start ON sessions (start)")
+        return connection
+
+    def read(self, db_path: str, start: TimeBound = None, end: TimeBound = None) -> pd.DataFrame:
+        """
+        Read a database, optionally only the sessions with start in [start, end).
+
+        The range query uses the index on start.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the database file.
+        start : TimeBound, optional
+            Lower bound (inclusive) of the session start, by default None
+        end : TimeBound, optional
+            Upper bound (exclusive) of the session start, by default None
+
+        Returns
+        -------
+        pd.DataFrame
+            Loaded database.
+        """
+        lower = np.iinfo(np.int64).min if start is None else pd.Timestamp(start).value
+        upper = np.iinfo(np.int64).max if end is None else pd.Timestamp(end).value
+        connection = self.connect(db_path)
+        try:
+            rows = connection.execute(
+                "SELECT start, end, occupation FROM sessions "
+                "WHERE start >= ? AND start < ? ORDER BY rowid",
+                (int(lower), int(upper)),
+            ).fetchall()
+        finally:
+            connection.close()
+        db = pd.DataFrame(rows, columns=DB_COLUMNS)
+        db["start"] = pd.to_datetime(db["start"].astype("int64"))
+        db["end"] = pd.to_datetime(db["end"].astype("int64"))
+        return db
+
+    def read_all(self, db_path: str) -> pd.DataFrame:
+        """
+        Read the whole database.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the database file.
+
+        Returns
+        -------
+        pd.DataFrame
+            Loaded database.
+        """
+        return self.read(db_path)
+
+    def write(self, db: pd.DataFrame, db_path: str) -> None:
+        """
+        Replace the database file with a new one containing db.
+
+        The new database is written to a temporary file first,
+        so an interrupted write doesn't corrupt the existing database.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database which should be saved.
+        db_path : str
+            Path to the database file.
+        """
+        tmp_path = f"{db_path}.tmp"
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+        connection = self.connect(tmp_path)
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO sessions (start, end, occupation) VALUES (?, ?, ?)",
+                    self.to_records(db),
+                )
+        finally:
+            connection.close()
+        os.replace(tmp_path, db_path)
+
+    def upsert(self, rows: pd.DataFrame, db_path: str) -> None:
+        """
+        Update the rows with the same start as in rows or add them if they don't exist.
+
+        Parameters
+        ----------
+        rows : pd.DataFrame
+            Changed or new rows of the database.
+        db_path : str
+            Path to the database file.
+        """
+        connection = self.connect(db_path)
+        try:
+            with connection:
+                for start, end, occupation in self.to_records(rows):
+                    updated = connection.execute(
+                        "UPDATE sessions SET end = ?, occupation = ? WHERE start = ?",
+                        (end, occupation, start),
+                    )
+                    if not updated.rowcount:
+                        connection.execute(
+                            "INSERT INTO sessions (start, end, occupation) VALUES (?, ?, ?)",
+                            (start, end, occupation),
+                        )
+        finally:
+            connection.close()
+
+    @staticmethod
+    def to_records(db: pd.DataFrame) -> list:
+        """
+        Convert a database to a list of (start, end, occupation) tuples.
+
+        Parameters
+        ----------
+        db : pd.DataFrame
+            Database which should be converted.
+
+        Returns
+        -------
+        list
+            Records with start and end as integer nanoseconds since epoch.
+        """
+        starts = db["start"].to_numpy(dtype="datetime64[ns]").astype("int64").tolist()
+        ends = db["end"].to_numpy(dtype="datetime64[ns]").astype("int64").tolist()
+        return list(zip(starts, ends, db["occupation"].astype(str).tolist()))
+
+
+STORAGE_BACKENDS: Dict[str, Type[StorageBase]] = {
+    "tsv": TsvStorage,
+    "npy": NpyStorage,
+    "sqlite": SqliteStorage,
+}
+
+
+def get_storage(db_format: str) -> StorageBase:
+    """
+    Return the storage backend for db_format.
+
+    Parameters
+    ----------
+    db_format : str
+        Name of the storage format, supported values are the keys of STORAGE_BACKENDS.
+
+    Returns
+    -------
+    StorageBase
+        Storage backend instance.
+
+    Raises
+    ------
+    ValueError
+        If db_format isn't a supported storage format.
+    """
+    if db_format not in STORAGE_BACKENDS:
+        raise ValueError(
+            f"Unsupported db_format '{db_format}', supported formats are: "
+            f"{', '.join(STORAGE_BACKENDS)}"
+        )
+    return STORAGE_BACKENDS[db_format]()
+
+
+def detect_storage(db_path: str) -> StorageBase:
+    """
+    Return the storage backend which wrote the file at db_path.
+
+    This allows to read databases independent of the configured format,
+    i.e. a remote database written by a client with a different config.
+
+    Parameters
+    ----------
+    db_path : str
+        Path to the database file.
+
+    Returns
+    -------
+    StorageBase
+        Storage backend instance.
+    """
+    for storage_class in STORAGE_BACKENDS.values():
+        if storage_class.is_storage_file(db_path):
+            return storage_class()
+    # text files have no magic header, so tsv is used as fallback
+    return TsvStorage()
+
+
+def read_db(db_path: str, start: TimeBound = None, end: TimeBound = None) -> pd.DataFrame:
+    """
+    Read a database file with the backend that wrote it.
+
+    Optionally only the sessions with start in [start, end) are returned.
+
+    If db_path doesn't exist but a file with the same name and the
+    extension of another backend does (i.e. 'local_db.tsv' instead of 'local_db.npy'),
+    that file is read instead, which allows a transparent migration between formats.
+
+    Parameters
+    ----------
+    db_path : str
+        Path to the database file.
+    start : TimeBound, optional
+        Lower bound (inclusive) of the session start, by default None
+    end : TimeBound, optional
+        Upper bound (exclusive) of the session start, by default None
+
+    Returns
+    -------
+    pd.DataFrame
+        Loaded database.
+    """
+    if not os.path.isfile(db_path):
+        db_path = find_legacy_db_path(db_path)
+    return detect_storage(db_path).read(db_path, start, end)
+
+
+def find_legacy_db_path(db_path: str) -> str:
+    """
+    Find a database file with the same name but the extension of another backend.
+
+    Parameters
+    ----------
+    db_path : str
+        Path to the database file in the configured format.
+
+    Returns
+    -------
+    str
+        Path to an existing database file or db_path if none was found.
+    """
+    base_path = os.path.splitext(db_path)[0]
+    for storage_class in STORAGE_BACKENDS.values():
+        legacy_path = f"{base_path}.{storage_class.file_extension}"
+        if os.path.isfile(legacy_path):
+            return legacy_path
+    return db_path
+
+
+def retire_legacy_db_files(db_path: str) -> None:
+    """
+    Rename database files with the same name but the extension of another backend.
+
+    Should be called after db_path was written successfully, so a later switch
+    back to another format doesn't silently read the outdated legacy file.
+    The files get the suffix '.migrated', so they are kept as backup.
+
+    Parameters
+    ----------
+    db_path : str
+        Path to the database file in the configured format.
+    """
+    base_path, extension = os.path.splitext(db_path)
+    for storage_class in STORAGE_BACKENDS.values():
+        legacy_path = f"{base_path}.{storage_class.file_extension}"
+        if f".{storage_class.file_extension}" != extension and os.path.isfile(legacy_path):
+            os.replace(legacy_path, f"{legacy_path}.migrated")
+
+
+def format_delta_rows(rows: pd.DataFrame) -> str:
+    """
+    Format rows as lines of a delta file.
+
+    Delta files are tab separated text files without header, which only
+    get appended to, so they can be read incrementally starting at a byte offset.
+
+    Parameters
+    ----------
+    rows : pd.DataFrame
+        Changed or new rows of the database.
+
+    Returns
+    -------
+    str
+        Lines of the delta file, each ending with a newline.
+    """
+    delta_lines = (
+        rows["start"].dt.strftime(DELTA_TIME_FORMAT)
+        + "\t"
+        + rows["end"].dt.strftime(DELTA_TIME_FORMAT)
+        + "\t"
+        + rows["occupation"].astype(str)
+        + "\n"
+    )
+    return "".join(delta_lines.tolist())
+
+
+def parse_delta_rows(delta_text: str) -> pd.DataFrame:
+    """
+    Parse lines of a delta file.
+
+    Parameters
+    ----------
+    delta_text : str
+        Complete lines of one or more delta files.
+
+    Returns
+    -------
+    pd.DataFrame
+        Rows contained in the delta lines.
+    """
+    delta_lines = [line.split("\t") for line in delta_text.splitlines() if line]
+    delta_db = pd.DataFrame(delta_lines, columns=DB_COLUMNS)
+    delta_db["start"] = pd.to_datetime(delta_db["start"], format=DELTA_TIME_FORMAT)
+    delta_db["end"] = pd.to_datetime(delta_db["end"], format=DELTA_TIME_FORMAT)
+    return delta_db
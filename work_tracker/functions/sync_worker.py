@@ -0,0 +1,91 @@
+"""Module containing the background synchronization worker."""
+import queue
+import threading
+import traceback
+from typing import Callable, Union
+
+from .update_work_db import DbInteraction
+
+
+class SyncWorker:
+    def __init__(
+        self,
+        db_worker: DbInteraction,
+        on_finished: Union[Callable[[str, bool], None], None] = None,
+    ):
+        """
+        Worker running the synchronization with the SFTP server in a background thread.
+
+        Jobs are processed one after another in the order they were submitted,
+        so the tracker can start from the local database and reconcile it
+        with the server without blocking the GUI.
+
+        Parameters
+        ----------
+        db_worker : DbInteraction
+            Database interaction instance, which gets synchronized.
+        on_finished : Union[Callable[[str, bool], None], None], optional
+            Callback called with the job name and whether it succeeded,
+            after each job was processed, by default None
+        """
+        self.db_worker = db_worker
+        self.on_finished = on_finished
+        self.jobs: queue.Queue = queue.Queue()
+        self.job_functions = {
+            "start_session": self.db_worker.start_session,
+            "sync": self.db_worker.sync_remote_db,
+        }
+        self.thread = threading.Thread(target=self.run, name="SyncWorker", daemon=True)
+
+    def start(self) -> None:
+        """Start processing jobs in the background thread."""
+        self.thread.start()
+
+    def submit(self, job: str) -> None:
+        """
+        Add a job to the queue.
+
+        Parameters
+        ----------
+        job : str
+            Name of the job, supported values are the keys of job_functions.
+
+        Raises
+        ------
+        ValueError
+            If job isn't a supported job.
+        """
+        if job not in self.job_functions:
+            raise ValueError(
+                f"Unsupported job '{job}', supported jobs are: {', '.join(self.job_functions)}"
+            )
+        self.jobs.put(job)
+
+    def run(self) -> None:
+        """Process jobs until stop was called."""
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            try:
+                result = self.job_functions[job]()
+                succeeded = result is not False
+            except Exception:
+                traceback.print_exc()
+                succeeded = False
+            if self.on_finished is not None:
+                self.on_finished(job, succeeded)
+
+    def stop(self, timeout: Union[float, None] = None) -> None:
+        """
+        Stop the worker after all submitted jobs were processed.
+
+        Parameters
+        ----------
+        timeout : Union[float, None], optional
+            Max seconds to wait for the pending jobs, None waits until they are done,
+            by default None
+        """
+        self.jobs.put(None)
+        if self.thread.is_alive():
+            self.thread.join(timeout)
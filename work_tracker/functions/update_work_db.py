@@ -1,13 +1,28 @@
 """Module containing Database interaction class."""
 
 import datetime
+import os
+import shutil
+import threading
 from configparser import ConfigParser
-from typing import Tuple
+from typing import List, Tuple, Union
 
 import pandas as pd
 
 from .base_classes import DbBaseClass
-from .helpfer_functions import get_abs_path, get_midnight_datetime, seconds_to_hm
+from .helpfer_functions import (
+    get_abs_path,
+    get_midnight_datetime,
+    invalidate_file_hash,
+    seconds_to_hm,
+)
+from .live_session import DayWindow, SessionStore, to_ns
+from .storage import TsvStorage, retire_legacy_db_files
+
+MINUTE_NS = 60 * 10**9
+DAY_NS = 24 * 60 * MINUTE_NS
+# short pause is less than 10min which prevents resets by crashes
+SHORT_BREAK_NS = 10 * MINUTE_NS
 
 
 class DbInteraction(DbBaseClass):
@@ -25,10 +40,19 @@ class DbInteraction(DbBaseClass):
 
         """
         super().__init__(user_config_path)
+        # the db can be changed by the synchronization in a background thread
+        self.db_lock = threading.RLock()
+        self.sessions = SessionStore()
+        self._db_frame: Union[pd.DataFrame, None] = None
+        # running totals of yesterday and today, valid while self.today == window_day
+        self.window_day: Union[int, None] = None
+        self.yesterday_window = DayWindow()
+        self.today_window = DayWindow()
         self.occupation = "TestOccupation"
         self.load_config()
         self.update_now_and_tomorrow()
-        self.db = self.load_db(self.db_path_offline)
+        self.journal_entries = 0
+        self.db = self.replay_journal(self.load_db(self.db_path_offline))
         self.clean_db()
 
     def change_occupation(self, occupation: str) -> None:
@@ -40,22 +64,151 @@ class DbInteraction(DbBaseClass):
         occupation : str
             Current occupation.
         """
-        # update the end of last occupation work
-        self.update_db_locale()
-        self.clean_db()
-        self.occupation = occupation
-        new_day_df = pd.DataFrame(
-            [
-                {
-                    "start": self.get_pandas_now(),
-                    "end": self.get_pandas_now(),
-                    "occupation": self.occupation,
-                }
-            ]
-        )
-        self.db = self.db.append(new_day_df, ignore_index=True, sort=False)
-        # just for writing changes to db
-        self.update_db_locale()
+        with self.db_lock:
+            # update the end of last occupation work
+            self.update_db_locale()
+            self.clean_db()
+            self.occupation = occupation
+            now = to_ns(self.get_pandas_now())
+            position = self.append_session(now, now, self.occupation)
+            self.write_db_locale(self.sessions.to_dataframe([position]))
+            # just for writing changes to db
+            self.update_db_locale()
+
+    @property
+    def db(self) -> pd.DataFrame:
+        """
+        Database of all sessions, created from self.sessions when it is needed.
+
+        The DataFrame is cached until the sessions change, changes made to it
+        only take effect when it is assigned to db again.
+
+        Returns
+        -------
+        pd.DataFrame
+            Database with the columns 'start', 'end' and 'occupation'.
+        """
+        if self._db_frame is None:
+            self._db_frame = self.sessions.to_dataframe()
+        return self._db_frame
+
+    @db.setter
+    def db(self, db: pd.DataFrame) -> None:
+        self.sessions = SessionStore.from_dataframe(db)
+        self.sessions_changed(positions_changed=True)
+
+    def sessions_changed(self, positions_changed: bool = False) -> None:
+        """
+        Invalidate the data derived from self.sessions.
+
+        Parameters
+        ----------
+        positions_changed : bool, optional
+            Whether sessions were removed or replaced, which invalidates
+            the day windows, by default False
+        """
+        self._db_frame = None
+        if positions_changed:
+            self.window_day = None
+
+    def get_day_windows(self) -> Tuple[DayWindow, DayWindow]:
+        """
+        Return the running totals of the sessions which started yesterday and today.
+
+        The windows are only rebuilt when self.today changed or sessions were removed,
+        else they are updated incrementally, so the cost per update doesn't depend
+        on the size of the history.
+
+        Returns
+        -------
+        Tuple[DayWindow, DayWindow]
+            yesterday_window and today_window
+        """
+        today = to_ns(self.today)
+        if self.window_day != today:
+            self.yesterday_window = DayWindow()
+            self.today_window = DayWindow()
+            self.window_day = today
+            starts, ends = self.sessions.starts, self.sessions.ends
+            for position in self.sessions.positions_since(today - DAY_NS):
+                day_window = self.get_day_window(starts[position])
+                if day_window is not None:
+                    day_window.add(position, int(starts[position]), int(ends[position]))
+        return self.yesterday_window, self.today_window
+
+    def get_day_window(self, start: int) -> Union[DayWindow, None]:
+        """
+        Return the day window a session belongs to.
+
+        Parameters
+        ----------
+        start : int
+            Start of the session in nanoseconds since the epoch.
+
+        Returns
+        -------
+        Union[DayWindow, None]
+            today_window, yesterday_window or None if the session didn't start
+            yesterday or today, or the windows need to be rebuilt anyway.
+        """
+        if self.window_day is None or start >= self.window_day + DAY_NS:
+            return None
+        if start >= self.window_day:
+            return self.today_window
+        if start >= self.window_day - DAY_NS:
+            return self.yesterday_window
+        return None
+
+    def append_session(self, start: int, end: int, occupation: str) -> int:
+        """
+        Append a session to self.sessions.
+
+        Parameters
+        ----------
+        start : int
+            Start of the session in nanoseconds since the epoch.
+        end : int
+            End of the session in nanoseconds since the epoch.
+        occupation : str
+            Occupation the session was worked on.
+
+        Returns
+        -------
+        int
+            Position of the new session.
+        """
+        position = self.sessions.append(start, end, occupation)
+        day_window = self.get_day_window(start)
+        if day_window is not None:
+            day_window.add(position, start, end)
+        self.sessions_changed()
+        return position
+
+    def set_session_end(self, positions: List[int], end: int) -> None:
+        """
+        Move the end of sessions.
+
+        Parameters
+        ----------
+        positions : List[int]
+            Positions of the sessions in self.sessions.
+        end : int
+            New end of the sessions in nanoseconds since the epoch.
+        """
+        starts, ends = self.sessions.starts, self.sessions.ends
+        for position in positions:
+            old_end = int(ends[position])
+            ends[position] = end
+            day_window = self.get_day_window(starts[position])
+            if day_window is not None:
+                day_window.extend(old_end, end, ends)
+        self.sessions_changed()
+
+    def clean_db(self) -> None:
+        """Remove rows where the session work was less than 1min."""
+        with self.db_lock:
+            if self.sessions.remove_short_sessions(MINUTE_NS):
+                self.sessions_changed(positions_changed=True)
 
     def get_today(self):
         """
@@ -74,6 +227,7 @@ class DbInteraction(DbBaseClass):
 
         In case the date has changed during the session.
         Preventing error in self.update_db_locale, due to a wrong date.
+        The change of self.today also invalidates the cached day windows.
         """
         self.yesterday = self.get_today() - datetime.timedelta(1)
         self.today = self.get_today()
@@ -98,9 +252,8 @@ class DbInteraction(DbBaseClass):
         str
             String representation in hours and minutes
         """
-        today_db = self.db.loc[self.db["start"] >= self.today]
-        session_work = today_db["end"] - today_db["start"]
-        return seconds_to_hm(session_work.sum().seconds)  # type: ignore
+        _, today_window = self.get_day_windows()
+        return seconds_to_hm(today_window.work // 10**9 % 86400)
 
     def get_start_time(self):
         """
@@ -111,9 +264,10 @@ class DbInteraction(DbBaseClass):
         str
             String representing start time as %h:%M
         """
-        today_db = self.db.loc[self.db["start"] >= self.today]
-        start_time = today_db["start"].min() - self.today
-        return seconds_to_hm(start_time.seconds)
+        _, today_window = self.get_day_windows()
+        if today_window.first_start is None:
+            return seconds_to_hm(0)
+        return seconds_to_hm((today_window.first_start - self.window_day) // 10**9)
 
     def update_db_locale(self) -> Tuple[str, str]:
         """
@@ -124,70 +278,186 @@ class DbInteraction(DbBaseClass):
         Tuple[str, str]
             start_time and session_time
         """
-        self.update_now_and_tomorrow()
-        # case all session today
-        today_df = self.db[(self.db["start"] >= self.today) & (self.db["start"] < self.tomorrow)]
-        start_was_today = len(today_df.index)
-        # case date changed during session
-        yesterday_df = self.db[
-            (self.db["start"] >= self.yesterday) & (self.db["start"] < self.today)
-        ]
-        start_was_yesterday = len(yesterday_df.index)
-        # short pause is less than 10min which prevents resets by crashes
-        if start_was_today:
-            is_short_break = self.get_pandas_now() - today_df["end"].max() < pd.to_timedelta(
-                "10m"
-            )  # 10 minutes
-        elif start_was_yesterday:
-            is_short_break = self.get_pandas_now() - yesterday_df["end"].max() < pd.to_timedelta(
-                "10m"
-            )  # 10 minutes
-        else:
-            is_short_break = False
-        if start_was_today and is_short_break:
-            irow = self.db["end"].isin([today_df["end"].values.max()])
-            self.db.loc[irow, "end"] = self.get_pandas_now()
-        elif start_was_yesterday and is_short_break:
-            irow = self.db["end"].isin([yesterday_df["end"].values.max()])
-            self.db.loc[irow, "end"] = self.today
-            new_day_df = pd.DataFrame(
-                [
-                    {
-                        "start": self.today,
-                        "end": self.get_pandas_now(),
-                        "occupation": self.occupation,
-                    }
+        with self.db_lock:
+            self.update_now_and_tomorrow()
+            now = to_ns(self.get_pandas_now())
+            today = to_ns(self.today)
+            yesterday_window, today_window = self.get_day_windows()
+            # case all session today, else case date changed during session
+            last_window = today_window if today_window.positions else yesterday_window
+            if last_window.positions and now - last_window.last_end < SHORT_BREAK_NS:
+                ends = self.sessions.ends
+                changed_positions = [
+                    position
+                    for position in yesterday_window.positions + today_window.positions
+                    if ends[position] == last_window.last_end
                 ]
-            )
-            self.db = self.db.append(new_day_df, ignore_index=True, sort=False)
+                if last_window is today_window:
+                    self.set_session_end(changed_positions, now)
+                else:
+                    self.set_session_end(changed_positions, today)
+                    changed_positions.append(self.append_session(today, now, self.occupation))
+            else:
+                changed_positions = [self.append_session(now, now, self.occupation)]
+            self.write_db_locale(self.sessions.to_dataframe(changed_positions))
+            return self.get_start_and_session_time()
+
+    def get_start_and_session_time(self) -> Tuple[str, str]:
+        """
+        Return todays start time and session time, while holding db_lock.
+
+        This is safe to be called from other threads than the one updating the db,
+        since the day windows might be rebuilt.
+
+        Returns
+        -------
+        Tuple[str, str]
+            start_time and session_time
+        """
+        with self.db_lock:
+            return self.get_start_time(), self.get_session_time()
+
+    def write_db_locale(self, changed_rows: pd.DataFrame) -> None:
+        """
+        Write changes of the local database to disk.
 
+        If the storage backend supports it, changed_rows get updated in place.
+        Else if the journal is enabled, only changed_rows get appended to the journal file,
+        which gets compacted into the local database file
+        every ``journal_compact_interval`` writes.
+        Else the whole local database gets rewritten.
+        The changed sessions get marked as own sessions, which are pushed to the
+        own delta file, see mark_own_sessions.
+
+        Parameters
+        ----------
+        changed_rows : pd.DataFrame
+            Rows of self.db which were changed or added since the last write.
+        """
+        if self.delta_sync:
+            self.mark_own_sessions(changed_rows["start"])
+        if self.storage.supports_upsert and os.path.isfile(self.db_path_offline):
+            self.storage.upsert(changed_rows, self.db_path_offline)
+            invalidate_file_hash(self.db_path_offline)
+        elif not self.use_journal or self.journal_entries >= self.journal_compact_interval:
+            self.compact_db_locale()
         else:
-            new_day_df = pd.DataFrame(
-                [
-                    {
-                        "start": self.get_pandas_now(),
-                        "end": self.get_pandas_now(),
-                        "occupation": self.occupation,
-                    }
-                ]
-            )
-            self.db = self.db.append(new_day_df, ignore_index=True, sort=False)
-        self.db.sort_values(["start"]).reset_index(drop=True, inplace=True)
-        self.db.to_csv(
-            self.db_path_offline,
-            index=False,
-            columns=["start", "end", "occupation"],
-            sep="\t",
-        )
-        return self.get_start_time(), self.get_session_time()
+            TsvStorage().append(changed_rows, self.db_path_journal)
+            self.journal_entries += 1
+
+    def compact_db_locale(self) -> None:
+        """Rewrite the whole local database file and empty the journal."""
+        self.storage.write(self.db, self.db_path_offline)
+        invalidate_file_hash(self.db_path_offline)
+        # the legacy file of a migrated format is outdated from now on
+        retire_legacy_db_files(self.db_path_offline)
+        if os.path.isfile(self.db_path_journal):
+            os.remove(self.db_path_journal)
+        self.journal_entries = 0
+
+    def push_remote_db(self) -> bool:
+        """
+        Push the db_file from db_path_offline to the SFTP server.
+
+        The database on the server and the delta files of other clients get merged
+        into the local db first, so the push doesn't drop sessions other clients pushed.
+        Own old delta files, whose rows the database on the server contains,
+        get removed (see remove_retired_deltas).
+        Pending journal entries get compacted into the local database, which then gets
+        copied to a snapshot file while holding db_lock.
+        The snapshot gets uploaded without holding db_lock, so the db can be updated
+        during the upload, the delta file then gets rotated based on the snapshot.
+
+        Returns
+        -------
+        bool
+            Whether database upload succeeded or not.
+        """
+        if self.get_remote_db() and os.path.isfile(self.db_path_online):
+            remote_db = self.load_db(self.db_path_online)
+            with self.db_lock:
+                self.db = self.merge_dbs(remote_db)
+            if self.delta_sync:
+                self.merge_remote_deltas()
+                self.remove_retired_deltas(remote_db)
+        snapshot_path = f"{self.db_path_offline}.snapshot"
+        with self.db_lock:
+            self.compact_db_locale()
+            shutil.copy2(self.db_path_offline, snapshot_path)
+            snapshot_db = self.db.copy()
+        invalidate_file_hash(snapshot_path)
+        try:
+            pushed = super().push_remote_db(snapshot_path)
+        finally:
+            os.remove(snapshot_path)
+            invalidate_file_hash(snapshot_path)
+        if pushed and self.delta_sync:
+            # sessions created or changed during the upload stay marked for the next delta
+            with self.db_lock:
+                self.rotate_remote_delta(snapshot_db)
+        return pushed
+
+    def push_remote_delta(self) -> bool:
+        """
+        Append the sessions changed since the last push to the own delta file on the server.
+
+        Returns
+        -------
+        bool
+            Whether the delta upload succeeded or not.
+
+        See Also
+        --------
+        DbBaseClass.push_remote_delta
+        """
+        with self.db_lock:
+            db = self.db.copy()
+        # the upload works on a copy, so the db can be updated in the meantime
+        return self.push_db_delta(db)
+
+    def merge_remote_db(self) -> None:
+        """Merge the downloaded remote db into the local db."""
+        with self.db_lock:
+            self.db = self.merge_dbs()
+
+    def merge_remote_deltas(self) -> None:
+        """Merge the sessions from the delta files of other clients into the local db."""
+        delta_db = self.pull_remote_deltas()
+        if not delta_db.empty:
+            with self.db_lock:
+                self.db = self.merge_dbs(delta_db)
+                self.compact_db_locale()
+
+    def sync_remote_db(self) -> bool:
+        """
+        Exchange changed sessions with the SFTP server.
+
+        With delta_sync enabled, only sessions changed since the last synchronization
+        are transferred, else the whole database gets pushed.
+
+        Returns
+        -------
+        bool
+            Whether the synchronization succeeded or not.
+        """
+        if not self.delta_sync:
+            return self.push_remote_db()
+        self.merge_remote_deltas()
+        return self.push_remote_delta()
 
     def start_session(self) -> None:
-        """Start a session and update database."""
+        """
+        Start a session and update database.
+
+        The network operations don't hold db_lock, so this can run in a
+        background thread, while the db gets updated by the main thread.
+        """
         self.get_remote_db()
-        # print("b4 merge\n", self.db)
-        self.db = self.merge_dbs()
-        # print("b4 update\n", self.db)
-        self.update_db_locale()
-        self.local_files = self.calc_file_hashes()
-        # print("after update\n", self.db)
+        self.merge_remote_db()
+        if self.delta_sync:
+            self.merge_remote_deltas()
+        with self.db_lock:
+            self.update_db_locale()
+            self.compact_db_locale()
+            self.local_files = self.calc_file_hashes()
         self.push_remote_db()
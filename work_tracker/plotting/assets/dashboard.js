@@ -0,0 +1,126 @@
+// Clientside callbacks of the dashboard, so filtering doesn't need requests to the server.
+
+/**
+ * Return the label of the bin a day belongs to, like pandas.DataFrame.resample does.
+ *
+ * @param {string} day Day as 'YYYY-MM-DD'.
+ * @param {string} resolution Resampling rule, one of 'D', 'W', 'M' and 'A'.
+ * @returns {string} Last day of the bin as 'YYYY-MM-DD'.
+ */
+function binLabel(day, resolution) {
+  const date = new Date(day + "T00:00:00Z");
+  if (resolution === "W") {
+    // weeks end on sunday
+    date.setUTCDate(date.getUTCDate() + ((7 - date.getUTCDay()) % 7));
+  } else if (resolution === "M") {
+    // day 0 of the next month is the last day of the month
+    date.setUTCMonth(date.getUTCMonth() + 1, 0);
+  } else if (resolution === "A") {
+    date.setUTCMonth(12, 0);
+  } else {
+    return day;
+  }
+  return date.toISOString().slice(0, 10);
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+  dashboard: {
+    /**
+     * Create the figure of the worktime graph from the daily worktime.
+     *
+     * @param {Object} plotData Daily worktime, see PlotDataCache.get_plot_data.
+     * @param {string} resolution Selected resampling rule, one of 'D', 'W', 'M' and 'A'.
+     * @param {Array<string>} occupations Selected occupations.
+     * @param {string} minDate First day of the selected date range.
+     * @param {string} maxDate Last day of the selected date range.
+     * @returns {Object} Figure of the graph.
+     */
+    update_graph: function (plotData, resolution, occupations, minDate, maxDate) {
+      const layout = {
+        barmode: "stack",
+        xaxis: { title: "Date" },
+        yaxis: { title: "Work Time" },
+        margin: { l: 40, b: 40, t: 10, r: 10 },
+      };
+      if (!plotData) {
+        return { data: [], layout: layout };
+      }
+      // dates are compared as 'YYYY-MM-DD' strings
+      const firstDay = minDate ? minDate.slice(0, 10) : "";
+      const lastDay = maxDate ? maxDate.slice(0, 10) : "9999-12-31";
+      const columns = Object.keys(plotData.columns);
+      // sum up the worktime of the selected days per bin, the days are sorted
+      const labels = [];
+      const binHours = {};
+      columns.forEach(function (column) {
+        binHours[column] = [];
+      });
+      plotData.days.forEach(function (day, dayIndex) {
+        if (day < firstDay || day > lastDay) {
+          return;
+        }
+        const label = binLabel(day, resolution);
+        if (labels[labels.length - 1] !== label) {
+          labels.push(label);
+          columns.forEach(function (column) {
+            binHours[column].push(0);
+          });
+        }
+        columns.forEach(function (column) {
+          binHours[column][labels.length - 1] += plotData.columns[column][dayIndex];
+        });
+      });
+      const round = function (hours) {
+        return Math.round(hours * 100) / 100;
+      };
+      const data = [];
+      (occupations || []).forEach(function (occupation) {
+        const hours = binHours[occupation];
+        if (hours === undefined) {
+          return;
+        }
+        // only keep the periods the occupation was worked in
+        const workedBins = [];
+        labels.forEach(function (label, bin) {
+          if (round(hours[bin]) !== 0) {
+            workedBins.push(bin);
+          }
+        });
+        if (workedBins.length) {
+          data.push({
+            x: workedBins.map(function (bin) {
+              return labels[bin];
+            }),
+            y: workedBins.map(function (bin) {
+              return round(hours[bin]);
+            }),
+            name: occupation,
+            type: "bar",
+          });
+        }
+      });
+      // the total contains all occupations, not only the selected ones
+      data.push({
+        x: labels,
+        y: labels.map(function (label, bin) {
+          return round(
+            columns.reduce(function (total, column) {
+              return total + binHours[column][bin];
+            }, 0)
+          );
+        }),
+        name: "Total",
+        mode: "markers",
+        type: "scatter",
+        marker: { size: 15, line: { width: 0.5, color: "white" } },
+      });
+      data.push({
+        x: [minDate, maxDate],
+        y: [80, 80],
+        name: "contract time",
+        type: "line",
+      });
+      return { data: data, layout: layout };
+    },
+  },
+});
@@ -1,7 +1,6 @@
 """Plotting module."""
 
 import os
-import sys
 import traceback
 
 import dash
@@ -9,184 +8,166 @@ import dash_core_components as dcc
 import dash_html_components as html
 import flask
 import pandas as pd
-from dash.dependencies import Input, Output
-from plotly import graph_objs as go
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
 
+from work_tracker.plotting.plot_data import ROLLUP_RULES, PlotDataCache
 
-def timedelt_to_float_h(timedeltas: pd.Timedelta) -> float:  # type:ignore
+
+def get_layout(plot_data: PlotDataCache, refresh_interval: float = 5) -> html.Div:
     """
-    Convert timedelta to float.
+    Create the layout of the dashboard from the current data.
 
     Parameters
     ----------
-    timedeltas : pd.Timedelta
-        Timedifference.
+    plot_data : PlotDataCache
+        Data source of the dashboard.
+    refresh_interval : float, optional
+        Seconds between the checks of the browser for new data, by default 5
 
     Returns
     -------
-    float
-        Timedelta as seconds.
+    html.Div
+        Layout of the dashboard.
     """
-    seconds = timedeltas.total_seconds()  # type:ignore
-    return seconds / 3600
-
-
-server = flask.Flask("app")
-server.secret_key = os.environ.get("secret_key", "secret")
-
-
-stechkarte = pd.read_csv(
-    os.path.join(os.path.dirname(__file__), "../../mydata/.stechkarte_local.csv"),
-    sep="\t",
-    parse_dates=["start", "end"],  # type:ignore
-)
-stechkarte["worktime"] = stechkarte["end"] - stechkarte["start"]
-
-min_date = stechkarte["start"].min()
-max_date = stechkarte["start"].max() + pd.Timedelta(days=31)  # type:ignore
-
-occupations = stechkarte["occupation"].unique()
-option_list = []
-for occupation in occupations:
-    option_list.append({"label": occupation, "value": occupation})
-
-app = dash.Dash("app", server=server)
-
-app.scripts.config.serve_locally = False
-dcc._js_dist[0]["external_url"] = "https://cdn.plot.ly/plotly-basic-latest.min.js"
-
-app.layout = html.Div(
-    [
-        html.H1("Worktracker plot"),
-        dcc.Dropdown(id="my-dropdown", options=option_list, value=occupations, multi=True),
-        dcc.DatePickerSingle(id="min-date", date=min_date, display_format="YYYY-MM-DD"),
-        dcc.DatePickerSingle(id="max-date", date=max_date, display_format="YYYY-MM-DD"),
-        dcc.Graph(id="my-graph"),
-    ],
-    className="container",
-)
-
-
-@app.callback(
-    Output("my-graph", "figure"),
-    [
-        Input("my-dropdown", "value"),
-        Input("min-date", "date"),
-        Input("max-date", "date"),
-    ],
-)
-def update_graph(selected_dropdown_value, sel_min_date, sel_max_date):
+    occupations = plot_data.get_occupations()
+    min_date, max_date = plot_data.get_date_range()
+    max_date = max_date + pd.Timedelta(days=31)  # type:ignore
+    option_list = [{"label": occupation, "value": occupation} for occupation in occupations]
+    resolution_list = [{"label": label, "value": rule} for label, rule in ROLLUP_RULES.items()]
+    return html.Div(
+        [
+            html.H1("Worktracker plot"),
+            dcc.Dropdown(id="my-dropdown", options=option_list, value=occupations, multi=True),
+            dcc.RadioItems(
+                id="resolution",
+                options=resolution_list,
+                value="M",
+                labelStyle={"display": "inline-block"},
+            ),
+            dcc.DatePickerSingle(id="min-date", date=min_date, display_format="YYYY-MM-DD"),
+            dcc.DatePickerSingle(id="max-date", date=max_date, display_format="YYYY-MM-DD"),
+            dcc.Interval(id="refresh", interval=refresh_interval * 1000),
+            dcc.Store(id="data-version"),
+            dcc.Store(id="plot-data"),
+            dcc.Graph(id="my-graph"),
+        ],
+        className="container",
+    )
+
+
+def create_app(user_config_path=".user_config.ini", watch_interval: float = 5) -> dash.Dash:
     """
-    Update graph.
+    Create the dashboard app.
+
+    The data is loaded with a WorktimeCalculator and reloaded when the database files
+    change, see PlotDataCache. The daily worktime is sent to the browser, where it gets
+    filtered by occupation and date and resampled to the selected resolution,
+    without requests to the server.
+    The browser checks for new data every watch_interval seconds and only fetches
+    the daily worktime again, if the data version changed.
 
     Parameters
     ----------
-    selected_dropdown_value : [type]
-        [description]
-    sel_min_date : [type]
-        [description]
-    sel_max_date : [type]
-        [description]
+    user_config_path : str, optional
+        Path to the user specific config, which will overwrite default settings.
+        by default ".user_config.ini"
+    watch_interval : float, optional
+        Seconds between the checks for changed database files in the background,
+        0 only checks when the data is requested (every 5 seconds by the browser),
+        by default 5
 
     Returns
     -------
-    [type]
-        [description]
+    dash.Dash
+        Dashboard app.
     """
-    # dff = df[df['Stock'] == selected_dropdown_value]
-    # plotdata = stechkarte[stechkarte["occupation"] == selected_dropdown_value]
-    # worktime = plotdata.resample('M', on='start').sum()["worktime"]\
-    #     .apply(timedelt_to_float_h).reset_index()
-    plot_list = []
-    # if selected_dropdown_value == "Total":
-    #     for occupation in occupations:
-    #         plotdata = stechkarte[stechkarte["occupation"] == occupation]
-    #         worktime = plotdata.resample('M', on='start').sum()["worktime"]\
-    #             .apply(timedelt_to_float_h).reset_index()
-    #         plot_list.append({
-    #             'x': worktime.start,
-    #             'y': worktime.worktime,
-    #             'name': occupation,
-    #             'type': 'bar'
-    #         })
-    # else:
-    #     plotdata = stechkarte[stechkarte["occupation"] == selected_dropdown_value]
-    #     worktime = plotdata.resample('M', on='start').sum()["worktime"]\
-    #         .apply(timedelt_to_float_h).reset_index()
-    #     plot_list.append({
-    #         'x': worktime.start,
-    #         'y': worktime.worktime,
-    #         'name': selected_dropdown_value,
-    #         'type': 'bar'
-    #     })
-    print("sel_min_date", sel_min_date, file=sys.stderr)
-    print("type(sel_min_date)", type(sel_min_date), file=sys.stderr)
-    sel_min_date = pd.to_datetime(sel_min_date)
-    sel_max_date = pd.to_datetime(sel_max_date)
-    try:
-        ranged_stechkarte = stechkarte[
-            ((stechkarte["start"] >= sel_min_date) & (stechkarte["start"] <= sel_max_date))
-        ]
-        for occupation in selected_dropdown_value:
-            plotdata = ranged_stechkarte[ranged_stechkarte["occupation"] == occupation]
-            worktime = (
-                plotdata.resample("M", on="start")
-                .sum()["worktime"]
-                .apply(timedelt_to_float_h)
-                .round(2)
-            )
-            if not worktime.empty:
-                plot_list.append(
-                    {
-                        "x": worktime.index,
-                        "y": worktime.values,
-                        "name": occupation,
-                        "type": "bar",
-                    }
-                )
-        # Total
-        worktime = (
-            ranged_stechkarte.resample("M", on="start")
-            .sum()["worktime"]
-            .apply(timedelt_to_float_h)
-            .round(2)
-        )
-
-        print("worktime", worktime, file=sys.stderr)
-
-        plot_list.append(
-            go.Scatter(
-                x=worktime.index,
-                y=worktime.values,
-                name="Total",
-                mode="markers",
-                marker={"size": 15, "line": {"width": 0.5, "color": "white"}},
-            )
-        )
-
-        plot_list.append(
-            {
-                "x": [sel_min_date, sel_max_date],
-                "y": [80, 80],
-                "name": "contract time",
-                "type": "line",
-            }
-        )
-    except Exception:
-        traceback.print_exc()
-        print(ranged_stechkarte.head(), file=sys.stderr)
-        print(worktime.head(), file=sys.stderr)
-
-    return {
-        "data": plot_list,
-        "layout": {
-            "barmode": "stack",
-            "xaxis": {"title": "Date"},
-            "yaxis": {"title": "Work Time"},
-            "margin": {"l": 40, "b": 40, "t": 10, "r": 10},
-        },
-    }
+    server = flask.Flask("app")
+    server.secret_key = os.environ.get("secret_key", "secret")
+    plot_data = PlotDataCache(user_config_path)
+    if watch_interval:
+        plot_data.start_watching(watch_interval)
+
+    app = dash.Dash(
+        "app", server=server, assets_folder=os.path.join(os.path.dirname(__file__), "assets")
+    )
+
+    app.scripts.config.serve_locally = False
+    dcc._js_dist[0]["external_url"] = "https://cdn.plot.ly/plotly-basic-latest.min.js"
+
+    # the layout is a function, so reloading the page shows new occupations
+    app.layout = lambda: get_layout(plot_data, watch_interval or 5)
+
+    @app.callback(
+        Output("data-version", "data"),
+        [Input("refresh", "n_intervals")],
+        [State("data-version", "data")],
+    )
+    def update_data_version(n_intervals, data_version):
+        """
+        Update the data version in the browser, when new data was swapped in.
+
+        Parameters
+        ----------
+        n_intervals : int
+            Number of times the refresh interval passed.
+        data_version : str
+            Data version the browser has the data of.
+
+        Returns
+        -------
+        str
+            Current data version, see PlotDataCache.get_version.
+        """
+        try:
+            new_data_version = plot_data.get_version()
+        except Exception:
+            traceback.print_exc()
+            raise PreventUpdate
+        if new_data_version == data_version:
+            raise PreventUpdate
+        return new_data_version
+
+    @app.callback(Output("plot-data", "data"), [Input("data-version", "data")])
+    def update_plot_data(data_version):
+        """
+        Send the daily worktime to the browser.
+
+        Filtering by occupation and date and the resampling happen in the browser,
+        see dashboard.update_graph in assets/dashboard.js.
+
+        Parameters
+        ----------
+        data_version : str
+            Data version the daily worktime is requested for, see update_data_version.
+
+        Returns
+        -------
+        dict
+            Compact daily worktime, see PlotDataCache.get_plot_data.
+        """
+        if data_version is None:
+            raise PreventUpdate
+        try:
+            return plot_data.get_plot_data()
+        except Exception:
+            traceback.print_exc()
+            return {"days": [], "columns": {}}
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="update_graph"),
+        Output("my-graph", "figure"),
+        [
+            Input("plot-data", "data"),
+            Input("resolution", "value"),
+            Input("my-dropdown", "value"),
+            Input("min-date", "date"),
+            Input("max-date", "date"),
+        ],
+    )
+
+    return app
 
 
 if __name__ == "__main__":
-    app.run_server(debug=True)
+    create_app().run_server(debug=True)
@@ -0,0 +1,531 @@
+"""Module containing the data source of the dashboard."""
+
+import copy
+import hashlib
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from work_tracker.functions.calc_worktime import WorktimeCalculator
+from work_tracker.functions.session_index import DAY_NS, SessionIntervalIndex
+from work_tracker.functions.storage import TimeBound, TsvStorage, find_legacy_db_path
+
+ROLLUP_RULES = {"day": "D", "week": "W", "month": "M", "year": "A"}
+
+
+class WorktimeRollups:
+    def __init__(self, plot_dfs: Dict[str, pd.DataFrame]):
+        """
+        Plot Dataframes of the whole data for the resolutions of ROLLUP_RULES.
+
+        Date ranges are served by slicing the bins which overlap with them,
+        so only whole bins (i.e. whole months for 'M') are returned.
+
+        Parameters
+        ----------
+        plot_dfs : Dict[str, pd.DataFrame]
+            Plot Dataframes, see WorktimeCalculator.get_plot_df, with the rules as keys.
+        """
+        self.plot_dfs = plot_dfs
+        # the labels are the last days of the bins
+        self.bin_ends = {
+            rule: plot_df.index.values.astype("datetime64[ns]").view(np.int64)
+            for rule, plot_df in plot_dfs.items()
+        }
+        self.bin_starts = {
+            rule: plot_df.index.to_period(rule).start_time.values.view(np.int64)
+            for rule, plot_df in plot_dfs.items()
+        }
+        # the bins as intervals, which end at midnight after their last day
+        self.bin_indexes = {
+            rule: SessionIntervalIndex(
+                pd.DataFrame(
+                    {
+                        "start": self.bin_starts[rule].view("datetime64[ns]"),
+                        "end": (self.bin_ends[rule] + DAY_NS).view("datetime64[ns]"),
+                    }
+                )
+            )
+            for rule in plot_dfs
+        }
+
+    @classmethod
+    def build(cls, calculator: WorktimeCalculator) -> "WorktimeRollups":
+        """
+        Build the rollups of all data of calculator.
+
+        Parameters
+        ----------
+        calculator : WorktimeCalculator
+            Calculator with the data.
+
+        Returns
+        -------
+        WorktimeRollups
+            Rollups for all rules of ROLLUP_RULES.
+        """
+        return cls({rule: calculator.get_plot_df(rule) for rule in ROLLUP_RULES.values()})
+
+    def update(self, calculator: WorktimeCalculator, first_day: pd.Timestamp) -> "WorktimeRollups":
+        """
+        Create new rollups, where only the bins from first_day on are calculated again.
+
+        Parameters
+        ----------
+        calculator : WorktimeCalculator
+            Calculator with the changed data.
+        first_day : pd.Timestamp
+            First day whose worktime changed.
+
+        Returns
+        -------
+        WorktimeRollups
+            Updated rollups, self isn't changed.
+        """
+        plot_dfs = {}
+        for rule, plot_df in self.plot_dfs.items():
+            first_bin = np.searchsorted(self.bin_ends[rule], first_day.value, "left")
+            if first_bin < len(plot_df.index):
+                bin_start = pd.Timestamp(self.bin_starts[rule][first_bin])
+            else:
+                bin_start = first_day.to_period(rule).start_time
+            changed_df = calculator.get_plot_df(rule, start=bin_start)
+            plot_df = pd.concat([plot_df.iloc[:first_bin], changed_df], sort=False)
+            # new occupations or empty bins between the old and the changed bins
+            plot_dfs[rule] = plot_df.resample(rule).sum().fillna(pd.Timedelta(seconds=0))
+        return WorktimeRollups(plot_dfs)
+
+    def get_plot_df(self, rule: str, start: TimeBound, end: TimeBound) -> pd.DataFrame:
+        """
+        Return the bins, which overlap with the days in [start, end).
+
+        Parameters
+        ----------
+        rule : str
+            Rule of the rollup, one of the values of ROLLUP_RULES.
+        start : TimeBound
+            First day, None means unbounded.
+        end : TimeBound
+            Day after the last day, None means unbounded.
+
+        Returns
+        -------
+        pd.DataFrame
+            Slice of the plot Dataframe of the rule.
+        """
+        return self.plot_dfs[rule].iloc[self.bin_indexes[rule].overlapping(start, end)]
+
+
+class PlotDataState:
+    __slots__ = ["calculator", "data_version", "journal_offset", "rollups"]
+
+    def __init__(
+        self,
+        calculator: WorktimeCalculator,
+        data_version: Tuple,
+        journal_offset: int,
+        rollups: WorktimeRollups,
+    ):
+        """
+        Consistent view of the data, which is replaced as a whole when the data changed.
+
+        Parameters
+        ----------
+        calculator : WorktimeCalculator
+            Calculator with the data.
+        data_version : Tuple
+            Version of the data the calculator was loaded from, see PlotDataCache.
+        journal_offset : int
+            Size of the journal file, up to which it was read.
+        rollups : WorktimeRollups
+            Precomputed plot Dataframes of the data.
+        """
+        self.calculator = calculator
+        self.data_version = data_version
+        self.journal_offset = journal_offset
+        self.rollups = rollups
+
+
+class PlotDataCache:
+    def __init__(self, user_config_path=".user_config.ini", max_size=128):
+        """
+        Server side data of the dashboard.
+
+        The plot Dataframes are precomputed by WorktimeRollups for each version of the data
+        and the selections of the dashboard are cached per date range, occupations, rule
+        and data version (see get_plot_df).
+        The data version changes when one of the files the calculator reads from changes,
+        so the dashboard doesn't need to be restarted.
+        If only rows were appended to the journal, just those rows are read and added
+        to a copy of the calculator, else the calculator is recreated.
+        With the sqlite storage or a disabled journal, each write of the tracker
+        changes the db file itself, which always recreates the calculator.
+        The new data is swapped in as a whole (see PlotDataState), so requests
+        which are still running keep a consistent view.
+
+        Parameters
+        ----------
+        user_config_path : str, optional
+            Path to the user specific config, which will overwrite default settings.
+            by default ".user_config.ini"
+        max_size : int, optional
+            Maximal number of cached plot Dataframes, by default 128
+        """
+        self.user_config_path = user_config_path
+        self.max_size = max_size
+        self.state: Union[PlotDataState, None] = None
+        self.lock = threading.Lock()
+        self.cache: "OrderedDict[Tuple, pd.DataFrame]" = OrderedDict()
+        # the cached plot Dataframes are used by multiple request threads
+        self.cache_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.watcher: Union[threading.Thread, None] = None
+
+    @property
+    def calculator(self) -> Union[WorktimeCalculator, None]:
+        """Calculator of the current state, None if no data was loaded yet."""
+        return None if self.state is None else self.state.calculator
+
+    def get_data_paths(self, calculator: WorktimeCalculator) -> List[str]:
+        """
+        Return the paths of the files the data of the calculator is read from.
+
+        Parameters
+        ----------
+        calculator : WorktimeCalculator
+            Calculator whose config defines the paths.
+
+        Returns
+        -------
+        List[str]
+            Paths of the files.
+        """
+        return [
+            calculator.user_config_path,
+            calculator.db_path_online,
+            find_legacy_db_path(calculator.db_path_offline),
+            calculator.db_path_journal,
+            calculator.manual_db_path,
+            calculator.contract_info_path,
+        ]
+
+    def get_data_version(self, calculator: WorktimeCalculator) -> Tuple:
+        """
+        Return the version of the data, based on the modification time and size of the files.
+
+        Parameters
+        ----------
+        calculator : WorktimeCalculator
+            Calculator whose data files should be checked.
+
+        Returns
+        -------
+        Tuple
+            Path, modification time and size of each data file, None for missing files.
+        """
+        data_version = []
+        for data_path in self.get_data_paths(calculator):
+            if os.path.isfile(data_path):
+                file_stat = os.stat(data_path)
+                data_version.append((data_path, file_stat.st_mtime_ns, file_stat.st_size))
+            else:
+                data_version.append((data_path, None, None))
+        return tuple(data_version)
+
+    def load_state(self) -> PlotDataState:
+        """
+        Load all data with a new calculator.
+
+        The journal only got replayed if the calculator loaded the local db,
+        else its rows are added to the remote db, so the state starts from the
+        same point as the journal offset.
+
+        Returns
+        -------
+        PlotDataState
+            State with the new calculator.
+        """
+        calculator = WorktimeCalculator(self.user_config_path)
+        # loading the db can download the remote db, so the version is taken afterwards
+        data_version = self.get_data_version(calculator)
+        journal_size = dict((path, size) for path, _, size in data_version)[
+            calculator.db_path_journal
+        ]
+        journal_offset = journal_size or 0
+        if calculator.loaded_remote_db and journal_size:
+            rows, journal_offset = TsvStorage().read_appended(calculator.db_path_journal, 0)
+            calculator.add_sessions(rows)
+        return PlotDataState(
+            calculator, data_version, journal_offset, WorktimeRollups.build(calculator)
+        )
+
+    def append_journal_rows(self, state: PlotDataState, data_version: Tuple) -> PlotDataState:
+        """
+        Create a new state with the rows appended to the journal since state was loaded.
+
+        The calculator and its daily aggregates get copied, so state isn't changed.
+
+        Parameters
+        ----------
+        state : PlotDataState
+            Current state.
+        data_version : Tuple
+            Current version of the data.
+
+        Returns
+        -------
+        PlotDataState
+            State with the appended rows.
+        """
+        calculator = copy.copy(state.calculator)
+        with state.calculator.report_lock:
+            calculator.report_cache = OrderedDict(state.calculator.report_cache)
+        # the aggregates of the old state must not see the appended rows
+        calculator.daily_aggregates = state.calculator.daily_aggregates.copy()
+        rows, journal_offset = TsvStorage().read_appended(
+            calculator.db_path_journal, state.journal_offset
+        )
+        calculator.add_sessions(rows)
+        if rows.empty:
+            rollups = state.rollups
+        else:
+            rollups = state.rollups.update(calculator, rows["start"].min().normalize())
+        return PlotDataState(calculator, data_version, journal_offset, rollups)
+
+    def is_journal_append(self, state: PlotDataState, data_version: Tuple) -> bool:
+        """
+        Check if only rows were appended to the journal since state was loaded.
+
+        Parameters
+        ----------
+        state : PlotDataState
+            Current state.
+        data_version : Tuple
+            Current version of the data.
+
+        Returns
+        -------
+        bool
+            Whether the journal is the only changed file and didn't shrink.
+        """
+        changed = [new for old, new in zip(state.data_version, data_version) if old != new]
+        if len(changed) != 1:
+            return False
+        path, _, size = changed[0]
+        return (
+            path == state.calculator.db_path_journal
+            and size is not None
+            and size >= state.journal_offset
+        )
+
+    def refresh(self) -> PlotDataState:
+        """
+        Swap in the current data, if it changed since it was loaded.
+
+        Returns
+        -------
+        PlotDataState
+            Current state.
+        """
+        with self.lock:
+            state = self.state
+            if state is None:
+                state = self.load_state()
+            else:
+                data_version = self.get_data_version(state.calculator)
+                if data_version == state.data_version:
+                    return state
+                elif self.is_journal_append(state, data_version):
+                    state = self.append_journal_rows(state, data_version)
+                else:
+                    state = self.load_state()
+            self.state = state
+            return state
+
+    def watch(self, interval: float) -> None:
+        """
+        Refresh the data every interval seconds, until stop_watching was called.
+
+        Parameters
+        ----------
+        interval : float
+            Seconds between the checks for changed files.
+        """
+        while not self.stop_event.wait(interval):
+            try:
+                self.refresh()
+            except Exception:
+                traceback.print_exc()
+
+    def start_watching(self, interval: float = 5) -> None:
+        """
+        Start polling the data files for changes in a background thread.
+
+        Parameters
+        ----------
+        interval : float, optional
+            Seconds between the checks for changed files, by default 5
+        """
+        if self.watcher is None:
+            self.stop_event.clear()
+            self.watcher = threading.Thread(
+                target=self.watch, args=(interval,), name="PlotDataWatcher", daemon=True
+            )
+            self.watcher.start()
+
+    def stop_watching(self, timeout: Union[float, None] = None) -> None:
+        """
+        Stop the background thread polling the data files.
+
+        Parameters
+        ----------
+        timeout : Union[float, None], optional
+            Seconds to wait for the thread to finish, by default None
+        """
+        if self.watcher is not None:
+            self.stop_event.set()
+            self.watcher.join(timeout)
+            self.watcher = None
+
+    def get_calculator(self) -> WorktimeCalculator:
+        """
+        Return the calculator with the current data.
+
+        Returns
+        -------
+        WorktimeCalculator
+            Calculator with the current data.
+        """
+        return self.refresh().calculator
+
+    def get_version(self) -> str:
+        """
+        Return an identifier of the current data, which changes when new data is swapped in.
+
+        Returns
+        -------
+        str
+            Hash of the data version of the current state.
+        """
+        data_version = self.refresh().data_version
+        return hashlib.md5(repr(data_version).encode()).hexdigest()
+
+    def get_occupations(self) -> List[str]:
+        """
+        Return the occupations of all sessions.
+
+        Returns
+        -------
+        List[str]
+            Occupations in the order they first occurred.
+        """
+        return list(self.get_calculator().db["occupation"].unique())
+
+    def get_date_range(self) -> Tuple[pd.Timestamp, pd.Timestamp]:
+        """
+        Return the first and last start of all sessions.
+
+        Returns
+        -------
+        Tuple[pd.Timestamp, pd.Timestamp]
+            First and last start.
+        """
+        session_index = self.get_calculator().session_index
+        if not len(session_index):
+            return pd.NaT, pd.NaT
+        return pd.Timestamp(session_index.starts[0]), pd.Timestamp(session_index.starts[-1])
+
+    def get_plot_df(
+        self,
+        occupations: Iterable[str],
+        start: TimeBound = None,
+        end: TimeBound = None,
+        rule: str = "M",
+    ) -> pd.DataFrame:
+        """
+        Return the plot Dataframe of the selected occupations and date range.
+
+        The results are cached per date range, occupations, rule and data version,
+        only the max_size most recently used ones are kept.
+
+        Parameters
+        ----------
+        occupations : Iterable[str]
+            Occupations whose columns are returned, besides the 'total' column.
+        start : TimeBound, optional
+            First day of the date range, by default None
+        end : TimeBound, optional
+            Last day of the date range (inclusive), by default None
+        rule : str, optional
+            Resampling rule see pandas.DataFrame.resample, the rules of ROLLUP_RULES
+            are served from the rollups, which only contain whole bins, by default "M"
+
+        Returns
+        -------
+        pd.DataFrame
+            Plot Dataframe with a 'total' column and a column for each selected occupation,
+            which has worktime in the date range.
+
+        See Also
+        --------
+        WorktimeRollups
+        WorktimeCalculator.get_plot_df
+        """
+        state = self.refresh()
+        start = None if start is None else pd.Timestamp(start).normalize()
+        end = None if end is None else pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+        cache_key = (start, end, tuple(occupations), rule, state.data_version)
+        with self.cache_lock:
+            plot_df = self.cache.get(cache_key)
+            if plot_df is not None:
+                self.cache.move_to_end(cache_key)
+                return plot_df.copy()
+        if rule in state.rollups.plot_dfs:
+            plot_df = state.rollups.get_plot_df(rule, start, end)
+        else:
+            # the whole data is memoized once per rule and sliced, so the
+            # report_cache of the calculator doesn't fill up with date ranges
+            plot_df = state.calculator.get_plot_df(rule)
+            days = pd.Series(plot_df.index.normalize(), index=plot_df.index)
+            plot_df = plot_df[WorktimeCalculator.get_range_mask(days, start, end)]
+        columns = ["total"] + [
+            occupation
+            for occupation in occupations
+            if occupation in plot_df.columns and plot_df[occupation].any()
+        ]
+        plot_df = plot_df[columns]
+        with self.cache_lock:
+            self.cache[cache_key] = plot_df
+            self.cache.move_to_end(cache_key)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        return plot_df.copy()
+
+    def get_plot_data(self) -> Dict[str, List]:
+        """
+        Return the daily worktime of the sessions as compact data for the browser.
+
+        The data is sent once per data version, the date range and the resolution
+        are applied in the browser (see assets/dashboard.js).
+        Like the occupations of the dashboard, the data only contains the worked sessions.
+        Holidays and the manual_db entries aren't included, so the total which is
+        summed up in the browser only counts worked time.
+
+        Returns
+        -------
+        Dict[str, List]
+            'days' with each day from the first to the last session as 'YYYY-MM-DD'
+            and 'columns' with the worktime in hours per day for each occupation,
+            which has worktime.
+        """
+        plot_df = self.get_plot_df(self.get_occupations(), rule="D").drop(columns="total")
+        hours = plot_df.apply(lambda column: column.dt.total_seconds() / 3600).round(4)
+        return {
+            "days": plot_df.index.strftime("%Y-%m-%d").tolist(),
+            "columns": {column: hours[column].tolist() for column in hours.columns},
+        }